@@ -1,54 +1,144 @@
 # apis/authentication.py
 
+import hashlib
+import time
 import jwt
 from datetime import datetime, timedelta
 from django.conf import settings
+from mongoengine import signals
+from mongoengine.errors import ValidationError
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
-from accounts.models import User
+from accounts.models import User, user_updated
+from core.cache import TTLCache, VersionedTTLCache
 
-class JWTAuthentication(BaseAuthentication):
-    def authenticate(self, request):
-        token = request.headers.get('Authorization')
+# Verified tokens, keyed by the SHA-256 of the token. An entry never outlives the token's 'exp'.
+token_cache = TTLCache(
+    maxsize=getattr(settings, 'JWT_TOKEN_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'JWT_TOKEN_CACHE_TTL', 300),
+)
+# Authenticated users, keyed by user id. Changing or deleting a user drops its entry in this process
+# and bumps its 'user:<id>' cache version, so other processes drop that user within the check interval.
+user_cache = VersionedTTLCache(
+    'user',
+    maxsize=getattr(settings, 'JWT_USER_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'JWT_USER_CACHE_TTL', 60),
+    check_interval=getattr(settings, 'JWT_USER_CACHE_CHECK_INTERVAL', 5),
+)
 
-        if not token:
-            return None
+
+def get_token(request):
+
+    """
+    Returns the JWT of the Authorization header, without its 'Bearer ' prefix, or None.
+    """
+
+    token = request.headers.get('Authorization')
+    if not token:
+        return None
+    if token.startswith('Bearer '):
+        token = token.split(' ')[1]
+    return token
+
+
+def verify_token(token):
+
+    """
+    Verifies a JWT and returns the id of its user, from the verified-token cache when possible.
+
+    Raises:
+        jwt.InvalidTokenError: If the token is invalid or expired.
+    """
+
+    key = hashlib.sha256(token.encode()).hexdigest()
+    user_id = token_cache.get(key)
+    if user_id is None:
+        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+        user_id = payload.get('user_id', {}).get('id')
+        exp = payload.get('exp')
+        token_cache.set(key, user_id, ttl=exp - time.time() if exp else None)
+    return user_id
+
+
+def get_user(user_id):
+
+    """
+    Returns the user with the given id, from the user cache when possible.
+
+    Each call returns its own copy, so a view changing the user does not change the cached user
+    that other requests and threads read.
+
+    Raises:
+        User.DoesNotExist: If the user does not exist.
+    """
+
+    user = user_cache.get(user_id)
+    if user is None:
+        version = user_cache.get_version(user_id)
+        user = User.objects.get(id=user_id)
+        user_cache.set(user_id, user, version)
+    return User._from_son(user.to_mongo())
+
+
+def resolve_user(request, token):
+
+    """
+    Returns the active user of a JWT, memoized on the request so it is resolved once per request.
+
+    Raises:
+        AuthenticationFailed: If the token is invalid or expired, or its user is missing or inactive.
+    """
+
+    http_request = getattr(request, '_request', request)
+    memo = http_request.__dict__.setdefault('jwt_users', {})
+    if token not in memo:
         try:
-            # Extract the token value (remove 'Bearer ' prefix if present)
-            if token.startswith('Bearer '):
-                token = token.split(' ')[1]
-            
-            # Decode the token using the secret key and algorithm from settings
-            payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-            
-            # Retrieve the user based on user_id from the token payload
-            user = User.objects.get(id=payload.get('user_id', {}).get('id'))
-            
-            return (user, token)  # Authentication successful
-        except (jwt.ExpiredSignatureError, jwt.InvalidTokenError, User.DoesNotExist):
+            user = get_user(verify_token(token))
+        except (jwt.ExpiredSignatureError, jwt.InvalidTokenError, User.DoesNotExist, ValidationError):
             raise AuthenticationFailed('Invalid token')
-        
-    def get_current_user(self, request):
-        token = request.headers.get('Authorization')
+        if not user.is_active:
+            raise AuthenticationFailed('User is inactive')
+        memo[token] = user
+    return memo[token]
+
+
+def invalidate_user(sender, document, **kwargs):
+
+    """
+    Drops a user from the user caches of every process when it is changed or deleted, e.g. on a
+    password change or deactivation.
+    """
+
+    user_cache.invalidate(str(document.pk))
+
+
+signals.post_save.connect(invalidate_user, sender=User)
+signals.post_delete.connect(invalidate_user, sender=User)
+user_updated.connect(invalidate_user, sender=User)
+
+
+class JWTAuthentication(BaseAuthentication):
+    def authenticate(self, request):
+        token = get_token(request)
 
         if not token:
             return None
-        try:
 
-            if token.startswith('Bearer '):
-                token = token.split(' ')[1]
+        # The token is verified and its user loaded through the caches, and memoized on the request
+        user = resolve_user(request, token)
 
+        return (user, token)  # Authentication successful
 
-            payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+    def get_current_user(self, request):
+        token = get_token(request)
 
+        if not token:
+            return None
+
+        # Reuses the user resolved by `authenticate` for this request
+        return resolve_user(request, token)
 
-            user = User.objects.get(id=payload.get('user_id', {}).get('id'))
 
-            return user  
-        except (jwt.ExpiredSignatureError, jwt.InvalidTokenError, User.DoesNotExist):
-            raise AuthenticationFailed('Invalid token')
-        
-        
     @staticmethod
     def generate_jwt(user):
         payload = {
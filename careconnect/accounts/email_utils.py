@@ -1,20 +1,231 @@
-from django.core.mail import EmailMessage
+import atexit
+import logging
+import queue
 import threading
+import time
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
 
-class EmailThread(threading.Thread):
-    def __init__(self, email):
-        self.email = email
-        threading.Thread.__init__(self)
+logger = logging.getLogger(__name__)
+
+# The number of messages waiting to be sent. When it is full, send_email waits up to
+# EMAIL_ENQUEUE_TIMEOUT seconds for room and then drops the message.
+EMAIL_QUEUE_SIZE = getattr(settings, 'EMAIL_QUEUE_SIZE', 1000)
+EMAIL_ENQUEUE_TIMEOUT = getattr(settings, 'EMAIL_ENQUEUE_TIMEOUT', 1)
+EMAIL_WORKERS = getattr(settings, 'EMAIL_WORKERS', 2)
+# The number of messages a worker sends over one connection before checking the queue again,
+# and how long it waits for more messages to fill a batch.
+EMAIL_BATCH_SIZE = getattr(settings, 'EMAIL_BATCH_SIZE', 50)
+EMAIL_BATCH_WAIT = getattr(settings, 'EMAIL_BATCH_WAIT', 0.2)
+# A failed message is retried this many times, waiting EMAIL_RETRY_BACKOFF seconds, doubled on each retry.
+EMAIL_MAX_RETRIES = getattr(settings, 'EMAIL_MAX_RETRIES', 3)
+EMAIL_RETRY_BACKOFF = getattr(settings, 'EMAIL_RETRY_BACKOFF', 1)
+# How long the process waits at exit for the queued messages to be sent.
+EMAIL_SHUTDOWN_TIMEOUT = getattr(settings, 'EMAIL_SHUTDOWN_TIMEOUT', 10)
+
+
+class EmailDispatcher:
+
+    """
+    Sends emails from a bounded queue on a fixed pool of worker threads.
+
+    Each worker takes the queued messages in batches and sends a batch over one SMTP connection,
+    which it keeps open while the queue has work, so a burst of registrations costs a few TLS
+    handshakes instead of one thread and one connection per message. A message that fails is
+    retried on a new connection with exponential backoff, and dropped with an error log once its
+    retries are exhausted.
+
+    The connection comes from `get_connection()`, so any EMAIL_BACKEND works, e.g. the locmem
+    backend in tests.
+    """
+
+    def __init__(self, workers=EMAIL_WORKERS, queue_size=EMAIL_QUEUE_SIZE, batch_size=EMAIL_BATCH_SIZE,
+                 batch_wait=EMAIL_BATCH_WAIT, max_retries=EMAIL_MAX_RETRIES, retry_backoff=EMAIL_RETRY_BACKOFF):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.threads = []
+        self.lock = threading.Lock()
+        self.counters = {'sent': 0, 'retried': 0, 'failed': 0, 'dropped': 0, 'in_flight': 0}
+
+    def start(self):
+
+        """
+        Starts the worker threads, once. They are started on the first message, so processes that
+        never send email never start them.
+        """
+
+        with self.lock:
+            if self.threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self.work, name=f'email-dispatcher-{index}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def enqueue(self, message, timeout=EMAIL_ENQUEUE_TIMEOUT):
+
+        """
+        Queues a message for sending.
+
+        Args:
+            message (EmailMessage): The message. Its connection is ignored.
+            timeout (float): How long to wait for room in a full queue.
+
+        Returns:
+            bool: False if the queue stayed full and the message was dropped.
+        """
+
+        self.start()
+        try:
+            self.queue.put(message, timeout=timeout)
+        except queue.Full:
+            self.count('dropped')
+            logger.error('The email queue is full, dropping the message to %s', ', '.join(message.to))
+            return False
+        return True
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def metrics(self):
+
+        """
+        Returns the queue depth and the delivery counters of this process.
+
+        Returns:
+            dict: 'queued' and 'capacity' of the queue, the 'in_flight' messages taken by the workers,
+            and the 'sent', 'retried', 'failed' and 'dropped' totals.
+        """
+
+        with self.lock:
+            return {'queued': self.queue.qsize(), 'capacity': self.queue.maxsize, 'workers': len(self.threads), **self.counters}
+
+    def flush(self, timeout=None):
+
+        """
+        Waits until every queued message has been sent or given up on.
+
+        Returns:
+            bool: False if the timeout passed first.
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def next_batch(self, block):
+
+        """
+        Takes up to `batch_size` messages, waiting up to `batch_wait` for the batch to fill.
+
+        Returns an empty list if `block` is False and no message arrives within `batch_wait`.
+        """
+
+        try:
+            batch = [self.queue.get(block=True, timeout=None if block else self.batch_wait)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def work(self):
+
+        """
+        Sends batches until the process exits. The connection is closed whenever the queue runs dry,
+        so idle workers hold no SMTP connection.
+        """
+
+        connection = None
+        while True:
+            batch = self.next_batch(block=connection is None)
+            if not batch:
+                self.close(connection)
+                connection = None
+                continue
+
+            self.count('in_flight', len(batch))
+            try:
+                connection = self.send_batch(batch, connection)
+            finally:
+                self.count('in_flight', -len(batch))
+                for _ in batch:
+                    self.queue.task_done()
+
+    def send_batch(self, batch, connection):
+
+        """
+        Sends a batch, reopening the connection and backing off after each failure.
+
+        Returns:
+            The open connection, or None if the last attempt failed.
+        """
+
+        attempts = {}
+        pending = list(batch)
+        while pending:
+            message = pending[0]
+            try:
+                if connection is None:
+                    connection = get_connection(fail_silently=False)
+                    connection.open()
+                connection.send_messages([message])
+                pending.pop(0)
+                self.count('sent')
+            except Exception:
+                self.close(connection)
+                connection = None
+                attempt = attempts.get(id(message), 0) + 1
+                attempts[id(message)] = attempt
+                if attempt > self.max_retries:
+                    pending.pop(0)
+                    self.count('failed')
+                    logger.exception('Could not send the email to %s after %d attempts', ', '.join(message.to), attempt)
+                    continue
+                self.count('retried')
+                time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+        return connection
+
+    def close(self, connection):
+        if connection is None:
+            return
+        try:
+            connection.close()
+        except Exception:
+            logger.warning('Could not close the email connection', exc_info=True)
+
+
+email_dispatcher = EmailDispatcher()
+
+
+@atexit.register
+def flush_on_exit():
+    if email_dispatcher.threads:
+        email_dispatcher.flush(timeout=EMAIL_SHUTDOWN_TIMEOUT)
 
-    def run(self):
-        self.email.send()
 
 class EmailUtil:
     @staticmethod
     def send_email(data):
         email = EmailMessage(
-            subject=data['email_subject'], 
+            subject=data['email_subject'],
             body=data['email_body'],
             to=[data['to_email']]
             )
-        EmailThread(email).start()
\ No newline at end of file
+        # Sent in the background by the dispatcher's workers, so the request does not wait for SMTP
+        return email_dispatcher.enqueue(email)
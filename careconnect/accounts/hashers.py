@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+
+    """
+    PBKDF2-SHA256 with the iteration count of the PASSWORD_HASH_ITERATIONS setting.
+
+    It keeps Django's 'pbkdf2_sha256' algorithm name, so existing hashes still verify, and hashes
+    made with another iteration count are rehashed on the next login.
+    """
+
+    iterations = getattr(settings, 'PASSWORD_HASH_ITERATIONS', None) or hashers.PBKDF2PasswordHasher.iterations
@@ -0,0 +1,72 @@
+import asyncio
+import statistics
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory
+from accounts import passwords
+from accounts.models import User
+from accounts.views import CustomLoginView
+
+
+class Command(BaseCommand):
+    help = 'Compares concurrent logins through the login view with the password hashed inline and on the password hashing pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200, help='Number of logins per run.')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16], help='Number of concurrent requests for each run.')
+        parser.add_argument('--modes', nargs='+', default=['inline', 'pool'], choices=['inline', 'pool'], help='Hashing modes to compare.')
+
+    def handle(self, *args, **options):
+
+        """
+        Sends concurrent login requests to the asynchronous login view on one event loop, as the ASGI
+        server does, and reports the logins per second and the latency of each login.
+
+        The logins use a temporary user, deleted afterwards, and skip the throttles. The password is
+        hashed with the hasher and iteration count of the current settings.
+        """
+
+        raw_password = 'benchmark-password'
+        user = User(username='benchmark-login', email=f'benchmark-{uuid.uuid4().hex}@example.com')
+        user.password = passwords.hash_password(raw_password, mode='inline')
+        user.save()
+
+        default_mode = passwords.PASSWORD_HASH_MODE
+        try:
+            asyncio.run(self.benchmark(user.email, raw_password, options))
+        finally:
+            passwords.PASSWORD_HASH_MODE = default_mode
+            user.delete()
+
+    async def benchmark(self, email, raw_password, options):
+        view = CustomLoginView.as_view(throttle_classes=[])
+        factory = APIRequestFactory()
+        # Starts the pool workers, so their start-up is not timed.
+        await passwords.ahash_password(raw_password, mode='pool')
+
+        self.stdout.write(f'{options["logins"]} logins per run, {passwords.PASSWORD_HASH_WORKERS} pool workers')
+        self.stdout.write(f"{'mode':>8} {'requests':>8} {'logins/s':>10} {'p50 (ms)':>10} {'p95 (ms)':>10}")
+
+        for concurrency in options['concurrency']:
+            for mode in options['modes']:
+                passwords.PASSWORD_HASH_MODE = mode
+                latencies = []
+                slots = asyncio.Semaphore(concurrency)
+
+                async def login():
+                    async with slots:
+                        request = factory.post('/accounts/login/', {'email': email, 'password': raw_password}, format='json')
+                        started = time.perf_counter()
+                        response = await view(request)
+                        if response.status_code != 200:
+                            raise CommandError(f'The benchmark login failed with status {response.status_code}.')
+                        latencies.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                await asyncio.gather(*(login() for _ in range(options['logins'])))
+                elapsed = time.perf_counter() - started
+
+                p50 = statistics.median(latencies) * 1000
+                p95 = statistics.quantiles(latencies, n=20)[-1] * 1000
+                self.stdout.write(f'{mode:>8} {concurrency:>8} {options["logins"] / elapsed:>10.1f} {p50:>10.1f} {p95:>10.1f}')
@@ -1,14 +1,20 @@
 # from django.db import models
+from asgiref.sync import sync_to_async
+from django.dispatch import Signal
 from mongoengine import Document, StringField, DateField, EmailField, DateTimeField, BooleanField, ReferenceField, CASCADE
-from django.contrib.auth.hashers import make_password, check_password
-import random
-import string
+from .passwords import ahash_password, averify_password, hash_password, verify_password
+import secrets
 from datetime import datetime, timedelta
 
+# Sent with the `document` after a user is changed with a partial update, which does not send
+# mongoengine's post_save, so the user caches can drop it.
+user_updated = Signal()
+
+
 class User(Document):
     username = StringField(max_length=100)
     email = EmailField()
-    password = StringField(max_length=100, null=False, blank=False)
+    password = StringField(max_length=255, null=False, blank=False)
     phone_number = StringField(max_length=15, blank=True, null=True)
     dob = DateField(blank=True, null=True)
     gender = StringField(max_length=10, blank=True, null=True)
@@ -19,6 +25,7 @@ class User(Document):
     is_admin = BooleanField(default=False)
     location_id = ReferenceField('core.models.Location', max_length=100, blank=True, null=True)
     is_email_verified = BooleanField(default=False)
+    # No longer written: one-time passwords are kept in the OneTimePassword collection.
     otp = StringField(max_length=4, blank=True, null=True)
     otp_expires_at = DateTimeField(blank=True, null=True)
 
@@ -33,27 +40,143 @@ class User(Document):
         return self.username
     
     def set_password(self, raw_password):
-        self.password = make_password(raw_password)
+        self.password = hash_password(raw_password)
+
+    async def aset_password(self, raw_password):
+        self.password = await ahash_password(raw_password)
 
     def check_password(self, raw_password):
-        return check_password(raw_password, self.password)
+        is_correct, must_update = verify_password(raw_password, self.password)
+        if is_correct and must_update:
+            self.rehash_password(raw_password)
+        return is_correct
+
+    async def acheck_password(self, raw_password):
+
+        """
+        Awaitable `check_password`, for asynchronous views.
+        """
+
+        is_correct, must_update = await averify_password(raw_password, self.password)
+        if is_correct and must_update:
+            await sync_to_async(self.update_password)(await ahash_password(raw_password))
+        return is_correct
+
+    def rehash_password(self, raw_password):
+
+        """
+        Replaces a hash made with a previous hasher or iteration count with one made with the current settings.
+        """
+
+        self.update_password(hash_password(raw_password))
+
+    def update_password(self, password):
+
+        """
+        Writes a new password hash. Only the password is written, and only if it was not changed in the meantime.
+        """
+
+        if self.pk and type(self).objects(id=self.pk, password=self.password).update_one(set__password=password):
+            self.password = password
+            user_updated.send(sender=type(self), document=self)
     
-    def generate_otp(self):
-        self.otp = ''.join(random.choices(string.digits, k=4))
-        # self.otp = '0000'
-        self.otp_expires_at = datetime.utcnow() + timedelta(minutes=5)
-        self.save()
+    def generate_otp(self, purpose=None):
+
+        """
+        Issues a new one-time password for the user's email, replacing any previous one of the same purpose.
+
+        Args:
+            purpose (str): OneTimePassword.OTP, the default, to verify the email, or
+                OneTimePassword.PASSWORD_RESET_OTP to reset the password.
+
+        Returns:
+            str: The code to send to the user.
+        """
+
+        return OneTimePassword.issue(self.email, purpose or OneTimePassword.OTP)
 
     def verify_otp(self, otp):
-        if self.otp == otp and self.otp_expires_at > datetime.utcnow():
-        # if self.otp == otp:
+
+        """
+        Consumes the user's one-time password if it matches and has not expired.
+
+        A verified code marks the email as verified. Only a code sent by ForgotPasswordResetView
+        also allows one password reset with ResetPasswordForgotView for the next few minutes.
+        The user is only written the first time its email is verified.
+        """
+
+        if OneTimePassword.consume(self.email, otp, purpose=OneTimePassword.PASSWORD_RESET_OTP):
+            OneTimePassword.issue(self.email, OneTimePassword.PASSWORD_RESET)
+        elif not OneTimePassword.consume(self.email, otp):
+            return False
+        if not self.is_email_verified:
+            type(self).objects(id=self.pk).update_one(set__is_email_verified=True)
             self.is_email_verified = True
-            # self.otp = None
-            # self.otp_expires_at = None
-            self.save()
-            return True
-        return False
-    
+            user_updated.send(sender=type(self), document=self)
+        return True
+
+
+class OneTimePassword(Document):
+
+    """
+    A one-time password sent by email, or the password reset allowed once a password reset code is verified.
+
+    There is at most one of each purpose per email. MongoDB's TTL monitor deletes them once they
+    expire, which can lag by a minute, so lookups also check the expiry.
+    """
+
+    OTP = 'otp'
+    PASSWORD_RESET_OTP = 'password_reset_otp'
+    PASSWORD_RESET = 'password_reset'
+
+    email = EmailField(required=True)
+    purpose = StringField(max_length=20, default=OTP)
+    code = StringField(max_length=4)
+    expires_at = DateTimeField(required=True)
+
+    meta = {
+        'indexes': [
+            {'fields': ['email', 'purpose'], 'unique': True},
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0},
+        ]
+    }
+
+    @classmethod
+    def issue(cls, email, purpose=OTP, ttl=timedelta(minutes=5)):
+
+        """
+        Issues a new code for an email with a single upsert.
+
+        Returns:
+            str: The code.
+        """
+
+        code = ''.join(secrets.choice('0123456789') for _ in range(4))
+        cls._get_collection().update_one(
+            {'email': email, 'purpose': purpose},
+            {'$set': {'code': code, 'expires_at': datetime.utcnow() + ttl}},
+            upsert=True,
+        )
+        return code
+
+    @classmethod
+    def consume(cls, email, code=None, purpose=OTP):
+
+        """
+        Deletes an unexpired code with a single find-and-delete, so a code is only ever accepted once.
+
+        Args:
+            code (str): The code to match. Any code of the purpose when omitted.
+
+        Returns:
+            bool: Whether a matching code was found.
+        """
+
+        query = {'email': email, 'purpose': purpose, 'expires_at': {'$gt': datetime.utcnow()}}
+        if code is not None:
+            query['code'] = code
+        return cls._get_collection().find_one_and_delete(query, projection={'_id': 1}) is not None
+
 class BookingForChoices:
     SELF = 'Self'
     OTHER = 'Other'
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.contrib.auth import hashers
+
+logger = logging.getLogger(__name__)
+
+# 'pool' hashes passwords on a pool of worker processes, 'inline' in the calling thread.
+PASSWORD_HASH_MODE = getattr(settings, 'PASSWORD_HASH_MODE', 'pool')
+PASSWORD_HASH_WORKERS = getattr(settings, 'PASSWORD_HASH_WORKERS', 2)
+# The number of hashes that synchronous callers may have waiting for a worker. Further callers block
+# until a slot frees up, so a burst of logins queues in the request threads instead of piling up in
+# the pool. Asynchronous callers wait on the pool without holding a thread, so they take no slot.
+PASSWORD_HASH_QUEUE_SIZE = getattr(settings, 'PASSWORD_HASH_QUEUE_SIZE', 8)
+# Worker processes are spawned rather than forked, so they never inherit the locks of the
+# database and server threads of the parent.
+PASSWORD_HASH_START_METHOD = getattr(settings, 'PASSWORD_HASH_START_METHOD', 'spawn')
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_SIZE)
+
+
+def get_executor():
+
+    """
+    Returns the password hashing pool, starting it on first use so processes that never hash a
+    password, e.g. management commands, never start workers.
+    """
+
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context(PASSWORD_HASH_START_METHOD),
+            )
+        return _executor
+
+
+def reset_executor(executor):
+
+    """
+    Drops a broken pool, e.g. after a worker was killed, so the next hash starts a new one.
+    """
+
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def run(function, *args, mode=None):
+
+    """
+    Runs a hashing function on the password hashing pool, or inline.
+
+    Hashing is CPU-bound by design, so running it on a bounded pool of processes keeps logins from
+    starving the request threads of CPU time and caps the number of hashes computed at once.
+    If the pool breaks, the hash is computed inline.
+
+    Args:
+        function (callable): A picklable module-level function.
+        mode (str): 'pool' or 'inline'. PASSWORD_HASH_MODE when omitted.
+    """
+
+    if (mode or PASSWORD_HASH_MODE) == 'inline':
+        return function(*args)
+
+    with _slots:
+        executor = get_executor()
+        try:
+            return executor.submit(function, *args).result()
+        except BrokenProcessPool:
+            logger.warning('The password hashing pool broke, hashing inline', exc_info=True)
+            reset_executor(executor)
+    return function(*args)
+
+
+async def arun(function, *args, mode=None):
+
+    """
+    Awaitable `run`, for asynchronous views.
+
+    The event loop awaits the pool's future, so no thread is held while the hash is computed. In
+    inline mode, or if the pool breaks, the hash is computed on the loop's default thread executor,
+    so the event loop never blocks on it.
+    """
+
+    if (mode or PASSWORD_HASH_MODE) != 'inline':
+        executor = get_executor()
+        try:
+            return await asyncio.wrap_future(executor.submit(function, *args))
+        except BrokenProcessPool:
+            logger.warning('The password hashing pool broke, hashing in a thread', exc_info=True)
+            reset_executor(executor)
+    return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+
+def hash_password(raw_password, mode=None):
+
+    """
+    Hashes a password with the preferred hasher, the first of PASSWORD_HASHERS.
+
+    Returns:
+        str: The encoded hash.
+    """
+
+    return run(hashers.make_password, raw_password, mode=mode)
+
+
+def verify_password(raw_password, encoded, mode=None):
+
+    """
+    Checks a password against an encoded hash.
+
+    Returns:
+        tuple: Whether the password is correct, and whether the hash was made with another hasher
+        or other parameters than the preferred ones and should be rehashed.
+    """
+
+    return run(hashers.verify_password, raw_password, encoded, mode=mode)
+
+
+async def ahash_password(raw_password, mode=None):
+
+    """
+    Awaitable `hash_password`.
+    """
+
+    return await arun(hashers.make_password, raw_password, mode=mode)
+
+
+async def averify_password(raw_password, encoded, mode=None):
+
+    """
+    Awaitable `verify_password`.
+    """
+
+    return await arun(hashers.verify_password, raw_password, encoded, mode=mode)
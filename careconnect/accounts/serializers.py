@@ -38,7 +38,7 @@ class UserSerializer(DocumentSerializer):
 
         return super().validate(attrs)
         
-    def perform_create(self, validated_data):
+    def create(self, validated_data):
 
         """
         Create a new user with the given validated data.
@@ -51,14 +51,19 @@ class UserSerializer(DocumentSerializer):
         """
 
         password = validated_data.pop('password')
+        # The view may have hashed the password already, e.g. without blocking the event loop
+        password_hash = validated_data.pop('password_hash', None)
         user = User(**validated_data)
-        user.set_password(password)  # Hash the password
-        user.generate_otp()
+        if password_hash:
+            user.password = password_hash
+        else:
+            user.set_password(password)  # Hash the password
         user.save()
+        otp = user.generate_otp()
 
         email_data = {
             'email_subject': 'Your OTP Code',
-            'email_body': f'Your OTP Code is {user.otp}',
+            'email_body': f'Your OTP Code is {otp}',
             'to_email': user.email
         }
 
@@ -108,9 +113,10 @@ class ResetPasswordProfileSerializer(serializers.Serializer):
 class ResetPasswordForgotSerializer(serializers.Serializer):
     email = serializers.EmailField()
     new_password = serializers.CharField()
+    otp = serializers.CharField(required=False)
 
     class Meta:
-        fields = ['email', 'new_password']
+        fields = ['email', 'new_password', 'otp']
 
 
 class PatientSerializer(DocumentSerializer):
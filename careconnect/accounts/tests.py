@@ -1,3 +1,198 @@
-from django.test import TestCase
+import time
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory
+
+from .email_utils import EmailDispatcher
+from .models import OneTimePassword, Patient, User
+from .throttling import LocalTokenBucketBackend, RedisTokenBucketBackend
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class CountingBackend(EmailBackend):
+
+    """
+    Locmem backend that counts the connections opened, and fails the first sends when asked to.
+    """
+
+    opened = 0
+    failures = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        if CountingBackend.failures:
+            CountingBackend.failures -= 1
+            raise ConnectionError('SMTP server unavailable')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='accounts.tests.CountingBackend')
+class EmailDispatcherTests(SimpleTestCase):
+
+    def setUp(self):
+        mail.outbox = []
+        CountingBackend.opened = 0
+        CountingBackend.failures = 0
+
+    def get_message(self, index):
+        return EmailMessage(subject='Your OTP Code', body=f'Your OTP Code is {index}', to=[f'user{index}@example.com'])
+
+    def test_batches_messages_over_one_connection(self):
+        dispatcher = EmailDispatcher(workers=1, batch_size=50, batch_wait=0.5, retry_backoff=0)
+
+        for index in range(20):
+            self.assertTrue(dispatcher.enqueue(self.get_message(index)))
+
+        self.assertTrue(dispatcher.flush(timeout=5))
+        self.assertEqual(len(mail.outbox), 20)
+        self.assertEqual(CountingBackend.opened, 1)
+        self.assertEqual(dispatcher.metrics()['sent'], 20)
+        self.assertEqual(dispatcher.metrics()['queued'], 0)
+
+    def test_retries_failed_messages(self):
+        CountingBackend.failures = 2
+        dispatcher = EmailDispatcher(workers=1, max_retries=3, retry_backoff=0)
+
+        dispatcher.enqueue(self.get_message(1))
+
+        self.assertTrue(dispatcher.flush(timeout=5))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(dispatcher.metrics()['retried'], 2)
+        self.assertEqual(dispatcher.metrics()['failed'], 0)
+
+    def test_gives_up_after_the_retries(self):
+        CountingBackend.failures = 10
+        dispatcher = EmailDispatcher(workers=1, max_retries=2, retry_backoff=0)
+
+        dispatcher.enqueue(self.get_message(1))
+
+        self.assertTrue(dispatcher.flush(timeout=5))
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(dispatcher.metrics()['failed'], 1)
+
+    def test_drops_messages_when_the_queue_is_full(self):
+        dispatcher = EmailDispatcher(workers=1, queue_size=1)
+        # Occupies the queue without starting the workers that would drain it.
+        dispatcher.threads = [None]
+        dispatcher.queue.put(self.get_message(0))
+
+        self.assertFalse(dispatcher.enqueue(self.get_message(1), timeout=0))
+        self.assertEqual(dispatcher.metrics()['dropped'], 1)
+
+
+class TokenBucketTests(SimpleTestCase):
+
+    def test_allows_a_burst_then_refills(self):
+        backend = LocalTokenBucketBackend()
+
+        results = [backend.consume('throttle:test', 3, 10)[0] for _ in range(4)]
+
+        self.assertEqual(results, [True, True, True, False])
+        self.assertGreater(backend.consume('throttle:test', 3, 10)[1], 0)
+        time.sleep(0.15)
+        self.assertTrue(backend.consume('throttle:test', 3, 10)[0])
+
+    def test_keeps_the_buckets_apart(self):
+        backend = LocalTokenBucketBackend()
+
+        self.assertTrue(backend.consume('throttle:a', 1, 1)[0])
+        self.assertFalse(backend.consume('throttle:a', 1, 1)[0])
+        self.assertTrue(backend.consume('throttle:b', 1, 1)[0])
+
+    @skipUnless(fakeredis, 'fakeredis is not installed')
+    def test_redis_backend(self):
+        backend = RedisTokenBucketBackend(client=fakeredis.FakeRedis())
+
+        results = [backend.consume('throttle:test', 2, 1)[0] for _ in range(3)]
+
+        self.assertEqual(results, [True, True, False])
+
+
+def import_views():
+
+    """
+    Imports accounts.views without a database. Its class-level querysets would otherwise connect to
+    MongoDB at import, to create the indexes of the user and patient collections.
+    """
+
+    with mock.patch.dict(User._meta, {'auto_create_index': False}), mock.patch.dict(Patient._meta, {'auto_create_index': False}):
+        from . import views
+    return views
+
+
+@mock.patch.dict('accounts.throttling.THROTTLE_RATES', {'login_ip': '100/min', 'login_email': '2/min'}, clear=True)
+class LoginThrottleTests(SimpleTestCase):
+
+    def setUp(self):
+        throttling_backend = LocalTokenBucketBackend()
+        patcher = mock.patch('accounts.throttling.get_backend', return_value=throttling_backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        views = import_views()
+        patcher = mock.patch.object(views, 'User')
+        self.user = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user.objects.get.return_value.acheck_password = mock.AsyncMock(return_value=False)
+        self.view = views.CustomLoginView.as_view()
+
+    def login(self, email, **headers):
+        request = APIRequestFactory().post('/accounts/login/', {'email': email, 'password': 'wrong'}, format='json', **headers)
+        return async_to_sync(self.view)(request)
+
+    def test_rejects_before_looking_up_the_user(self):
+        statuses = [self.login('patient@example.com').status_code for _ in range(3)]
+
+        self.assertEqual(statuses, [400, 400, 429])
+        self.assertEqual(self.user.objects.get.call_count, 2)
+        # Another email is not affected
+        self.assertEqual(self.login('other@example.com').status_code, 400)
+
+    @mock.patch.dict('accounts.throttling.THROTTLE_RATES', {'login_ip': '2/min'}, clear=True)
+    def test_forged_forwarded_for_does_not_reset_the_ip_bucket(self):
+        statuses = [
+            self.login(f'patient{index}@example.com', HTTP_X_FORWARDED_FOR=f'203.0.113.{index}').status_code
+            for index in range(3)
+        ]
+
+        self.assertEqual(statuses, [400, 400, 429])
+
+
+@mock.patch.object(OneTimePassword, 'issue')
+class VerifyOTPTests(SimpleTestCase):
+
+    def setUp(self):
+        self.user = User(email='patient@example.com', is_email_verified=True)
+
+    def consume_only(self, accepted_purpose):
+        return lambda email, code=None, purpose=OneTimePassword.OTP: purpose == accepted_purpose
+
+    def test_email_code_allows_no_password_reset(self, issue):
+        with mock.patch.object(OneTimePassword, 'consume', side_effect=self.consume_only(OneTimePassword.OTP)):
+            self.assertTrue(self.user.verify_otp('1234'))
+
+        issue.assert_not_called()
+
+    def test_password_reset_code_allows_one_reset(self, issue):
+        with mock.patch.object(OneTimePassword, 'consume', side_effect=self.consume_only(OneTimePassword.PASSWORD_RESET_OTP)):
+            self.assertTrue(self.user.verify_otp('1234'))
+
+        issue.assert_called_once_with('patient@example.com', OneTimePassword.PASSWORD_RESET)
+
+    def test_rejects_unknown_codes(self, issue):
+        with mock.patch.object(OneTimePassword, 'consume', return_value=False):
+            self.assertFalse(self.user.verify_otp('1234'))
+
+        issue.assert_not_called()
@@ -0,0 +1,210 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+# 'local' keeps the buckets in the memory of each process, 'redis' shares them between the workers.
+THROTTLE_BACKEND = getattr(settings, 'THROTTLE_BACKEND', 'local')
+THROTTLE_REDIS_URL = getattr(settings, 'THROTTLE_REDIS_URL', 'redis://127.0.0.1:6379/1')
+# The number of buckets the local backend keeps. The least recently used ones are dropped first.
+THROTTLE_LOCAL_MAX_KEYS = getattr(settings, 'THROTTLE_LOCAL_MAX_KEYS', 100000)
+# '<requests>/<period>' per scope and key, e.g. {'login_ip': '20/min'}. The requests are also the burst size.
+THROTTLE_RATES = getattr(settings, 'THROTTLE_RATES', {})
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+def parse_rate(rate):
+
+    """
+    Parses a '<requests>/<period>' rate.
+
+    Returns:
+        tuple: The bucket capacity and its refill rate in tokens per second.
+
+    Example:
+        parse_rate('10/min') == (10, 10 / 60)
+    """
+
+    requests, period = rate.split('/')
+    return int(requests), int(requests) / PERIODS[period]
+
+
+class LocalTokenBucketBackend:
+
+    """
+    Keeps the token buckets in this process. Each worker process throttles on its own.
+    """
+
+    def __init__(self, max_keys=THROTTLE_LOCAL_MAX_KEYS):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate):
+
+        """
+        Takes a token from a bucket, refilling it for the time elapsed since the last request.
+
+        Returns:
+            tuple: Whether a token was taken, and the seconds until the next token otherwise.
+        """
+
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated_at = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill_rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return allowed, 0 if allowed else (1 - tokens) / refill_rate
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class RedisTokenBucketBackend:
+
+    """
+    Keeps the token buckets in Redis, shared by every worker.
+
+    A bucket is a hash updated by a Lua script, so taking a token is a single atomic round trip.
+    The script uses the Redis clock, so the workers' clocks do not need to agree, and buckets
+    expire once they would be full again.
+    """
+
+    SCRIPT = '''
+        local capacity = tonumber(ARGV[1])
+        local refill_rate = tonumber(ARGV[2])
+        local time = redis.call('TIME')
+        local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+        local tokens = tonumber(bucket[1]) or capacity
+        local updated_at = tonumber(bucket[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * refill_rate)
+        local allowed = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+            allowed = 1
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+        redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / refill_rate * 1000) + 1000)
+        return {allowed, tostring(tokens)}
+    '''
+
+    def __init__(self, url=THROTTLE_REDIS_URL, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url, socket_timeout=0.1, socket_connect_timeout=0.1)
+        self.client = client
+        self.script = client.register_script(self.SCRIPT)
+
+    def consume(self, key, capacity, refill_rate):
+
+        """
+        Takes a token from a bucket. If Redis cannot be reached, the request is let through, so an
+        outage of the throttle does not lock users out.
+
+        Returns:
+            tuple: Whether a token was taken, and the seconds until the next token otherwise.
+        """
+
+        try:
+            allowed, tokens = self.script(keys=[key], args=[capacity, refill_rate])
+        except Exception:
+            logger.warning('Could not reach the throttle backend, allowing the request', exc_info=True)
+            return True, 0
+        if allowed:
+            return True, 0
+        return False, (1 - float(tokens)) / refill_rate
+
+    def clear(self):
+        for key in self.client.scan_iter('throttle:*'):
+            self.client.delete(key)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+
+    """
+    Returns the throttle backend of THROTTLE_BACKEND, created on first use.
+    """
+
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = RedisTokenBucketBackend() if THROTTLE_BACKEND == 'redis' else LocalTokenBucketBackend()
+        return _backend
+
+
+class TokenBucketThrottle(BaseThrottle):
+
+    """
+    Throttles a view's requests with a token bucket per scope and key.
+
+    The scope is the view's `throttle_scope` and a suffix naming the key, e.g. 'login_ip', and its
+    rate comes from THROTTLE_RATES. Scopes without a rate are not throttled. DRF checks throttles
+    before the handler runs, so rejected requests never reach the database or the password hasher.
+    """
+
+    key_name = None
+
+    def get_key(self, request, view):
+        raise NotImplementedError('.get_key() must be overridden')
+
+    def allow_request(self, request, view):
+        self.wait_time = None
+        scope = getattr(view, 'throttle_scope', None)
+        rate = THROTTLE_RATES.get(f'{scope}_{self.key_name}') if scope else None
+        key = self.get_key(request, view) if rate else None
+        if not key:
+            return True
+
+        allowed, self.wait_time = get_backend().consume(f'throttle:{scope}:{self.key_name}:{key}', *parse_rate(rate))
+        return allowed
+
+    def wait(self):
+        return math.ceil(self.wait_time) if self.wait_time else None
+
+
+class IPThrottle(TokenBucketThrottle):
+
+    """
+    Throttles per client IP, as resolved by DRF's `get_ident`.
+
+    The IP is REMOTE_ADDR, or the address NUM_PROXIES entries from the end of X-Forwarded-For when
+    REST_FRAMEWORK['NUM_PROXIES'] is set. It must be set to the number of proxies in front of the
+    app: when it is unset, DRF keys on the whole X-Forwarded-For header, which a client can change
+    on every request to get a fresh bucket.
+    """
+
+    key_name = 'ip'
+
+    def get_key(self, request, view):
+        return self.get_ident(request)
+
+
+class EmailThrottle(TokenBucketThrottle):
+
+    """
+    Throttles per email address of the request body, so one account cannot be hammered from many IPs.
+    """
+
+    key_name = 'email'
+
+    def get_key(self, request, view):
+        data = request.data
+        email = data.get('email') if hasattr(data, 'get') else None
+        return email.strip().lower() if isinstance(email, str) and email.strip() else None
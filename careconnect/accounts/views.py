@@ -1,24 +1,38 @@
+from asgiref.sync import sync_to_async
 from rest_framework_mongoengine import viewsets
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework.permissions import AllowAny
 from rest_framework.views import APIView
-from .models import User, Patient
+from .models import OneTimePassword, User, Patient
 from .serializers import UserSerializer, LoginSerializer, ForgotPasswordResetSerializer, ResetPasswordProfileSerializer, VerifyOTPSerializer, PatientSerializer, ResetPasswordForgotSerializer
 from .authentication import JWTAuthentication
+from .passwords import ahash_password
 from .email_utils import EmailUtil
+from .throttling import EmailThrottle, IPThrottle
 from .authentication import JWTAuthentication
 from rest_framework.exceptions import ValidationError
+from core.async_views import AsyncAPIView, AsyncViewMixin
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(AsyncViewMixin, viewsets.ModelViewSet):
 
     """
     Allows users to register.
+
+    Registration is asynchronous, so the request waits for its password hash without holding a thread.
     """
 
     permission_classes = [AllowAny]
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    throttle_classes = [IPThrottle, EmailThrottle]
+    throttle_scope = 'register'
+
+    def get_throttles(self):
+        # Only registrations are throttled
+        if self.action != 'create':
+            return []
+        return super().get_throttles()
 
     def destroy(self, request, *args, **kwargs):
 
@@ -45,7 +59,7 @@ class UserViewSet(viewsets.ModelViewSet):
         except Exception:
             return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
         
-    def create(self, request, *args, **kwargs):
+    async def create(self, request, *args, **kwargs):
         """
         Creates a new user.
         
@@ -60,19 +74,23 @@ class UserViewSet(viewsets.ModelViewSet):
         """
         serializer = self.get_serializer(data=request.data)
         try:
-            serializer.is_valid(raise_exception=True)
+            await sync_to_async(serializer.is_valid)(raise_exception=True)
         except ValidationError as e:
             # Customize the error response to be a dictionary
             error_response = {key: value[0] if isinstance(value, list) else value for key, value in e.detail.items()}
             return Response(error_response, status=status.HTTP_400_BAD_REQUEST)
 
-        self.perform_create(serializer)
-        headers = self.get_success_headers(serializer.data)
-        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+        password_hash = await ahash_password(serializer.validated_data['password'])
+        await sync_to_async(serializer.save)(password_hash=password_hash)
+        data = await sync_to_async(getattr)(serializer, 'data')
+        headers = self.get_success_headers(data)
+        return Response(data, status=status.HTTP_201_CREATED, headers=headers)
 
-class CustomLoginView(APIView):
+class CustomLoginView(AsyncAPIView):
     permission_classes = [AllowAny]
-    def post(self, request, *args, **kwargs):
+    throttle_classes = [IPThrottle, EmailThrottle]
+    throttle_scope = 'login'
+    async def post(self, request, *args, **kwargs):
 
         """
         Handles the HTTP POST request for logging in a user.
@@ -97,9 +115,9 @@ class CustomLoginView(APIView):
             password = serializer.validated_data['password']
             
             try: 
-                user_obj = User.objects.get(email=email)
+                user_obj = await sync_to_async(User.objects.get)(email=email)
                 if user_obj:
-                    if user_obj.check_password(password):
+                    if await user_obj.acheck_password(password):
                         token = JWTAuthentication.generate_jwt(user_obj)
                     
                         return_dict = {
@@ -119,6 +137,8 @@ class CustomLoginView(APIView):
 
 class VerifyOTPView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [IPThrottle, EmailThrottle]
+    throttle_scope = 'verify_otp'
 
     def post(self, request, *args, **kwargs):
 
@@ -153,6 +173,8 @@ class VerifyOTPView(APIView):
 
 class ForgotPasswordResetView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [IPThrottle, EmailThrottle]
+    throttle_scope = 'forgot_password'
     
     def post(self, request):
 
@@ -178,23 +200,24 @@ class ForgotPasswordResetView(APIView):
             email = serializer.validated_data['email']
             try:
                 user = User.objects.get(email=email)
-                user.generate_otp()  # Generates and saves the OTP
+                # Stored in the OTP collection, the user is not written. Only this code allows a password reset.
+                otp = user.generate_otp(OneTimePassword.PASSWORD_RESET_OTP)
                 send_email_data = {
                     'email_subject': 'Your OTP Code',
-                    'email_body': f'Your OTP Code is {user.otp}',
+                    'email_body': f'Your OTP Code is {otp}',
                     'to_email': user.email
                 }
                 EmailUtil.send_email(send_email_data)
-                return Response({'message': 'OTP sent successfully', 'otp': user.otp}, status=status.HTTP_200_OK)
+                return Response({'message': 'OTP sent successfully'}, status=status.HTTP_200_OK)
             except User.DoesNotExist:
                 return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class ResetPasswordProfileView(APIView):
+class ResetPasswordProfileView(AsyncAPIView):
     permission_classes = [AllowAny]
 
-    def post(self, request):
+    async def post(self, request):
         
         """
         Resets the password for a user.
@@ -219,32 +242,34 @@ class ResetPasswordProfileView(APIView):
             return Response({'error': 'Current password and new password are required'}, status=status.HTTP_400_BAD_REQUEST)
         
         if serializer.is_valid():
-            user_token = JWTAuthentication.get_current_user(self, request) 
+            user_token = await sync_to_async(JWTAuthentication.get_current_user)(self, request)
             if user_token is None:
                 return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
             
             user_email = user_token.email
             
-            if not user_token.check_password(current_password):
+            if not await user_token.acheck_password(current_password):
                 return Response({'error': 'Current password is incorrect'}, status=status.HTTP_400_BAD_REQUEST)
 
             try:
-                user = User.objects.get(email=user_email)
+                user = await sync_to_async(User.objects.get)(email=user_email)
                 
-                if user.check_password(new_password):
+                if await user.acheck_password(new_password):
                     return Response({'error': 'New password cannot be the same as the old password'}, status=status.HTTP_400_BAD_REQUEST)
 
-                user.set_password(new_password)
-                user.save()
+                await user.aset_password(new_password)
+                await sync_to_async(user.save)()
                 return Response({'message': 'Password reset successfully'}, status=status.HTTP_200_OK)
             except User.DoesNotExist:
                 return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class ResetPasswordForgotView(APIView):
+class ResetPasswordForgotView(AsyncAPIView):
     permission_classes = [AllowAny]
+    throttle_classes = [IPThrottle, EmailThrottle]
+    throttle_scope = 'reset_password'
 
-    def post(self, request):
+    async def post(self, request):
         """
         Handles the POST request for resetting the password. Validates the request data using the ResetPasswordForgotSerializer. 
         If the data is valid, retrieves the user with the given email from the User model. Verifies the OTP and sets a new password for the user. 
@@ -256,16 +281,21 @@ class ResetPasswordForgotView(APIView):
         if serializer.is_valid():
             email = serializer.validated_data['email']
             new_password = serializer.validated_data['new_password']
+            otp = serializer.validated_data.get('otp')
 
             try:
-                user = User.objects.get(email=email)
-                otp = user.otp
+                user = await sync_to_async(User.objects.get)(email=email)
 
-                if not user.verify_otp(otp):
+                # Consumes the password reset code sent with the request, or the reset allowed by verifying it with VerifyOTPView
+                if otp:
+                    allowed = await sync_to_async(OneTimePassword.consume)(email, otp, purpose=OneTimePassword.PASSWORD_RESET_OTP)
+                else:
+                    allowed = await sync_to_async(OneTimePassword.consume)(email, purpose=OneTimePassword.PASSWORD_RESET)
+                if not allowed:
                     return Response({'error': 'Reset password link expired'}, status=status.HTTP_400_BAD_REQUEST)
                 
-                user.set_password(new_password)
-                user.save()
+                await user.aset_password(new_password)
+                await sync_to_async(user.save)()
                 return Response({'message': 'Password reset successfully'}, status=status.HTTP_200_OK)
             except User.DoesNotExist:
                 return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
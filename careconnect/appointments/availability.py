@@ -0,0 +1,454 @@
+import logging
+from datetime import datetime, timedelta
+from bson import ObjectId
+from mongoengine import signals
+from pymongo import UpdateMany
+from pymongo.errors import BulkWriteError
+from healthcare.models import Doctor, WorkingTime
+from .models import Appointment, AppointmentStatusChoice, DoctorPackage, DoctorSchedule, DoctorSlot
+
+DEFAULT_SLOT_MINUTES = 15
+# Slots are generated lazily, whole days at a time, as far ahead as clients ask.
+GENERATION_CHUNK_DAYS = 14
+MAX_RANGE_DAYS = 31
+NEXT_AVAILABLE_HORIZON_DAYS = 90
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+DOCTOR_ENTITY_TYPE = 1
+# Returned by parse_weekday for a day it cannot read, unlike None which means every day.
+UNKNOWN_DAY = -1
+
+# Concurrent generations of the same days insert the same slots; the unique index rejects the duplicates.
+DUPLICATE_KEY_ERROR = 11000
+
+logger = logging.getLogger(__name__)
+
+
+def parse_duration(value):
+
+    """
+    Returns a package duration in minutes, falling back to the default slot length when it is missing or malformed.
+    """
+
+    try:
+        minutes = int(str(value).strip())
+    except (TypeError, ValueError):
+        return DEFAULT_SLOT_MINUTES
+    return minutes if minutes > 0 else DEFAULT_SLOT_MINUTES
+
+
+def parse_weekday(value):
+
+    """
+    Returns the weekday (0 for Monday) of a WorkingTime day, stored either as 1-7 or as a day name.
+
+    Returns None when the day is empty, meaning the working hours apply to every day, and UNKNOWN_DAY
+    when it is neither a day number nor a day name.
+    """
+
+    value = '' if value is None else str(value).strip().lower()
+    if not value:
+        return None
+    if value.isdigit():
+        return (int(value) - 1) % 7
+    for index, name in enumerate(WEEKDAYS):
+        if name.startswith(value[:3]):
+            return index
+    return UNKNOWN_DAY
+
+
+def parse_time(value):
+
+    """
+    Returns the minutes since midnight of an "HH:MM" string, or None if it is malformed.
+    """
+
+    try:
+        hours, minutes = (int(part) for part in str(value).split(':'))
+    except (TypeError, ValueError):
+        return None
+    if not (0 <= hours <= 24 and 0 <= minutes < 60):
+        return None
+    return hours * 60 + minutes
+
+
+def start_of_day(value):
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def get_working_hours(doctor_id):
+
+    """
+    Returns the working hours of a doctor as (weekday or None, start minute, end minute) tuples.
+
+    Working times are linked either by their entity fields or by the doctor's `working_time_id`. Rows
+    whose day cannot be read are skipped and logged rather than applied to every day.
+    """
+
+    doctor = Doctor._get_collection().find_one({'_id': doctor_id}, {'working_time_id': 1})
+    query = {'entity_type': DOCTOR_ENTITY_TYPE, 'entity_id': str(doctor_id)}
+    if doctor and doctor.get('working_time_id'):
+        query = {'$or': [query, {'_id': doctor['working_time_id']}]}
+
+    hours = []
+    for working_time in WorkingTime._get_collection().find(query, {'day': 1, 'start_time': 1, 'end_time': 1}):
+        weekday = parse_weekday(working_time.get('day'))
+        if weekday == UNKNOWN_DAY:
+            logger.warning('Skipping working time %s of doctor %s with an unknown day %r', working_time['_id'], doctor_id, working_time.get('day'))
+            continue
+        start, end = parse_time(working_time.get('start_time')), parse_time(working_time.get('end_time'))
+        if start is not None and end is not None and start < end:
+            hours.append((weekday, start, end))
+    return hours
+
+
+def get_slot_minutes(doctor_id):
+
+    """
+    Returns the slot length of a doctor: the shortest duration of their packages.
+    """
+
+    durations = [parse_duration(package.get('duration')) for package in DoctorPackage._get_collection().find({'doctor_id': doctor_id}, {'duration': 1})]
+    return min(durations, default=DEFAULT_SLOT_MINUTES)
+
+
+def get_appointment_range(appointment):
+
+    """
+    Returns the start and end of an appointment, using the duration of its package.
+    """
+
+    package = appointment.package_id
+    duration = parse_duration(package.duration if package else None)
+    return appointment.date_time, appointment.date_time + timedelta(minutes=duration)
+
+
+def get_booked_ranges(doctor_id, start, end):
+
+    """
+    Returns the start and end of the booked appointments of a doctor that may overlap the days between two dates.
+
+    Returns:
+        dict: (start, end) tuples keyed by appointment ID.
+    """
+
+    appointments = list(Appointment._get_collection().find(
+        {
+            'doctor_id': doctor_id,
+            'status': {'$ne': AppointmentStatusChoice.CANCELLED},
+            'date_time': {'$gte': start - timedelta(days=1), '$lt': end},
+        },
+        {'date_time': 1, 'package_id': 1},
+    ))
+    package_ids = list({appointment.get('package_id') for appointment in appointments})
+    durations = {
+        package['_id']: parse_duration(package.get('duration'))
+        for package in DoctorPackage._get_collection().find({'_id': {'$in': package_ids}}, {'duration': 1})
+    }
+    return {
+        appointment['_id']: (
+            appointment['date_time'],
+            appointment['date_time'] + timedelta(minutes=durations.get(appointment.get('package_id'), DEFAULT_SLOT_MINUTES)),
+        )
+        for appointment in appointments
+    }
+
+
+def generate_slots(doctor_id, start, end, slot_minutes):
+
+    """
+    Builds the slot documents of a doctor between two dates, marking the ones taken by booked appointments.
+
+    Args:
+        doctor_id (ObjectId): The doctor ID.
+        start (datetime): The first day to generate, at midnight.
+        end (datetime): The day after the last day to generate, at midnight.
+        slot_minutes (int): The slot length in minutes.
+
+    Returns:
+        list: The raw slot documents.
+    """
+
+    hours = get_working_hours(doctor_id)
+    slots = []
+    day = start
+    while day < end:
+        for weekday, first_minute, last_minute in hours:
+            if weekday is not None and weekday != day.weekday():
+                continue
+            minute = first_minute
+            while minute + slot_minutes <= last_minute:
+                slot_start = day + timedelta(minutes=minute)
+                slots.append({
+                    'doctor_id': doctor_id,
+                    'start': slot_start,
+                    'end': slot_start + timedelta(minutes=slot_minutes),
+                    'appointment_id': None,
+                })
+                minute += slot_minutes
+        day += timedelta(days=1)
+
+    if slots:
+        for appointment_id, (booked_start, booked_end) in get_booked_ranges(doctor_id, start, end).items():
+            for slot in slots:
+                if slot['start'] < booked_end and slot['end'] > booked_start:
+                    slot['appointment_id'] = appointment_id
+
+    return slots
+
+
+def rebook_generated_slots(doctor_id, windows, marked_ids):
+
+    """
+    Brings newly inserted slots up to date with the appointments booked, moved or cancelled while they were generated.
+
+    `book_slots` runs when an appointment is saved, but finds no slot for days that are still being
+    generated. Once the slots are inserted, the appointments of those days are read again and their
+    slots taken as `book_slots` would, and the appointments the slots were marked with that are no
+    longer booked in these days release theirs.
+
+    Args:
+        doctor_id (ObjectId): The doctor ID.
+        windows (list): The (start, end) ranges of the generated days.
+        marked_ids (set): The appointment IDs the generated slots were marked with.
+    """
+
+    booked = {}
+    for start, end in windows:
+        booked.update(get_booked_ranges(doctor_id, start, end))
+
+    operations = [
+        UpdateMany({'appointment_id': appointment_id}, {'$set': {'appointment_id': None}})
+        for appointment_id in marked_ids - booked.keys()
+    ]
+    for appointment_id, (booked_start, booked_end) in booked.items():
+        operations.append(UpdateMany(
+            {'appointment_id': appointment_id, '$or': [{'start': {'$gte': booked_end}}, {'end': {'$lte': booked_start}}]},
+            {'$set': {'appointment_id': None}},
+        ))
+        operations.append(UpdateMany(
+            {'doctor_id': doctor_id, 'start': {'$lt': booked_end}, 'end': {'$gt': booked_start}},
+            {'$set': {'appointment_id': appointment_id}},
+        ))
+    if operations:
+        DoctorSlot._get_collection().bulk_write(operations, ordered=True)
+
+
+def ensure_slots(doctor_id, start, end):
+
+    """
+    Makes sure the slot index of a doctor covers the days between two datetimes, generating the missing days.
+
+    Args:
+        doctor_id (ObjectId): The doctor ID.
+        start (datetime): The start of the range.
+        end (datetime): The end of the range.
+
+    Returns:
+        DoctorSchedule: The doctor's schedule.
+    """
+
+    start, end = start_of_day(start), start_of_day(end) + timedelta(days=1)
+
+    schedule = DoctorSchedule.objects(doctor_id=doctor_id).first()
+    if schedule is None:
+        schedule = DoctorSchedule(doctor_id=doctor_id, slot_minutes=get_slot_minutes(doctor_id), generated_from=start, generated_until=start)
+
+    missing = []
+    if start < schedule.generated_from:
+        missing.append((start, schedule.generated_from))
+    if end > schedule.generated_until:
+        missing.append((schedule.generated_until, end))
+    if not missing:
+        return schedule
+
+    slots = []
+    for missing_start, missing_end in missing:
+        slots.extend(generate_slots(doctor_id, missing_start, missing_end, schedule.slot_minutes))
+    if slots:
+        try:
+            DoctorSlot._get_collection().insert_many(slots, ordered=False)
+        except BulkWriteError as error:
+            if any(write_error['code'] != DUPLICATE_KEY_ERROR for write_error in error.details['writeErrors']):
+                raise
+        rebook_generated_slots(doctor_id, missing, {slot['appointment_id'] for slot in slots if slot['appointment_id']})
+
+    DoctorSchedule._get_collection().update_one(
+        {'doctor_id': doctor_id},
+        {
+            '$min': {'generated_from': min(start, schedule.generated_from)},
+            '$max': {'generated_until': max(end, schedule.generated_until)},
+            '$setOnInsert': {'slot_minutes': schedule.slot_minutes},
+        },
+        upsert=True,
+    )
+    schedule.generated_from = min(start, schedule.generated_from)
+    schedule.generated_until = max(end, schedule.generated_until)
+    return schedule
+
+
+def chain_slots(slots, duration):
+
+    """
+    Returns the slots at which an appointment of the given duration fits in consecutive free slots.
+
+    Args:
+        slots (list): Free slot documents, sorted by start.
+        duration (int): The appointment duration in minutes.
+
+    Returns:
+        list: (start, end) tuples, the end being the start plus the duration.
+    """
+
+    length = timedelta(minutes=duration)
+    available = []
+    for index, slot in enumerate(slots):
+        covered_until = slot['end']
+        following = index + 1
+        while covered_until - slot['start'] < length and following < len(slots) and slots[following]['start'] == covered_until:
+            covered_until = slots[following]['end']
+            following += 1
+        if covered_until - slot['start'] >= length:
+            available.append((slot['start'], slot['start'] + length))
+    return available
+
+
+def get_free_slots(doctor_id, start, end, duration=None, limit=None):
+
+    """
+    Returns the free slots of a doctor within a range, read from the slot index.
+
+    Args:
+        doctor_id (ObjectId): The doctor ID.
+        start (datetime): The start of the range. Slots in the past are never returned.
+        end (datetime): The end of the range.
+        duration (int): The appointment duration in minutes. Defaults to the slot length.
+        limit (int): The maximum number of slots to return.
+
+    Returns:
+        list: (start, end) tuples, sorted by start.
+    """
+
+    start = max(start, datetime.utcnow())
+    if start >= end:
+        return []
+
+    schedule = ensure_slots(doctor_id, start, end)
+    cursor = DoctorSlot._get_collection().find(
+        {'doctor_id': doctor_id, 'appointment_id': None, 'start': {'$gte': start, '$lt': end}},
+        {'start': 1, 'end': 1},
+    ).sort('start', 1)
+
+    if not duration or duration <= schedule.slot_minutes:
+        if limit:
+            cursor = cursor.limit(limit)
+        return [(slot['start'], slot['end']) for slot in cursor]
+
+    available = chain_slots(list(cursor), duration)
+    return available[:limit] if limit else available
+
+
+def get_next_available_slot(doctor_id, after=None, duration=None):
+
+    """
+    Returns the first free slot of a doctor, looking up to NEXT_AVAILABLE_HORIZON_DAYS ahead.
+
+    Args:
+        doctor_id (ObjectId): The doctor ID.
+        after (datetime): The earliest start. Defaults to now.
+        duration (int): The appointment duration in minutes. Defaults to the slot length.
+
+    Returns:
+        tuple: The (start, end) of the slot, or None if there is no free slot within the horizon.
+    """
+
+    start = max(after or datetime.utcnow(), datetime.utcnow())
+    horizon = start + timedelta(days=NEXT_AVAILABLE_HORIZON_DAYS)
+    while start < horizon:
+        end = min(start_of_day(start) + timedelta(days=GENERATION_CHUNK_DAYS), horizon)
+        slots = get_free_slots(doctor_id, start, end, duration=duration, limit=1)
+        if slots:
+            return slots[0]
+        start = end
+    return None
+
+
+def book_slots(appointment):
+
+    """
+    Updates the slot index for a booked, moved or cancelled appointment.
+
+    The slots previously held by the appointment are released, and unless it is cancelled the
+    slots overlapping its new time are taken.
+    """
+
+    DoctorSlot._get_collection().update_many({'appointment_id': appointment.id}, {'$set': {'appointment_id': None}})
+    if appointment.status == AppointmentStatusChoice.CANCELLED or not appointment.date_time:
+        return
+
+    doctor = appointment._data.get('doctor_id')
+    booked_start, booked_end = get_appointment_range(appointment)
+    DoctorSlot._get_collection().update_many(
+        {'doctor_id': doctor.id, 'start': {'$lt': booked_end}, 'end': {'$gt': booked_start}},
+        {'$set': {'appointment_id': appointment.id}},
+    )
+
+
+def release_slots(appointment):
+
+    """
+    Frees the slots held by a deleted appointment.
+    """
+
+    DoctorSlot._get_collection().update_many({'appointment_id': appointment.id}, {'$set': {'appointment_id': None}})
+
+
+def reset_schedule(doctor_id):
+
+    """
+    Drops the slot index of a doctor, so it is regenerated from the current working hours and packages on the next query.
+    """
+
+    reset_schedules([doctor_id])
+
+
+def reset_schedules(doctor_ids):
+
+    """
+    Drops the slot index of several doctors at once, e.g. after a bulk schedule import.
+    """
+
+    doctor_ids = list(doctor_ids)
+    if doctor_ids:
+        DoctorSlot._get_collection().delete_many({'doctor_id': {'$in': doctor_ids}})
+        DoctorSchedule._get_collection().delete_many({'doctor_id': {'$in': doctor_ids}})
+
+
+def update_appointment_slots(sender, document, **kwargs):
+    book_slots(document)
+
+
+def release_appointment_slots(sender, document, **kwargs):
+    release_slots(document)
+
+
+def reset_package_schedule(sender, document, **kwargs):
+    doctor = document._data.get('doctor_id')
+    if doctor is not None:
+        reset_schedule(doctor.id)
+
+
+def reset_working_time_schedules(sender, document, **kwargs):
+    doctor_ids = {doctor['_id'] for doctor in Doctor._get_collection().find({'working_time_id': document.id}, {'_id': 1})}
+    if document.entity_type == DOCTOR_ENTITY_TYPE and ObjectId.is_valid(document.entity_id):
+        doctor_ids.add(ObjectId(document.entity_id))
+    for doctor_id in doctor_ids:
+        reset_schedule(doctor_id)
+
+
+signals.post_save.connect(update_appointment_slots, sender=Appointment)
+signals.post_delete.connect(release_appointment_slots, sender=Appointment)
+signals.post_save.connect(reset_package_schedule, sender=DoctorPackage)
+signals.post_delete.connect(reset_package_schedule, sender=DoctorPackage)
+signals.post_save.connect(reset_working_time_schedules, sender=WorkingTime)
+signals.post_delete.connect(reset_working_time_schedules, sender=WorkingTime)
@@ -1,4 +1,4 @@
-from mongoengine import Document, StringField, IntField, ReferenceField, CASCADE, DateTimeField, BooleanField
+from mongoengine import Document, StringField, IntField, ReferenceField, CASCADE, DateTimeField, BooleanField, ObjectIdField
 from healthcare.models import Doctor
 from accounts.models import Patient, User
 from mongoengine.signals import pre_save
@@ -59,8 +59,32 @@ class Appointment(Document):
     def doctor(self, value):
         self.package_id.doctor_id = value
 
+class DoctorSchedule(Document):
+    doctor_id = ReferenceField(Doctor, reverse_delete_rule=CASCADE, required=True, unique=True)
+    slot_minutes = IntField(default=15)
+    generated_from = DateTimeField()
+    generated_until = DateTimeField()
+
+
+class DoctorSlot(Document):
+    doctor_id = ReferenceField(Doctor, reverse_delete_rule=CASCADE, required=True)
+    start = DateTimeField(required=True)
+    end = DateTimeField(required=True)
+    appointment_id = ObjectIdField(null=True)
+
+    meta = {
+        'indexes': [
+            {'fields': ('doctor_id', 'start'), 'unique': True},
+            ('doctor_id', 'appointment_id', 'start'),
+        ]
+    }
+
+
 def set_doctor_id(sender, document, **kwargs):
     if not document.doctor_id:
         document.doctor_id = document.package_id.doctor_id
 
-pre_save.connect(set_doctor_id, sender=Appointment)
\ No newline at end of file
+pre_save.connect(set_doctor_id, sender=Appointment)
+
+# Keeps the doctor slot index in sync with appointments, packages and working hours.
+from . import availability  # noqa: E402, F401
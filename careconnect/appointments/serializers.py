@@ -2,6 +2,7 @@ from rest_framework_mongoengine.serializers import DocumentSerializer
 from rest_framework import serializers
 from .models import DoctorPackage, Appointment, AppointmentStatusChoice
 from healthcare.serializers import DoctorSerializer
+from healthcare.loaders import BatchedListSerializer
 from accounts.serializers import PatientSerializer
 
 class DoctorPackageSerializer(DocumentSerializer):
@@ -9,6 +10,18 @@ class DoctorPackageSerializer(DocumentSerializer):
     class Meta:
         model = DoctorPackage
         fields = '__all__'
+        list_serializer_class = BatchedListSerializer
+
+    def prime(self, packages):
+
+        """
+        Registers the nested doctor data of a page of packages with the request's batch loader.
+
+        Args:
+            packages (list): The packages about to be serialized.
+        """
+
+        self.fields['doctor'].prime([package._data.get('doctor_id') for package in packages if package._data.get('doctor_id')])
     
     def create(self, validated_data):
 
@@ -37,6 +50,18 @@ class AppointmentSerializer(DocumentSerializer):
     class Meta:
         model = Appointment
         exclude = ['cancellation_reason', 'cancellation_time']
+        list_serializer_class = BatchedListSerializer
+
+    def prime(self, appointments):
+
+        """
+        Registers the nested doctor data of a page of appointments with the request's batch loader.
+
+        Args:
+            appointments (list): The appointments about to be serialized.
+        """
+
+        self.fields['doctor'].prime([appointment._data.get('doctor_id') for appointment in appointments if appointment._data.get('doctor_id')])
 
     def create(self, validated_data):
 
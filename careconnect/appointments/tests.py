@@ -1,3 +1,74 @@
-from django.test import TestCase
+from datetime import datetime
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from bson import ObjectId
+from django.test import SimpleTestCase
+
+from .availability import UNKNOWN_DAY, ensure_slots, parse_weekday
+
+
+@mock.patch('appointments.availability.DoctorSlot')
+@mock.patch('appointments.availability.generate_slots', return_value=[])
+@mock.patch('appointments.availability.DoctorSchedule')
+class EnsureSlotsTests(SimpleTestCase):
+
+    def get_schedule(self, schedule_model, generated_from, generated_until):
+        schedule = SimpleNamespace(slot_minutes=15, generated_from=generated_from, generated_until=generated_until)
+        schedule_model.objects.return_value.first.return_value = schedule
+        return schedule
+
+    def test_fills_the_gap_before_a_later_window(self, schedule_model, generate_slots, slot_model):
+        doctor_id = ObjectId()
+        schedule = self.get_schedule(schedule_model, datetime(2024, 1, 1), datetime(2024, 1, 15))
+
+        ensure_slots(doctor_id, datetime(2024, 2, 1, 9), datetime(2024, 2, 3, 17))
+
+        generate_slots.assert_called_once_with(doctor_id, datetime(2024, 1, 15), datetime(2024, 2, 4), 15)
+        self.assertEqual(schedule.generated_until, datetime(2024, 2, 4))
+
+    def test_fills_the_gap_after_an_earlier_window(self, schedule_model, generate_slots, slot_model):
+        doctor_id = ObjectId()
+        self.get_schedule(schedule_model, datetime(2024, 2, 1), datetime(2024, 2, 15))
+
+        ensure_slots(doctor_id, datetime(2024, 1, 10), datetime(2024, 1, 12))
+
+        generate_slots.assert_called_once_with(doctor_id, datetime(2024, 1, 10), datetime(2024, 2, 1), 15)
+
+    def test_rebooks_the_generated_days_after_inserting(self, schedule_model, generate_slots, slot_model):
+        doctor_id, appointment_id = ObjectId(), ObjectId()
+        self.get_schedule(schedule_model, datetime(2024, 1, 1), datetime(2024, 1, 15))
+        generate_slots.return_value = [
+            {'start': datetime(2024, 1, 15, 9), 'appointment_id': appointment_id},
+            {'start': datetime(2024, 1, 15, 10), 'appointment_id': None},
+        ]
+
+        with mock.patch('appointments.availability.rebook_generated_slots') as rebook:
+            ensure_slots(doctor_id, datetime(2024, 1, 15), datetime(2024, 1, 15))
+
+        slot_model._get_collection.return_value.insert_many.assert_called_once()
+        rebook.assert_called_once_with(doctor_id, [(datetime(2024, 1, 15), datetime(2024, 1, 16))], {appointment_id})
+
+    def test_covered_window_generates_nothing(self, schedule_model, generate_slots, slot_model):
+        self.get_schedule(schedule_model, datetime(2024, 1, 1), datetime(2024, 1, 15))
+
+        ensure_slots(ObjectId(), datetime(2024, 1, 3), datetime(2024, 1, 10))
+
+        generate_slots.assert_not_called()
+        schedule_model._get_collection.assert_not_called()
+
+
+class ParseWeekdayTests(SimpleTestCase):
+
+    def test_parses_numbers_and_names(self):
+        self.assertEqual(parse_weekday('1'), 0)
+        self.assertEqual(parse_weekday(7), 6)
+        self.assertEqual(parse_weekday(' Tuesday '), 1)
+        self.assertEqual(parse_weekday('sun'), 6)
+
+    def test_empty_day_means_every_day(self):
+        self.assertIsNone(parse_weekday(None))
+        self.assertIsNone(parse_weekday('  '))
+
+    def test_unknown_day_is_not_every_day(self):
+        self.assertEqual(parse_weekday('Funday'), UNKNOWN_DAY)
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import DoctorPackageViewset, AppointmentViewset, AppointmentsByUserView, AppointmentCancellationView
+from .views import DoctorPackageViewset, AppointmentViewset, AppointmentsByUserView, AppointmentCancellationView, AvailabilityView, NextAvailableSlotView
 
 router = DefaultRouter()
 router.register(r'doctorpackages', DoctorPackageViewset, basename='doctorpackages')
@@ -9,6 +9,8 @@ router.register(r'appointments', AppointmentViewset, basename='appointments')
 urlpatterns = [
     path('', include(router.urls)),
     path('cancellation/', AppointmentCancellationView.as_view({'patch': 'partial_update'}), name='cancellation'),
+    path('availability/', AvailabilityView.as_view(), name='availability'),
+    path('availability/next/', NextAvailableSlotView.as_view(), name='next-available-slot'),
     # path('<str:appointment_id>/cancel/', AppointmentCancellationView.as_view(), name='appointment_cancellation'),
     path('appointments/by-user/<str:user_id>/', AppointmentsByUserView.as_view(), name='appointments-by-user'),
 ]
\ No newline at end of file
@@ -8,11 +8,21 @@ from rest_framework.views import APIView
 from datetime import datetime
 from accounts.authentication import JWTAuthentication
 from .pagination import CustomPagination
-
-class DoctorPackageViewset(viewsets.ModelViewSet):
+from core.prefetch import PrefetchMixin
+from bson import ObjectId
+from datetime import timedelta, timezone as dt_timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from .availability import MAX_RANGE_DAYS, get_free_slots, get_next_available_slot, parse_duration
+
+class DoctorPackageViewset(PrefetchMixin, viewsets.ModelViewSet):
     permission_classes = [AllowAny]
     serializer_class = DoctorPackageSerializer
     queryset = DoctorPackage.objects.all()
+    prefetch = [
+        'doctor_id', 'doctor_id.user_id', 'doctor_id.speciality_id', 'doctor_id.location_id',
+        'doctor_id.working_time_id', 'doctor_id.hospital_id',
+    ]
 
     def destroy(self, request, *args, **kwargs):
 
@@ -38,11 +48,15 @@ class DoctorPackageViewset(viewsets.ModelViewSet):
             return Response({"error": "Package not found"}, status=status.HTTP_404_NOT_FOUND)
         
 
-class AppointmentViewset(viewsets.ModelViewSet):
+class AppointmentViewset(PrefetchMixin, viewsets.ModelViewSet):
     serializer_class = AppointmentSerializer
     queryset = Appointment.objects.all()
     permission_classes = [AllowAny]
     pagination_class = CustomPagination
+    prefetch = [
+        'doctor_id', 'package_id', 'patient_id', 'user_id', 'package_id.doctor_id', 'patient_id.user_id',
+        'doctor_id.user_id', 'doctor_id.speciality_id', 'doctor_id.location_id', 'doctor_id.working_time_id', 'doctor_id.hospital_id',
+    ]
 
     def get_queryset(self):
         """
@@ -218,3 +232,94 @@ class AppointmentCancellationView(viewsets.ModelViewSet):
             return Response({"message": "Appointment cancelled successfully", "data": serializer.data}, status=status.HTTP_200_OK)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AvailabilityView(APIView):
+    permission_classes = [AllowAny]
+
+    def get_doctor_id(self, request):
+        """
+        Returns the 'doctor_id' query parameter as an ObjectId.
+        """
+        doctor_id = request.query_params.get('doctor_id')
+        if not doctor_id or not ObjectId.is_valid(doctor_id):
+            raise ValidationError({'doctor_id': 'A valid doctor ID is required.'})
+        return ObjectId(doctor_id)
+
+    def get_datetime(self, request, name, default=None):
+        """
+        Parses a date or datetime query parameter into a naive UTC datetime, the way MongoDB stores them.
+        """
+        value = request.query_params.get(name)
+        if not value:
+            return default
+        parsed = parse_datetime(value)
+        if parsed is None:
+            date = parse_date(value)
+            if date is None:
+                raise ValidationError({name: 'Expected an ISO 8601 date or datetime.'})
+            parsed = datetime(date.year, date.month, date.day)
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(dt_timezone.utc).replace(tzinfo=None)
+        return parsed
+
+    def get_duration(self, request):
+        """
+        Returns the duration of the package given with 'package_id', or None to use the doctor's slot length.
+        """
+        package_id = request.query_params.get('package_id')
+        if not package_id:
+            return None
+        package = DoctorPackage.objects.filter(id=package_id).only('duration').first() if ObjectId.is_valid(package_id) else None
+        if package is None:
+            raise ValidationError({'package_id': 'Package not found.'})
+        return parse_duration(package.duration)
+
+    def get(self, request):
+        """
+        Lists the free slots of a doctor between 'from' and 'to'.
+
+        Slots come from the doctor's slot index, built from their working hours and package durations
+        and kept up to date as appointments are booked and cancelled. With 'package_id', only the
+        starts at which that package's duration fits are returned. The range defaults to the next
+        seven days and is limited to MAX_RANGE_DAYS.
+
+        Args:
+            request (Request): The HTTP request object.
+
+        Returns:
+            Response: The doctor ID and the list of free slots, each with its 'start' and 'end'.
+        """
+        doctor_id = self.get_doctor_id(request)
+        start = self.get_datetime(request, 'from', datetime.utcnow())
+        end = self.get_datetime(request, 'to', start + timedelta(days=7))
+        if end <= start:
+            raise ValidationError({'to': "Must be after 'from'."})
+        if end - start > timedelta(days=MAX_RANGE_DAYS):
+            raise ValidationError({'to': f'The range cannot exceed {MAX_RANGE_DAYS} days.'})
+
+        slots = get_free_slots(doctor_id, start, end, duration=self.get_duration(request))
+        return Response({
+            'doctor_id': str(doctor_id),
+            'slots': [{'start': slot_start, 'end': slot_end} for slot_start, slot_end in slots],
+        }, status=status.HTTP_200_OK)
+
+
+class NextAvailableSlotView(AvailabilityView):
+
+    def get(self, request):
+        """
+        Returns the next free slot of a doctor, after 'after' (defaults to now).
+
+        Args:
+            request (Request): The HTTP request object.
+
+        Returns:
+            Response: The doctor ID and the next free slot, or None when the doctor has no free slot in the coming months.
+        """
+        doctor_id = self.get_doctor_id(request)
+        slot = get_next_available_slot(doctor_id, self.get_datetime(request, 'after'), duration=self.get_duration(request))
+        return Response({
+            'doctor_id': str(doctor_id),
+            'slot': {'start': slot[0], 'end': slot[1]} if slot else None,
+        }, status=status.HTTP_200_OK)
@@ -135,6 +135,9 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # The number of proxies in front of the app, whose X-Forwarded-For entries the throttles trust.
+    # With 0, the client IP is REMOTE_ADDR and a forged X-Forwarded-For header is ignored.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
 }
 
 JWT_SECRET_KEY = 'your_jwt_secret_key'
@@ -159,6 +162,21 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing
+# New passwords are hashed with PASSWORD_HASHER. The other hashers only verify older hashes, which
+# are rehashed with PASSWORD_HASHER and PASSWORD_HASH_ITERATIONS on the next login.
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'accounts.hashers.PBKDF2PasswordHasher')
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 720000))
+PASSWORD_HASHERS = [PASSWORD_HASHER] + [hasher for hasher in (
+    'accounts.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+) if hasher != PASSWORD_HASHER]
+# 'pool' hashes on PASSWORD_HASH_WORKERS worker processes per server process, 'inline' in the request thread.
+PASSWORD_HASH_MODE = os.environ.get('PASSWORD_HASH_MODE', 'pool')
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_QUEUE_SIZE = 8
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
@@ -185,6 +203,10 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# 'django' streams media from the app, 'x-accel' hands it to nginx (internal location
+# MEDIA_ACCEL_REDIRECT_PREFIX aliased to MEDIA_ROOT) and 'x-sendfile' to Apache or lighttpd.
+MEDIA_SERVE_MODE = os.environ.get('MEDIA_SERVE_MODE', 'django')
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
 if not os.path.exists(MEDIA_ROOT):
     os.makedirs(MEDIA_ROOT)
 
@@ -225,6 +247,23 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Token-bucket throttling of the unauthenticated account endpoints, per client IP and per email.
+# 'local' keeps the buckets in each process, 'redis' shares them between the workers.
+THROTTLE_BACKEND = os.environ.get('THROTTLE_BACKEND', 'local')
+THROTTLE_REDIS_URL = os.environ.get('THROTTLE_REDIS_URL', 'redis://127.0.0.1:6379/1')
+THROTTLE_RATES = {
+    'login_ip': '20/min',
+    'login_email': '5/min',
+    'forgot_password_ip': '10/hour',
+    'forgot_password_email': '5/hour',
+    'verify_otp_ip': '20/min',
+    'verify_otp_email': '5/min',
+    'reset_password_ip': '10/hour',
+    'reset_password_email': '5/hour',
+    'register_ip': '10/hour',
+    'register_email': '5/hour',
+}
+
 CHANNELS_MIDDLEWARE = [
     'channels.middleware.auth.AuthenticationMiddleware',
     'channels.middleware.websocket.WebSocketMiddleware',
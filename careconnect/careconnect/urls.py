@@ -15,12 +15,13 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework import permissions
 from django.conf import settings
-from django.conf.urls.static import static
+from core.media import serve_media
+import re
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -48,5 +49,6 @@ urlpatterns = [
     path('core/', include('core.urls')),
     path('ws/', include('accounts.urls')),
     path('ws/', include('healthcare.urls')),
+    re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media, name='media'),
 
-]+ static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
@@ -1,3 +1,8 @@
+import csv
+import json
+import re
+from bson import ObjectId
+from pymongo import DeleteMany, InsertOne
 import healthcare.models
 
 
@@ -20,24 +25,216 @@ class WorkingTimeManager:
         (SUNDAY, "Sunday")
     )
 
+    DEFAULT_START_TIME = '09:00'
+    DEFAULT_END_TIME = '17:00'
+    BATCH_SIZE = 1000
+
+    entity_type_names = {'doctor': 1, 'hospital': 2}
+
     @classmethod
     def create_default_working_time(cls, entity, default_times):
-        entity_type = entity.__class__.__name__
-        entity_id = entity.id
+        """
+        Creates the weekly working hours of a doctor or hospital in a single bulk write, replacing any existing ones.
+
+        Args:
+            entity (Doctor or Hospital): The entity the working hours belong to.
+            default_times (dict): The hours of each day, keyed by day name, as a {'start_time', 'end_time'} dict,
+                a (start, end) pair or a "HH:MM-HH:MM" string. Missing days default to 09:00-17:00.
 
+        Returns:
+            dict: The bulk write summary, see `write_schedule_rows`.
+        """
+        entity_type = cls.entity_type_names[entity.__class__.__name__.lower()]
+
+        days = []
         for day, day_name in cls.days_of_week_choices:
-            # Fetch default times from frontend JSON or use class defaults
-            start_time = default_times.get(day_name, '09:00')
-            end_time = default_times.get(day_name, '17:00')
-
-            working_time = healthcare.models.WorkingTime.objects.create(
-                entity_id=entity_id,
-                entity_type=entity_type,
-                day=day,
-                start_time=start_time,
-                end_time=end_time
-            )
-            working_time.save()
+            times = default_times.get(day_name) if default_times else None
+            if isinstance(times, dict):
+                start_time, end_time = times.get('start_time'), times.get('end_time')
+            elif isinstance(times, (list, tuple)) and len(times) == 2:
+                start_time, end_time = times
+            elif isinstance(times, str) and '-' in times:
+                start_time, end_time = (value.strip() for value in times.split('-', 1))
+            else:
+                start_time, end_time = None, None
+            days.append({
+                'day': day,
+                'start_time': start_time or cls.DEFAULT_START_TIME,
+                'end_time': end_time or cls.DEFAULT_END_TIME,
+            })
+
+        return cls.bulk_set_schedules([{'entity_type': entity_type, 'entity_id': str(entity.id), 'days': days}])
+
+    @classmethod
+    def bulk_set_schedules(cls, schedules, replace=True):
+        """
+        Creates or replaces the weekly schedules of many entities with batched bulk writes.
+
+        Args:
+            schedules (iterable): Dicts with 'entity_type', 'entity_id' and 'days', a list of
+                {'day', 'start_time', 'end_time'} dicts.
+            replace (bool): Whether to delete the existing working hours of each entity first.
+
+        Returns:
+            dict: The bulk write summary, see `write_schedule_rows`.
+        """
+        def rows():
+            for schedule in schedules:
+                for day in schedule.get('days') or []:
+                    yield {'entity_type': schedule.get('entity_type'), 'entity_id': schedule.get('entity_id'), **day}
+
+        return cls.write_schedule_rows(rows(), replace=replace)
+
+    @classmethod
+    def import_schedules(cls, stream, file_format='csv', replace=True):
+        """
+        Imports schedules from a CSV or JSON Lines text stream, one working-hours row per line.
+
+        The rows need the 'entity_type', 'entity_id', 'day', 'start_time' and 'end_time' columns (or keys).
+        The stream is read and written in batches, so files of any size use constant memory.
+
+        Args:
+            stream (file): A text stream.
+            file_format (str): 'csv' or 'jsonl'.
+            replace (bool): Whether to delete the existing working hours of each imported entity first.
+
+        Returns:
+            dict: The bulk write summary, see `write_schedule_rows`.
+        """
+        if file_format == 'csv':
+            rows = csv.DictReader(stream)
+        elif file_format == 'jsonl':
+            rows = cls.read_json_lines(stream)
+        else:
+            raise ValueError(f"Unsupported schedule format: {file_format}")
+        return cls.write_schedule_rows(rows, replace=replace)
+
+    @staticmethod
+    def read_json_lines(stream):
+        """
+        Yields the object of each non-empty line of a JSON Lines stream, or the parse error message for malformed lines.
+        """
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                yield f"Invalid JSON: {error}"
+                continue
+            yield row if isinstance(row, dict) else "Each line must be a JSON object"
+
+    @classmethod
+    def validate_schedule_row(cls, row):
+        """
+        Validates and normalizes one working-hours row.
+
+        Args:
+            row (dict): The raw row, with 'entity_type', 'entity_id', 'day', 'start_time' and 'end_time'.
+
+        Returns:
+            tuple: The WorkingTime document to insert (or None) and a dict of errors by field.
+        """
+        if not isinstance(row, dict):
+            return None, {'row': row}
+
+        errors = {}
+
+        entity_type = str(row.get('entity_type') or '').strip().lower()
+        entity_type = cls.entity_type_names.get(entity_type, entity_type)
+        try:
+            entity_type = int(entity_type)
+        except (TypeError, ValueError):
+            entity_type = None
+        if entity_type not in cls.entity_type_names.values():
+            errors['entity_type'] = "Must be 1 (Doctor) or 2 (Hospital)"
+
+        entity_id = str(row.get('entity_id') or '').strip()
+        if not ObjectId.is_valid(entity_id):
+            errors['entity_id'] = "Must be a valid ID"
+
+        day = str(row.get('day') or '').strip()
+        if day.isdigit() and 1 <= int(day) <= 7:
+            day = int(day)
+        else:
+            day = next((number for number, name in cls.days_of_week_choices if name.lower() == day.lower()), None)
+            if day is None:
+                errors['day'] = "Must be 1-7 or a day name"
+
+        times = {}
+        for field in ('start_time', 'end_time'):
+            value = str(row.get(field) or '').strip()
+            if not re.fullmatch(r'([01]\d|2[0-3]):[0-5]\d|24:00', value):
+                errors[field] = "Must be a time in HH:MM format"
+            times[field] = value
+        if 'start_time' not in errors and 'end_time' not in errors and times['start_time'] >= times['end_time']:
+            errors['end_time'] = "Must be after start_time"
+
+        if errors:
+            return None, errors
+        return {'entity_type': entity_type, 'entity_id': entity_id, 'day': str(day), **times}, {}
+
+    @classmethod
+    def write_schedule_rows(cls, rows, replace=True, batch_size=None):
+        """
+        Validates working-hours rows and writes the valid ones with one ordered bulk write per batch.
+
+        When replacing, the first batch that mentions an entity also deletes its existing working hours,
+        in the same bulk write and before the new rows are inserted. Invalid rows are reported and skipped
+        without aborting the rest of the import.
+
+        Args:
+            rows (iterable): The raw rows.
+            replace (bool): Whether to delete the existing working hours of each entity first.
+            batch_size (int): The number of rows written per bulk request.
+
+        Returns:
+            dict: 'inserted' (number of rows written), 'entities' (number of entities updated)
+                and 'errors' (a list of {'row', 'errors'} dicts, with 1-based row numbers).
+        """
+        batch_size = batch_size or cls.BATCH_SIZE
+        collection = healthcare.models.WorkingTime._get_collection()
+
+        entities = set()
+        summary = {'inserted': 0, 'entities': 0, 'errors': []}
+        batch = []
+
+        def flush():
+            new_entities = {(document['entity_type'], document['entity_id']) for document in batch} - entities
+            operations = []
+            if replace:
+                for entity_type in {entity_type for entity_type, _ in new_entities}:
+                    entity_ids = [entity_id for new_type, entity_id in new_entities if new_type == entity_type]
+                    operations.append(DeleteMany({'entity_type': entity_type, 'entity_id': {'$in': entity_ids}}))
+            operations.extend(InsertOne(document) for document in batch)
+            collection.bulk_write(operations, ordered=True)
+
+            entities.update(new_entities)
+            summary['inserted'] += len(batch)
+            batch.clear()
+
+        for number, row in enumerate(rows, start=1):
+            document, errors = cls.validate_schedule_row(row)
+            if errors:
+                summary['errors'].append({'row': number, 'errors': errors})
+                continue
+            batch.append(document)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+        summary['entities'] = len(entities)
+        cls.reset_availability(entity_id for entity_type, entity_id in entities if entity_type == 1)
+        return summary
+
+    @staticmethod
+    def reset_availability(doctor_ids):
+        """
+        Drops the availability slots of doctors whose working hours were bulk written, since bulk writes skip the document signals.
+        """
+        from appointments.availability import reset_schedules
+        reset_schedules(ObjectId(doctor_id) for doctor_id in doctor_ids)
 
 
 class EntityChoices:
@@ -0,0 +1,57 @@
+import asyncio
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from rest_framework.views import APIView
+
+
+class AsyncViewMixin:
+
+    """
+    View and viewset mixin that lets handlers and actions be `async def`.
+
+    DRF dispatches requests synchronously, so it cannot await a handler. This dispatch is a
+    coroutine: asynchronous handlers are awaited on the event loop, while the authentication,
+    permission and throttle checks and the synchronous handlers run through `sync_to_async`, as
+    Django runs synchronous views. An asynchronous handler must not call blocking code directly,
+    e.g. database queries go through `sync_to_async` too.
+    """
+
+    # The dispatch is asynchronous whatever the handlers are, so Django must not require them all to be async.
+    view_is_async = True
+
+    @classmethod
+    def as_view(cls, *args, **initkwargs):
+        # Django awaits the views marked as coroutine functions, under ASGI and WSGI alike.
+        return markcoroutinefunction(super().as_view(*args, **initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            if asyncio.iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncAPIView(AsyncViewMixin, APIView):
+
+    """
+    APIView whose handlers may be `async def`.
+    """
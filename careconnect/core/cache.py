@@ -0,0 +1,173 @@
+from collections import OrderedDict
+import threading
+import time
+from .models import CacheVersion
+
+
+class VersionedDocumentCache:
+
+    """
+    In-process cache of every document of a small, rarely changing collection, keyed by primary key.
+
+    Changes are published through a version counter stored in MongoDB (`CacheVersion`). Each process
+    checks the counter at most once every `check_interval` seconds and reloads the whole collection
+    when it has moved, so other workers see a change within that delay. Call `invalidate` whenever
+    a document is saved or deleted; the process that made the change reloads on its next read.
+
+    The cached documents are shared between requests and threads and must not be modified.
+    """
+
+    def __init__(self, model, name, check_interval=5):
+        self.model = model
+        self.name = name
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.documents = None
+        self.version = None
+        self.checked_at = 0.0
+
+    def get_version(self):
+        version = CacheVersion._get_collection().find_one({'_id': self.name}, {'version': 1})
+        return version['version'] if version else 0
+
+    def is_fresh(self, documents):
+        return documents is not None and time.monotonic() - self.checked_at < self.check_interval
+
+    def refresh(self):
+
+        """
+        Reloads the collection if the shared version counter moved since the last load.
+
+        Returns:
+            dict: The documents keyed by primary key, as loaded or checked. Read from this dictionary rather than
+                from `self.documents`, which another thread may drop in the meantime.
+        """
+
+        documents = self.documents
+        if self.is_fresh(documents):
+            return documents
+        with self.lock:
+            documents = self.documents
+            if self.is_fresh(documents):
+                return documents
+            # The version is read before the documents, so a change made while loading triggers another reload.
+            version = self.get_version()
+            if documents is None or version != self.version:
+                documents = {document.pk: document for document in self.model.objects}
+                self.documents = documents
+                self.version = version
+            self.checked_at = time.monotonic()
+            return documents
+
+    def all(self):
+        return list(self.refresh().values())
+
+    def get(self, pk):
+        return self.refresh().get(pk)
+
+    def get_many(self, pks):
+        documents = self.refresh()
+        return {pk: documents[pk] for pk in pks if pk in documents}
+
+    def invalidate(self):
+
+        """
+        Bumps the shared version counter and drops the local copy.
+        """
+
+        CacheVersion._get_collection().update_one({'_id': self.name}, {'$inc': {'version': 1}}, upsert=True)
+        with self.lock:
+            self.documents = None
+
+
+class TTLCache:
+
+    """
+    Thread-safe, in-process LRU cache whose entries expire after a time to live.
+
+    The least recently used entry is evicted once `maxsize` entries are stored. Each entry lives for
+    `ttl` seconds at most, or less when `set` is given a shorter time to live.
+    """
+
+    def __init__(self, maxsize=10000, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return default
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class VersionedTTLCache(TTLCache):
+
+    """
+    TTLCache whose entries are dropped in every process when their own shared version counter moves.
+
+    Each key has its own `CacheVersion` document, named '<name>:<key>', so invalidating one key leaves
+    the other entries cached. An entry remembers the version it was loaded at, and each process checks
+    that version at most once every `check_interval` seconds per entry, so a change made by another
+    worker is seen within that delay. `invalidate` drops the key in this process right away and bumps
+    its counter for the others.
+
+    Read the version with `get_version` before loading a value and pass it to `set`, so a value loaded
+    while the key is invalidated is dropped on its next check.
+    """
+
+    def __init__(self, name, maxsize=10000, ttl=60, check_interval=5):
+        super().__init__(maxsize, ttl)
+        self.name = name
+        self.check_interval = check_interval
+
+    def get_version(self, key):
+        version = CacheVersion._get_collection().find_one({'_id': f'{self.name}:{key}'}, {'version': 1})
+        return version['version'] if version else 0
+
+    def get(self, key, default=None):
+        entry = super().get(key)
+        if entry is None:
+            return default
+        value, version, checked_at = entry
+        if time.monotonic() - checked_at >= self.check_interval:
+            if self.get_version(key) != version:
+                with self.lock:
+                    # Leaves an entry set by another thread in the meantime.
+                    if self.entries.get(key, (None,))[0] is entry:
+                        del self.entries[key]
+                return default
+            entry[2] = time.monotonic()
+        return value
+
+    def set(self, key, value, version, ttl=None):
+        super().set(key, [value, version, time.monotonic()], ttl)
+
+    def invalidate(self, key):
+        CacheVersion._get_collection().update_one({'_id': f'{self.name}:{key}'}, {'$inc': {'version': 1}}, upsert=True)
+        self.delete(key)
@@ -0,0 +1,136 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from .models import Location, get_location_point
+
+DEFAULT_RADIUS_KM = 10
+MAX_RADIUS_KM = 500
+
+
+def parse_near(query_params):
+
+    """
+    Parses the `near=lat,lng` and `radius_km` query parameters.
+
+    Args:
+        query_params (QueryDict): The request's query parameters.
+
+    Returns:
+        tuple: The latitude, longitude and radius in kilometres, or None when `near` is not given.
+
+    Raises:
+        ValidationError: If the position or radius is malformed or out of range.
+    """
+
+    near = query_params.get('near')
+    if not near:
+        return None
+
+    try:
+        latitude, longitude = (float(value) for value in near.split(','))
+    except ValueError:
+        raise ValidationError({'near': 'Expected "latitude,longitude".'})
+    if get_location_point(latitude, longitude) is None:
+        raise ValidationError({'near': 'Latitude must be between -90 and 90 and longitude between -180 and 180.'})
+
+    try:
+        radius_km = float(query_params.get('radius_km', DEFAULT_RADIUS_KM))
+    except ValueError:
+        raise ValidationError({'radius_km': 'Expected a number of kilometres.'})
+    if not 0 < radius_km <= MAX_RADIUS_KM:
+        raise ValidationError({'radius_km': f'Must be greater than 0 and at most {MAX_RADIUS_KM}.'})
+
+    return latitude, longitude, radius_km
+
+
+class NearbyResults:
+
+    """
+    The (distance in kilometres, document id) pairs of the documents within a radius, nearest first.
+
+    The documents are found from their locations with a single pipeline: $geoNear on the 2dsphere
+    index of `Location.point`, then a $lookup of the documents at each location that match the
+    queryset's filter. Counting and slicing run that pipeline with $count or $skip/$limit, so the
+    paginator only ever transfers the page being returned.
+    """
+
+    def __init__(self, queryset, latitude, longitude, radius_km, location_field='location_id'):
+        self.pipeline = [
+            {'$geoNear': {
+                'near': {'type': 'Point', 'coordinates': [longitude, latitude]},
+                'key': 'point',
+                'distanceField': 'distance',
+                'maxDistance': radius_km * 1000,
+                'spherical': True,
+            }},
+            {'$project': {'distance': 1}},
+            {'$lookup': {
+                'from': queryset._document._get_collection_name(),
+                'let': {'location': '$_id'},
+                'pipeline': [
+                    {'$match': {'$expr': {'$eq': [f'${location_field}', '$$location']}}},
+                    {'$match': queryset._query},
+                    {'$project': {'_id': 1}},
+                ],
+                'as': 'document',
+            }},
+            {'$unwind': '$document'},
+        ]
+        self._count = None
+
+    def aggregate(self, stages):
+        return Location._get_collection().aggregate(self.pipeline + stages)
+
+    def count(self):
+        if self._count is None:
+            rows = list(self.aggregate([{'$count': 'count'}]))
+            self._count = rows[0]['count'] if rows else 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step not in (None, 1) or (index.start or 0) < 0 or (index.stop is not None and index.stop < 0):
+            raise TypeError('Nearby results only support forward slices.')
+        start = index.start or 0
+        stages = [{'$sort': {'distance': 1, 'document._id': 1}}]
+        if start:
+            stages.append({'$skip': start})
+        if index.stop is not None:
+            if index.stop <= start:
+                return []
+            stages.append({'$limit': index.stop - start})
+        return [(row['distance'] / 1000, row['document']['_id']) for row in self.aggregate(stages)]
+
+
+class NearbyMixin:
+
+    """
+    Viewset mixin that lists the documents whose `location_id` lies within `radius_km` of `near=lat,lng`.
+
+    Results are sorted by distance, nearest first, and each item carries its 'distance_km'.
+    Only the page being returned is read from the database. Without `near` the list behaves as before.
+    """
+
+    location_field = 'location_id'
+
+    def list(self, request, *args, **kwargs):
+        near = parse_near(request.query_params)
+        if near is None:
+            return super().list(request, *args, **kwargs)
+
+        ranked = NearbyResults(self.get_queryset(), *near, location_field=self.location_field)
+        page = self.paginate_queryset(ranked)
+        ranked = page if page is not None else ranked[:]
+
+        documents = {document.id: document for document in self.filter_queryset(self.get_queryset()).filter(id__in=[pk for _, pk in ranked])}
+        ranked = [(distance, pk) for distance, pk in ranked if pk in documents]
+
+        serializer = self.get_serializer([documents[pk] for _, pk in ranked], many=True)
+        data = serializer.data
+        for item, (distance, _) in zip(data, ranked):
+            item['distance_km'] = round(distance, 3)
+
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
@@ -0,0 +1,234 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from PIL import Image, ImageOps, UnidentifiedImageError
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+logger = logging.getLogger(__name__)
+
+# The fixed-size variants generated for every uploaded image, as (width, height) boxes the image is cropped to.
+IMAGE_VARIANTS = getattr(settings, 'IMAGE_VARIANTS', {
+    'thumbnail': (160, 160),
+    'card': (640, 360),
+})
+
+# The variant rendered by list endpoints unless the client asks for another one.
+LIST_IMAGE_VARIANT = 'thumbnail'
+ORIGINAL_IMAGE = 'original'
+
+VARIANT_QUALITY = 82
+
+# Generates the variants outside the request thread. Pillow releases the GIL while decoding,
+# resizing and encoding, so a small pool keeps several uploads moving at once.
+image_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'IMAGE_VARIANT_WORKERS', 2), thread_name_prefix='image-variants'
+)
+
+
+def get_storage_path(path):
+
+    """
+    Returns the filesystem path of a stored 'media/...' file path.
+    """
+
+    if path.startswith('media/'):
+        path = path[len('media/'):]
+    return os.path.join(settings.MEDIA_ROOT, path)
+
+
+def get_variant_path(path, name):
+
+    """
+    Returns the stored path of a variant, next to the original in a 'variants' directory.
+
+    The name includes the size of the variant, so a variant regenerated after its size changes gets
+    a new path, URL and ETag instead of replacing a file clients cache forever.
+
+    Example:
+        get_variant_path('media/doctors_files/photo.png', 'thumbnail') == 'media/doctors_files/variants/photo_thumbnail_160x160.jpg'
+    """
+
+    directory, filename = os.path.split(path)
+    width, height = IMAGE_VARIANTS[name]
+    return f'{directory}/variants/{os.path.splitext(filename)[0]}_{name}_{width}x{height}.jpg'
+
+
+def get_media_url(path, request=None):
+
+    """
+    Returns the URL of a stored file path, absolute when a request is given.
+    """
+
+    if not path:
+        return None
+    if path.startswith('media/'):
+        path = path[len('media/'):]
+    if request:
+        return request.build_absolute_uri(settings.MEDIA_URL + path)
+    return settings.MEDIA_URL + path
+
+
+def get_image_path(obj, context):
+
+    """
+    Returns the stored path of the image to render for a document or raw document.
+
+    This is the variant named by `context['image_variant']` when it has been generated, and the
+    original upload otherwise, e.g. while the variants are still being generated.
+    """
+
+    if isinstance(obj, dict):
+        files, variants = obj.get('files'), obj.get('file_variants')
+    else:
+        files, variants = getattr(obj, 'files', None), getattr(obj, 'file_variants', None)
+    return (variants or {}).get(context.get('image_variant')) or files
+
+
+def flatten(image):
+
+    """
+    Converts an image to RGB for JPEG encoding, placing transparent images on a white background.
+    """
+
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def generate_variants(path, overwrite=False):
+
+    """
+    Writes the fixed-size variants of a stored image.
+
+    Args:
+        path (str): The stored 'media/...' path of the original upload.
+        overwrite (bool): Regenerates variants that already exist. Variants of a new size are written
+            to new paths, so they are generated without it.
+
+    Returns:
+        dict: The stored path of each variant, keyed by variant name, or an empty dict if the file is not an image.
+    """
+
+    variants = {name: get_variant_path(path, name) for name in IMAGE_VARIANTS}
+    if not overwrite and all(os.path.exists(get_storage_path(variant_path)) for variant_path in variants.values()):
+        # The variants of this path were already written, e.g. by an earlier backfill of the same upload.
+        return variants
+
+    width = max(size[0] for size in IMAGE_VARIANTS.values())
+    height = max(size[1] for size in IMAGE_VARIANTS.values())
+
+    try:
+        with Image.open(get_storage_path(path)) as image:
+            # Lets JPEG decoding skip the resolution the variants do not need.
+            image.draft('RGB', (width * 2, height * 2))
+            image = flatten(ImageOps.exif_transpose(image))
+    except (FileNotFoundError, UnidentifiedImageError):
+        return {}
+
+    for name, size in IMAGE_VARIANTS.items():
+        storage_path = get_storage_path(variants[name])
+        os.makedirs(os.path.dirname(storage_path), exist_ok=True)
+        ImageOps.fit(image, size, Image.Resampling.LANCZOS).save(
+            storage_path, 'JPEG', quality=VARIANT_QUALITY, optimize=True, progressive=True
+        )
+    return variants
+
+
+def store_variants(model, pk, path, overwrite=False):
+
+    """
+    Generates the variants of a document's image and records their paths on the document.
+
+    The paths are only recorded if the document still points at the same upload, so a file
+    replaced in the meantime does not get the variants of the previous one.
+
+    Returns:
+        dict: The stored path of each variant, keyed by variant name.
+    """
+
+    try:
+        variants = generate_variants(path, overwrite=overwrite)
+        if variants:
+            model.objects(id=pk, files=path).update_one(set__file_variants=variants)
+        return variants
+    except Exception:
+        logger.exception('Could not generate the image variants of %s %s', model.__name__, pk)
+        raise
+
+
+def schedule_variants(document, overwrite=False):
+
+    """
+    Queues the generation of the variants of a document's image on the image worker pool.
+
+    Returns:
+        Future: The pending variants, or None if the document has no file.
+    """
+
+    if not document.files:
+        return None
+    return image_executor.submit(store_variants, type(document), document.pk, document.files, overwrite)
+
+
+def get_requested_image_variant(request, default=LIST_IMAGE_VARIANT, param='image'):
+
+    """
+    Returns the image variant requested with `?image=`, None for the original upload, or the default.
+
+    Raises:
+        ValidationError: If the requested variant does not exist.
+    """
+
+    requested = request.query_params.get(param) if request is not None else None
+    if not requested:
+        return default
+    if requested != ORIGINAL_IMAGE and requested not in IMAGE_VARIANTS:
+        choices = ', '.join([ORIGINAL_IMAGE, *IMAGE_VARIANTS])
+        raise ValidationError({param: f'Expected one of: {choices}.'})
+    return None if requested == ORIGINAL_IMAGE else requested
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    Read-only field that renders the URL of each generated image variant, keyed by variant name.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        if isinstance(instance, dict):
+            return instance.get(self.source) or {}
+        return getattr(instance, self.source, None) or {}
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        return {name: get_media_url(path, request) for name, path in value.items()}
+
+
+class ImageVariantMixin:
+
+    """
+    Viewset mixin that renders the small image variant in list responses.
+
+    The variant is passed to the serializers as `context['image_variant']`. Clients pick another
+    variant, or the full-size upload, with `?image=card` or `?image=original`.
+    """
+
+    list_image_variant = LIST_IMAGE_VARIANT
+    image_query_param = 'image'
+
+    def get_image_variant(self):
+        default = self.list_image_variant if getattr(self, 'action', None) == 'list' else None
+        return get_requested_image_variant(getattr(self, 'request', None), default, self.image_query_param)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['image_variant'] = self.get_image_variant()
+        return context
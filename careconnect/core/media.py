@@ -0,0 +1,188 @@
+import asyncio
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+from urllib.parse import quote
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags
+from .storage import OBJECTS_DIRECTORY
+
+# 'django' streams files from the application, 'x-accel' hands them to nginx with X-Accel-Redirect
+# and 'x-sendfile' hands them to Apache or lighttpd with X-Sendfile.
+MEDIA_SERVE_MODE = getattr(settings, 'MEDIA_SERVE_MODE', 'django')
+# The internal nginx location that maps to MEDIA_ROOT, used by the 'x-accel' mode.
+MEDIA_ACCEL_REDIRECT_PREFIX = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+# How long clients may cache files that can change in place, i.e. those stored before the object storage.
+MEDIA_CACHE_MAX_AGE = getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600)
+
+# Content-addressed files never change, so they may be cached for a year.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+CHUNK_SIZE = 256 * 1024
+
+RANGE_PATTERN = re.compile(r'bytes=(\d*)-(\d*)')
+
+# Compressed files are served as they are, as the archive types Django's FileResponse uses for them.
+ENCODED_CONTENT_TYPES = {'bzip2': 'application/x-bzip', 'gzip': 'application/gzip', 'xz': 'application/x-xz'}
+
+
+def get_etag(path, stats):
+
+    """
+    Returns the strong ETag of a media file.
+
+    Content-addressed files are tagged with the name they are stored under, which already names their
+    content, e.g. '<digest>' or '<digest>_thumbnail_160x160'. Other files are tagged with their modification
+    time and size.
+    """
+
+    if path.startswith(f'{OBJECTS_DIRECTORY}/'):
+        return f'"{os.path.splitext(os.path.basename(path))[0]}"'
+    return f'"{stats.st_mtime_ns:x}-{stats.st_size:x}"'
+
+
+def is_not_modified(request, etag):
+
+    """
+    Returns True if the client's If-None-Match header matches the ETag.
+    """
+
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return '*' in etags or etag in (tag.removeprefix('W/') for tag in etags)
+
+
+def parse_range(request, etag, size):
+
+    """
+    Parses a single byte range from the Range header.
+
+    Multiple ranges and ranges made stale by If-Range are ignored, and the whole file is served.
+
+    Returns:
+        tuple: The first and last byte of the range, None to serve the whole file, or False if the
+        range cannot be satisfied.
+    """
+
+    header = request.headers.get('Range')
+    if not header or request.headers.get('If-Range', etag) != etag:
+        return None
+    match = RANGE_PATTERN.fullmatch(header.strip())
+    if match is None:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # A suffix range: the last N bytes.
+        length = int(last)
+        if not length or not size:
+            return False
+        return max(size - length, 0), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first > last:
+        return False
+    return first, last
+
+
+async def read_file(file_path, start, length):
+
+    """
+    Yields a byte range of a file in chunks, reading in the default executor so the event loop never blocks on disk.
+    """
+
+    loop = asyncio.get_running_loop()
+    file = await loop.run_in_executor(None, open, file_path, 'rb')
+    try:
+        await loop.run_in_executor(None, file.seek, start)
+        while length > 0:
+            chunk = await loop.run_in_executor(None, file.read, min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        await loop.run_in_executor(None, file.close)
+
+
+async def serve_media(request, path):
+
+    """
+    Serves a file from MEDIA_ROOT.
+
+    Responses carry a strong ETag and answer If-None-Match with 304 Not Modified. They support single
+    byte ranges and long cache lifetimes for content-addressed files. The view is asynchronous, so
+    under ASGI the bytes are streamed without holding the thread that runs the synchronous views.
+    With MEDIA_SERVE_MODE set to 'x-accel' or 'x-sendfile', the delivery is handed off to the
+    front proxy instead.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        path (str): The path of the file, relative to MEDIA_ROOT.
+
+    Returns:
+        HttpResponse: The file, a part of it, or an empty 304, 404 or 416 response.
+    """
+
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+
+    # Only canonical paths are served, so the caching and ETag of a file follow from where it is
+    # stored, e.g. 'objects/../legacy.png' is not served as a content-addressed object.
+    if posixpath.normpath(path) != path:
+        raise Http404('File not found')
+
+    try:
+        file_path = safe_join(settings.MEDIA_ROOT, path)
+        stats = os.stat(file_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404('File not found')
+    if not stat.S_ISREG(stats.st_mode):
+        raise Http404('File not found')
+
+    etag = get_etag(path, stats)
+    headers = {
+        'ETag': etag,
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if path.startswith(f'{OBJECTS_DIRECTORY}/') else f'public, max-age={MEDIA_CACHE_MAX_AGE}',
+        'Last-Modified': http_date(stats.st_mtime),
+    }
+
+    if is_not_modified(request, etag):
+        return HttpResponse(status=304, headers=headers)
+
+    content_type, encoding = mimetypes.guess_type(file_path)
+    headers['Content-Type'] = ENCODED_CONTENT_TYPES.get(encoding, content_type) or 'application/octet-stream'
+
+    if MEDIA_SERVE_MODE == 'x-accel':
+        # nginx serves the file from its internal location, including ranges.
+        headers['X-Accel-Redirect'] = MEDIA_ACCEL_REDIRECT_PREFIX + quote(path)
+        return HttpResponse(headers=headers)
+    if MEDIA_SERVE_MODE == 'x-sendfile':
+        headers['X-Sendfile'] = file_path
+        return HttpResponse(headers=headers)
+
+    size = stats.st_size
+    headers['Accept-Ranges'] = 'bytes'
+    byte_range = parse_range(request, etag, size)
+    if byte_range is False:
+        headers['Content-Range'] = f'bytes */{size}'
+        return HttpResponse(status=416, headers=headers)
+
+    status, start, length = 200, 0, size
+    if byte_range is not None:
+        start, last = byte_range
+        status, length = 206, last - start + 1
+        headers['Content-Range'] = f'bytes {start}-{last}/{size}'
+    headers['Content-Length'] = str(length)
+
+    if request.method == 'HEAD':
+        return HttpResponse(status=status, headers=headers)
+    return StreamingHttpResponse(read_file(file_path, start, length), status=status, headers=headers)
@@ -1,4 +1,5 @@
-from mongoengine import Document,StringField, ReferenceField, IntField, CASCADE, StringField, FloatField, DateTimeField, DecimalField
+from mongoengine import Document,StringField, ReferenceField, IntField, CASCADE, StringField, FloatField, DateTimeField, DecimalField, PointField, DictField
+from mongoengine.signals import pre_save
 from accounts.models import User
 from constant import EntityChoices
 from datetime import datetime
@@ -19,6 +20,12 @@ class Favorite(Document):
         [(1, "Doctor"),
         (2, "Hospital")])
 
+    meta = {
+        'indexes': [
+            {'fields': ('user_id', 'entity_type', 'entity_id'), 'unique': True},
+        ]
+    }
+
 class Location(Document):
     address = StringField(max_length=255, required=True)
     street = StringField(max_length=255)
@@ -28,6 +35,7 @@ class Location(Document):
     country = StringField(max_length=255, required=True)
     latitude = DecimalField(max_digits=13, decimal_places=10, null=True, blank=True)
     longitude = DecimalField(max_digits=13, decimal_places=10, null=True, blank=True)
+    point = PointField()
 
 class Review(Document):
     entity_id = StringField(max_length=255, required=True)
@@ -38,4 +46,50 @@ class Review(Document):
     rating = FloatField(default=0.0, min_value=0.0, max_value=5.0)    
     description = StringField(required=False, null=True)
     files = StringField(required=False)
-    created_at = DateTimeField(default=datetime.utcnow, required=True)
\ No newline at end of file
+    file_variants = DictField()
+    created_at = DateTimeField(default=datetime.utcnow, required=True)
+
+    meta = {
+        'indexes': [
+            ('entity_type', 'entity_id'),
+        ]
+    }
+
+
+class StoredFile(Document):
+    id = StringField(primary_key=True)
+    path = StringField(required=True)
+    size = IntField()
+    content_type = StringField()
+    ref_count = IntField(default=0)
+    created_at = DateTimeField(default=datetime.utcnow)
+    updated_at = DateTimeField(default=datetime.utcnow)
+    deleting_at = DateTimeField()
+
+    meta = {
+        'indexes': [
+            ('ref_count', 'updated_at'),
+        ]
+    }
+
+
+class CacheVersion(Document):
+    name = StringField(primary_key=True)
+    version = IntField(default=0)
+
+
+def get_location_point(latitude, longitude):
+    """
+    Returns the GeoJSON coordinates ([longitude, latitude]) of a position, or None if it is missing or out of range.
+    """
+    if latitude is None or longitude is None:
+        return None
+    latitude, longitude = float(latitude), float(longitude)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return [longitude, latitude]
+
+def set_location_point(sender, document, **kwargs):
+    document.point = get_location_point(document.latitude, document.longitude)
+
+pre_save.connect(set_location_point, sender=Location)
@@ -0,0 +1,137 @@
+from collections import defaultdict
+from bson import DBRef, ObjectId
+from mongoengine import Document, ReferenceField
+
+
+# Per-model lookups that can resolve references without a query, e.g. in-process caches. See `register_reference_cache`.
+reference_caches = {}
+
+
+def register_reference_cache(model, get_many):
+
+    """
+    Makes `prefetch_references` resolve references to a model through a cache instead of a query.
+
+    Args:
+        model (Document): The referenced document class.
+        get_many (callable): Takes a list of primary keys and returns the cached documents, keyed by primary key.
+    """
+
+    reference_caches[model] = get_many
+
+
+def prefetch_references(documents, fields, loaded=None):
+
+    """
+    Loads the documents referenced by a page of documents and attaches them before serialization.
+
+    All references to the same collection are resolved with a single $in query, so serializing
+    the page no longer dereferences one document per row and field. Nested references are
+    given with dots, e.g. 'doctor_id.speciality_id'.
+
+    Args:
+        documents (list): The documents about to be serialized.
+        fields (list): The reference field names (or dotted paths) to prefetch.
+        loaded (dict): Documents already loaded, keyed by (document class, pk). Shared between nested levels.
+
+    Returns:
+        list: The documents, with the requested references attached.
+    """
+
+    documents = [document for document in documents if isinstance(document, Document)]
+    if not documents or not fields:
+        return documents
+
+    loaded = {} if loaded is None else loaded
+    nested = defaultdict(list)
+    for path in fields:
+        name, _, rest = path.partition('.')
+        if rest:
+            nested[name].append(rest)
+        else:
+            nested.setdefault(name, [])
+
+    pending = defaultdict(set)
+    for document in documents:
+        for name in nested:
+            field = document._fields.get(name)
+            ref_id = _reference_id(document._data.get(name))
+            if isinstance(field, ReferenceField) and ref_id is not None and (field.document_type, ref_id) not in loaded:
+                pending[field.document_type].add(ref_id)
+
+    for model, ids in pending.items():
+        if model in reference_caches:
+            referenced_documents = reference_caches[model](list(ids)).values()
+        else:
+            referenced_documents = model.objects(pk__in=list(ids))
+        for referenced in referenced_documents:
+            loaded[(model, referenced.pk)] = referenced
+
+    for name, rest in nested.items():
+        children = {}
+        for document in documents:
+            field = document._fields.get(name)
+            if not isinstance(field, ReferenceField):
+                continue
+            referenced = document._data.get(name)
+            if not isinstance(referenced, Document):
+                referenced = loaded.get((field.document_type, _reference_id(referenced)))
+                if referenced is None:
+                    continue
+                document._data[name] = referenced
+            children[id(referenced)] = referenced
+        if rest:
+            prefetch_references(list(children.values()), rest, loaded)
+
+    return documents
+
+
+def _reference_id(value):
+
+    """
+    Returns the referenced primary key of a raw reference value, or None if it is not an unresolved reference.
+    """
+
+    if isinstance(value, DBRef):
+        return value.id
+    if isinstance(value, ObjectId):
+        return value
+    return None
+
+
+class PrefetchMixin:
+
+    """
+    Viewset mixin that prefetches the reference fields listed in `prefetch` for every serialized page.
+
+    Example:
+        class DoctorViewSet(PrefetchMixin, viewsets.ModelViewSet):
+            prefetch = ['speciality_id', 'location_id']
+    """
+
+    prefetch = []
+
+    def get_prefetch(self):
+
+        """
+        Returns the reference fields to prefetch for the current request.
+        """
+
+        return self.prefetch
+
+    def get_serializer(self, *args, **kwargs):
+
+        """
+        Materializes the instance (or page) passed to the serializer and prefetches its references.
+        """
+
+        prefetch = self.get_prefetch() if args and args[0] is not None and 'data' not in kwargs else None
+        if prefetch:
+            instance = args[0]
+            if kwargs.get('many'):
+                instance = list(instance)
+                prefetch_references(instance, prefetch)
+            else:
+                prefetch_references([instance], prefetch)
+            args = (instance,) + args[1:]
+        return super().get_serializer(*args, **kwargs)
@@ -4,6 +4,23 @@ from accounts.models import User
 from rest_framework import serializers
 from django.conf import settings
 from accounts.serializers import UserSerializer
+from .images import ImageVariantsField, get_image_path, get_media_url
+
+
+class ReferenceIdField(serializers.Field):
+    """
+    Read-only field that renders the id of a reference field without dereferencing the referenced document.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        return instance._data.get(self.source)
+
+    def to_representation(self, value):
+        return str(value.id)
 
 
 class FavoriteSerializer(DocumentSerializer):
@@ -17,9 +34,11 @@ class LocationSerializer(DocumentSerializer):
     class Meta:
         model = Location
         fields = '__all__'
+        read_only_fields = ('point',)
 
 class ReviewSerializer(DocumentSerializer):
     files = serializers.SerializerMethodField()
+    file_variants = ImageVariantsField()
     user = UserSerializer(source='user_id', read_only=True)
     user_id = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), write_only=True)
     created_at_formatted = serializers.SerializerMethodField()
@@ -46,6 +65,7 @@ class ReviewSerializer(DocumentSerializer):
     def get_files(self, obj):
         """
         Retrieves the files URL for a given object.
+        List responses get the small variant selected in the context, once it has been generated.
 
         Parameters:
             self: The serializer instance.
@@ -54,9 +74,11 @@ class ReviewSerializer(DocumentSerializer):
         Returns:
             The absolute URI of the files URL if it exists, otherwise None.
         """
-        files_url = obj.get('files') if isinstance(obj, dict) else getattr(obj, 'files', None)
+        files_url = get_image_path(obj, self.context)
         if files_url:
             request = self.context.get('request')
             if request:
+                if files_url.startswith('media/'):
+                    return get_media_url(files_url, request)
                 return request.build_absolute_uri(f'{settings.MEDIA_URL}review_files/{files_url}')
         return None
\ No newline at end of file
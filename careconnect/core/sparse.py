@@ -0,0 +1,127 @@
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+
+class SparseFieldsSerializerMixin:
+
+    """
+    Serializer mixin that renders only the fields selected with the `fields` and `expand` arguments.
+
+    `fields` lists the fields to render; when it is omitted, every field except the ones in
+    `Meta.expandable` is rendered. `expand` adds expandable fields on top of that selection.
+    Without either argument the serializer renders all of its fields, as before. Fields that are
+    not selected are removed before serialization, so their method fields never run.
+
+    Example:
+        DoctorSerializer(doctors, many=True, fields={'name', 'files'}, expand={'reviews'})
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None and expand is None:
+            return
+
+        meta = getattr(self, 'Meta', None)
+        expandable = set(getattr(meta, 'expandable', ()))
+        aliases = getattr(meta, 'field_aliases', {})
+        fields = {aliases.get(name, name) for name in fields} if fields is not None else None
+        expand = {aliases.get(name, name) for name in expand or ()}
+
+        unknown = ((fields or set()) | expand) - set(self.fields)
+        if unknown:
+            raise ValidationError({'fields': f"Unknown field(s): {', '.join(sorted(unknown))}."})
+
+        if fields is None:
+            selected = {name for name in self.fields if name not in expandable}
+        else:
+            selected = fields | {'id'}
+        selected |= expand
+
+        for name in list(self.fields):
+            if name not in selected:
+                self.fields.pop(name)
+
+    def get_projection(self):
+
+        """
+        Returns the document fields needed to render the selected serializer fields, for use with `.only()`.
+
+        Method fields named after a document field read that field; other method fields only need the id.
+        Fields that read more than one document field list them in `Meta.field_sources`.
+        """
+
+        document_fields = self.Meta.model._fields
+        field_sources = getattr(self.Meta, 'field_sources', {})
+        projection = {'id'}
+        for name, field in self.fields.items():
+            if name in field_sources:
+                sources = field_sources[name]
+            elif isinstance(field, serializers.SerializerMethodField):
+                sources = (name,)
+            else:
+                sources = (field.source.split('.')[0],)
+            projection.update(source for source in sources if source in document_fields)
+        return sorted(projection)
+
+
+class SparseFieldsMixin:
+
+    """
+    Viewset mixin that supports `?fields=` and `?expand=` on read requests.
+
+    The selected fields are passed to the serializer, which must use `SparseFieldsSerializerMixin`,
+    and are mapped to a `.only()` projection so MongoDB returns just the fields being rendered.
+    References listed in `prefetch` are only prefetched when they are part of the projection.
+    """
+
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+
+    def get_sparse_fieldset(self):
+
+        """
+        Returns the `fields` and `expand` serializer arguments requested by the client, or an empty dict.
+        """
+
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in SAFE_METHODS:
+            return {}
+
+        sparse = {}
+        for argument, param in (('fields', self.fields_query_param), ('expand', self.expand_query_param)):
+            value = request.query_params.get(param)
+            if value is not None:
+                sparse[argument] = {name.strip() for name in value.split(',') if name.strip()}
+        return sparse
+
+    def get_projection(self):
+
+        """
+        Returns the document fields to load for the requested fieldset, or None to load whole documents.
+
+        The projection is computed once per request, since building the serializer to derive it is not free.
+        """
+
+        if not hasattr(self, '_projection'):
+            sparse = self.get_sparse_fieldset()
+            serializer = self.get_serializer_class()(context=self.get_serializer_context(), **sparse) if sparse else None
+            self._projection = serializer.get_projection() if serializer else None
+        return self._projection
+
+    def get_serializer(self, *args, **kwargs):
+        if 'data' not in kwargs:
+            kwargs.update(self.get_sparse_fieldset())
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        projection = self.get_projection()
+        return queryset.only(*projection) if projection else queryset
+
+    def get_prefetch(self):
+        prefetch = super().get_prefetch()
+        projection = self.get_projection()
+        if projection is None:
+            return prefetch
+        return [path for path in prefetch if path.split('.')[0] in projection]
@@ -0,0 +1,348 @@
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from mongoengine import signals
+from pymongo import ReturnDocument, UpdateOne
+from healthcare.models import Category, Doctor, Hospital
+from .images import get_storage_path
+from .models import Review, StoredFile
+
+OBJECTS_DIRECTORY = 'objects'
+OBJECTS_PREFIX = f'media/{OBJECTS_DIRECTORY}/'
+
+# The documents whose 'files' field holds a stored path, and so hold a reference to a stored file.
+FILE_MODELS = (Category, Hospital, Doctor, Review)
+
+# How long an upload waits for a garbage collection of the same content to finish. A collection
+# still unfinished after that, e.g. because it was interrupted, is taken over by the upload.
+DELETE_WAIT_SECONDS = 5
+DELETE_POLL_SECONDS = 0.05
+
+DIGEST_PATTERN = re.compile(r'[0-9a-f]{64}')
+EXTENSION_PATTERN = re.compile(r'\.[a-z0-9]{1,8}')
+
+
+def get_object_path(digest, extension=''):
+
+    """
+    Returns the stored path of the content with the given SHA-256 digest.
+
+    The first two pairs of hex digits shard the objects over 65536 directories, so no directory grows large.
+
+    Example:
+        get_object_path('9f86d0...', '.png') == 'media/objects/9f/86/9f86d0....png'
+    """
+
+    return f'{OBJECTS_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def get_digest(path):
+
+    """
+    Returns the digest of a stored object path, or None for files stored before the object storage.
+    """
+
+    if not path or not path.startswith(OBJECTS_PREFIX):
+        return None
+    digest = os.path.splitext(os.path.basename(path))[0]
+    return digest if DIGEST_PATTERN.fullmatch(digest) else None
+
+
+def get_extension(name):
+
+    """
+    Returns the lowercase extension of an uploaded file name, or '' if it is missing or unusual.
+    """
+
+    extension = os.path.splitext(name or '')[1].lower()
+    return extension if EXTENSION_PATTERN.fullmatch(extension) else ''
+
+
+def hash_upload(file):
+
+    """
+    Computes the SHA-256 digest of an uploaded file, reading it in chunks.
+
+    Uploads are held in memory or in a temporary file by Django, so this pass costs no write I/O,
+    and a file that is already stored is never written again.
+    """
+
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def write_object(file, path):
+
+    """
+    Writes an uploaded file to its stored path.
+
+    Uploads spooled to a temporary file are moved into place. Others are streamed to a temporary
+    file next to the destination and renamed, so a stored path never holds a partial file.
+    """
+
+    storage_path = get_storage_path(path)
+    directory = os.path.dirname(storage_path)
+    os.makedirs(directory, exist_ok=True)
+
+    if hasattr(file, 'temporary_file_path'):
+        file_move_safe(file.temporary_file_path(), storage_path, allow_overwrite=True)
+    else:
+        with tempfile.NamedTemporaryFile(dir=directory, prefix='.upload-', delete=False) as destination:
+            for chunk in file.chunks():
+                destination.write(chunk)
+        os.replace(destination.name, storage_path)
+    os.chmod(storage_path, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+
+
+def store_upload(file):
+
+    """
+    Stores an uploaded file once under its content-addressed path and adds a reference to it.
+
+    Uploading content that is already stored only increments its reference count, so re-uploads of
+    the same image cost no disk space and no write I/O. Content that `collect_garbage` is deleting
+    is stored again once the deletion finishes.
+
+    Args:
+        file (UploadedFile): The uploaded file.
+
+    Returns:
+        str: The stable stored path of the content, in the 'media/objects/...' form kept in the 'files' fields.
+    """
+
+    collection = StoredFile._get_collection()
+    digest = hash_upload(file)
+    now = datetime.utcnow()
+
+    stored = add_reference(digest, now)
+    if stored is not None:
+        if not os.path.exists(get_storage_path(stored['path'])):
+            write_object(file, stored['path'])
+        return stored['path']
+
+    path = get_object_path(digest, get_extension(file.name))
+    write_object(file, path)
+    stored = collection.find_one_and_update(
+        {'_id': digest},
+        {
+            '$inc': {'ref_count': 1},
+            '$set': {'updated_at': now},
+            '$setOnInsert': {
+                'path': path,
+                'size': file.size,
+                'content_type': mimetypes.guess_type(path)[0],
+                'created_at': now,
+            },
+        },
+        projection={'path': 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    if stored['path'] != path:
+        # The same content was stored concurrently under another extension.
+        remove_object_files(path)
+    return stored['path']
+
+
+def add_reference(digest, now):
+
+    """
+    Increments the reference count of a stored file that is not being deleted.
+
+    While `collect_garbage` is deleting the file, waits for the record to go away, so the upload
+    never shares the files being removed. A deletion that does not finish within DELETE_WAIT_SECONDS
+    is abandoned: its record is dropped and the upload stores the content again.
+
+    Returns:
+        dict: The stored file record with its 'path', or None if the content is not stored.
+    """
+
+    collection = StoredFile._get_collection()
+    deadline = time.monotonic() + DELETE_WAIT_SECONDS
+    while True:
+        stored = collection.find_one_and_update(
+            {'_id': digest, 'deleting_at': None}, {'$inc': {'ref_count': 1}, '$set': {'updated_at': now}}, projection={'path': 1}
+        )
+        if stored is not None:
+            return stored
+
+        deleting = collection.find_one({'_id': digest}, {'deleting_at': 1})
+        if deleting is None:
+            return None
+        if time.monotonic() >= deadline:
+            collection.delete_one({'_id': digest, 'deleting_at': deleting.get('deleting_at')})
+            return None
+        time.sleep(DELETE_POLL_SECONDS)
+
+
+def release(path):
+
+    """
+    Removes a reference to a stored file. Files left without references are removed by `collect_garbage`.
+    """
+
+    digest = get_digest(path)
+    if digest:
+        StoredFile._get_collection().update_one(
+            {'_id': digest}, {'$inc': {'ref_count': -1}, '$set': {'updated_at': datetime.utcnow()}}
+        )
+
+
+def remove_object_files(path):
+
+    """
+    Deletes a stored file and its image variants from disk, including the variants of earlier sizes.
+    """
+
+    storage_path = get_storage_path(path)
+    directory, filename = os.path.split(storage_path)
+    variant_prefix = f'{os.path.splitext(filename)[0]}_'
+    file_paths = [storage_path]
+    try:
+        with os.scandir(os.path.join(directory, 'variants')) as entries:
+            file_paths.extend(entry.path for entry in entries if entry.name.startswith(variant_prefix))
+    except FileNotFoundError:
+        pass
+
+    for file_path in file_paths:
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+
+
+def count_references(paths=None):
+
+    """
+    Counts the documents referencing each stored file.
+
+    Args:
+        paths (list): Only counts the references to these paths. All stored paths when omitted.
+
+    Returns:
+        Counter: The number of references, keyed by digest.
+    """
+
+    match = {'files': {'$in': list(paths)}} if paths is not None else {'files': {'$regex': f'^{OBJECTS_PREFIX}'}}
+    counts = Counter()
+    for model in FILE_MODELS:
+        for row in model._get_collection().aggregate([{'$match': match}, {'$group': {'_id': '$files', 'count': {'$sum': 1}}}]):
+            digest = get_digest(row['_id'])
+            if digest:
+                counts[digest] += row['count']
+    return counts
+
+
+def recount_references(batch_size=1000):
+
+    """
+    Recomputes the reference count of every stored file from the documents referencing it.
+
+    Returns:
+        int: The number of stored files whose count was corrected.
+    """
+
+    collection = StoredFile._get_collection()
+    counts = count_references()
+    now = datetime.utcnow()
+
+    corrected = 0
+    operations = []
+    for stored in collection.find({}, {'ref_count': 1}):
+        count = counts.get(stored['_id'], 0)
+        if stored.get('ref_count') != count:
+            operations.append(UpdateOne({'_id': stored['_id']}, {'$set': {'ref_count': count, 'updated_at': now}}))
+        if len(operations) >= batch_size:
+            corrected += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        corrected += collection.bulk_write(operations, ordered=False).modified_count
+    return corrected
+
+
+def collect_garbage(grace=timedelta(days=1), batch_size=1000):
+
+    """
+    Deletes the stored files that no document references.
+
+    Files are only deleted once they have been unreferenced for the grace period, so an upload whose
+    document is still being saved is never collected. Each candidate is checked against the
+    documents, then marked as deleting while it still has no references, so a concurrent upload of
+    the same content waits instead of adding a reference to files about to be removed. The record is
+    deleted after its files, and only if it is still marked. Files on disk without a stored file
+    record, e.g. left by an interrupted upload, are deleted once they are older than the grace period.
+
+    Args:
+        grace (timedelta): How long a file must have been unreferenced before it is deleted.
+        batch_size (int): The number of files checked per query.
+
+    Returns:
+        int: The number of deleted files.
+    """
+
+    collection = StoredFile._get_collection()
+    cutoff = datetime.utcnow() - grace
+
+    removed = 0
+    candidates = collection.find({'ref_count': {'$lte': 0}, 'updated_at': {'$lt': cutoff}}, {'path': 1}).batch_size(batch_size)
+    for batch in iterate_batches(candidates, batch_size):
+        counts = count_references(stored['path'] for stored in batch)
+        for stored in batch:
+            if counts.get(stored['_id']):
+                collection.update_one({'_id': stored['_id']}, {'$set': {'ref_count': counts[stored['_id']]}})
+                continue
+            marker = datetime.utcnow()
+            if collection.update_one({'_id': stored['_id'], 'ref_count': {'$lte': 0}}, {'$set': {'deleting_at': marker}}).modified_count:
+                remove_object_files(stored['path'])
+                if collection.delete_one({'_id': stored['_id'], 'deleting_at': marker}).deleted_count:
+                    removed += 1
+
+    orphans = []
+    for directory, _, filenames in os.walk(os.path.join(settings.MEDIA_ROOT, OBJECTS_DIRECTORY)):
+        for filename in filenames:
+            file_path = os.path.join(directory, filename)
+            if datetime.utcfromtimestamp(os.path.getmtime(file_path)) < cutoff:
+                # Objects and their variants are named after the digest, e.g. '<digest>.png' and '<digest>_thumbnail_160x160.jpg'.
+                orphans.append((filename[:64], file_path))
+    for batch in iterate_batches(orphans, batch_size):
+        stored = {row['_id'] for row in collection.find({'_id': {'$in': [digest for digest, _ in batch]}}, {'_id': 1})}
+        for digest, file_path in batch:
+            if digest not in stored:
+                os.remove(file_path)
+                removed += 1
+
+    return removed
+
+
+def iterate_batches(items, batch_size):
+
+    """
+    Yields lists of up to `batch_size` items.
+    """
+
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def release_document_file(sender, document, **kwargs):
+    release(document.files)
+
+
+for model in FILE_MODELS:
+    signals.post_delete.connect(release_document_file, sender=model)
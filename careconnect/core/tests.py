@@ -1,3 +1,210 @@
-from django.test import TestCase
+import contextlib
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from mongoengine import connect, disconnect
+from pymongo.errors import AutoReconnect
+from rest_framework.test import APIClient, APIRequestFactory
+
+from accounts.models import Patient, User
+from healthcare.models import Category, Doctor
+from healthcare.tests import TEST_DB_NAME, get_mongodb_host, is_mongodb_available
+from healthcare.utils import apply_review_aggregate_changes
+
+from .cache import VersionedDocumentCache, VersionedTTLCache
+from .media import IMMUTABLE_CACHE_CONTROL, serve_media
+from .models import Location, Review
+
+
+class ServeMediaTests(SimpleTestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        os.makedirs(os.path.join(self.media_root, 'objects', 'ab'))
+        self.write('objects/ab/abcd.png', b'png')
+        self.write('legacy.gz', b'gzip')
+
+    def write(self, path, content):
+        with open(os.path.join(self.media_root, path), 'wb') as file:
+            file.write(content)
+
+    def get(self, path):
+        return async_to_sync(serve_media)(RequestFactory().get(f'/media/{path}'), path)
+
+    def test_caches_objects_forever(self):
+        response = self.get('objects/ab/abcd.png')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response['ETag'], '"abcd"')
+
+    def test_rejects_paths_leaving_the_objects_directory(self):
+        for path in ('objects/../legacy.gz', 'objects/ab/../../legacy.gz', './legacy.gz', 'objects//ab/abcd.png'):
+            with self.subTest(path=path), self.assertRaises(Http404):
+                self.get(path)
+
+    def test_serves_compressed_files_as_archives(self):
+        response = self.get('legacy.gz')
+
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+
+class VersionedDocumentCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        documents = [SimpleNamespace(pk=1), SimpleNamespace(pk=2)]
+        self.cache = VersionedDocumentCache(SimpleNamespace(objects=documents), 'test')
+        patcher = mock.patch.object(VersionedDocumentCache, 'get_version', return_value=1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reads_survive_a_concurrent_invalidation(self):
+        refresh = self.cache.refresh
+
+        def refresh_then_invalidate():
+            documents = refresh()
+            # Another thread saves a document right after this one refreshed.
+            self.cache.documents = None
+            return documents
+
+        with mock.patch.object(self.cache, 'refresh', side_effect=refresh_then_invalidate):
+            self.assertEqual(set(self.cache.get_many([1, 2, 3])), {1, 2})
+            self.assertEqual(self.cache.get(2).pk, 2)
+            self.assertEqual(len(self.cache.all()), 2)
+
+
+class FakeVersionCollection:
+
+    def __init__(self):
+        self.versions = {}
+
+    def find_one(self, query, projection=None):
+        version = self.versions.get(query['_id'])
+        return None if version is None else {'_id': query['_id'], 'version': version}
+
+    def update_one(self, query, update, upsert=False):
+        self.versions[query['_id']] = self.versions.get(query['_id'], 0) + update['$inc']['version']
+
+
+class VersionedTTLCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch('core.cache.CacheVersion._get_collection', return_value=FakeVersionCollection())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Two processes caching the same users.
+        self.caches = [VersionedTTLCache('user', check_interval=0) for _ in range(2)]
+        for cache in self.caches:
+            for key in ('1', '2'):
+                cache.set(key, f'user {key}', cache.get_version(key))
+
+    def test_invalidation_drops_only_that_key_in_every_process(self):
+        self.caches[0].invalidate('1')
+
+        for cache in self.caches:
+            self.assertIsNone(cache.get('1'))
+            self.assertEqual(cache.get('2'), 'user 2')
+
+    def test_value_loaded_before_an_invalidation_is_dropped(self):
+        version = self.caches[0].get_version('1')
+        self.caches[1].invalidate('1')
+        self.caches[0].set('1', 'stale user 1', version)
+
+        self.assertIsNone(self.caches[0].get('1'))
+
+
+def import_views():
+
+    """
+    Imports core.views without a database. The class-level querysets of the serializers it imports
+    would otherwise connect to MongoDB at import, to create the indexes of their collections.
+    """
+
+    models = (User, Patient, Location, Review)
+    with contextlib.ExitStack() as stack:
+        for model in models:
+            stack.enter_context(mock.patch.dict(model._meta, {'auto_create_index': False}))
+        from . import views
+    return views
+
+
+class FavoriteCreateTests(SimpleTestCase):
+
+    def test_rejects_anonymous_requests(self):
+        views = import_views()
+
+        request = APIRequestFactory().post('/core/favorites/', {'entity_id': 'abc', 'entity_type': 1}, format='json')
+        with mock.patch.object(views, 'set_favorite') as set_favorite:
+            response = views.FavoriteViewSet.as_view({'post': 'create'})(request)
+
+        self.assertEqual(response.status_code, 401)
+        set_favorite.assert_not_called()
+
+
+@skipUnless(is_mongodb_available(), 'the MongoDB server of MONGODB_DATABASES is not reachable')
+class ReviewAggregateTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        disconnect()
+        connect(db=TEST_DB_NAME, host=get_mongodb_host())
+
+    @classmethod
+    def tearDownClass(cls):
+        Doctor._get_db().client.drop_database(TEST_DB_NAME)
+        disconnect()
+        super().tearDownClass()
+
+    def setUp(self):
+        for model in (User, Category, Doctor, Review):
+            model.drop_collection()
+
+        user = User(username='patient', email='patient@example.com', password='secret').save()
+        self.doctor = Doctor(user_id=user, name='Doctor', speciality_id=Category(name='Cardiology').save()).save()
+        self.review = Review(entity_id=str(self.doctor.id), entity_type=1, user_id=user, rating=4.0).save()
+        apply_review_aggregate_changes([(self.review.entity_id, 1, 4.0, 1)])
+        self.client = APIClient()
+
+    def get_aggregates(self):
+        doctor = Doctor._get_collection().find_one({'_id': self.doctor.id})
+        return doctor['review_count'], doctor['average_rating'], doctor['rating_histogram']
+
+    def test_update_and_delete_move_the_aggregates(self):
+        response = self.client.patch(f'/core/reviews/{self.review.id}/', {'rating': 2.0}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_aggregates(), (1, 2.0, {'4': 0, '2': 1}))
+
+        response = self.client.delete(f'/core/reviews/{self.review.id}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_aggregates(), (0, 0.0, {'4': 0, '2': 0}))
+
+
+@mock.patch('healthcare.utils.REVIEW_AGGREGATE_RETRY_BACKOFF', 0)
+class ApplyReviewAggregateChangesTests(SimpleTestCase):
+
+    @mock.patch('healthcare.utils.update_review_aggregates', side_effect=[AutoReconnect(), None])
+    def test_retries_a_failed_update(self, update):
+        self.assertTrue(apply_review_aggregate_changes([('abc', 1, 4.0, -1)]))
+        self.assertEqual(update.call_count, 2)
+
+    @mock.patch('healthcare.utils.update_review_aggregates', side_effect=AutoReconnect())
+    def test_logs_an_update_that_keeps_failing(self, update):
+        with self.assertLogs('healthcare.utils', 'ERROR'):
+            self.assertFalse(apply_review_aggregate_changes([('abc', 1, 4.0, -1)]))
+        self.assertEqual(update.call_count, 3)
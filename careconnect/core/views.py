@@ -3,13 +3,13 @@ from .serializers import FavoriteSerializer, LocationSerializer, ReviewSerialize
 from rest_framework.permissions import AllowAny
 from .models import Favorite, Location, Review
 from rest_framework.response import Response
-import os
-from django.conf import settings
-from healthcare.models import Doctor, Hospital
-from healthcare.serializers import HospitalSerializer, DoctorSerializer
 from accounts.authentication import JWTAuthentication
 from rest_framework.exceptions import NotFound
-from healthcare.utils import get_reviews_data
+from healthcare.utils import apply_review_aggregate_changes, set_favorite
+from healthcare.resolvers import ENTITY_TYPES, resolve_entities, resolve_entity
+from .prefetch import PrefetchMixin
+from .images import ImageVariantMixin, schedule_variants
+from .storage import release, store_upload
 
 class FavoriteViewSet(viewsets.ModelViewSet):
     serializer_class = FavoriteSerializer
@@ -19,44 +19,16 @@ class FavoriteViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return Favorite.objects.all()
     
-    def update_mongodb(self, entity_type, entity_id, is_favorite):
+    def create(self, request, *args, **kwargs):
         """
-        Updates the MongoDB database based on the entity type and ID by setting the 'is_favorite' field to the provided value.
+        Toggles a favorite of the current user based on the provided entity_id and entity_type.
 
-        Args:
-            self: The FavoriteViewSet instance.
-            entity_type (int): The type of the entity (1 for Doctor, 2 for Hospital).
-            entity_id (int): The ID of the entity.
-            is_favorite (bool): The value to set the 'is_favorite' field to.
-        """
-        if entity_type == 1:
-            Doctor.objects.filter(id=entity_id).update(is_favorite=is_favorite)
-        elif entity_type == 2: 
-            Hospital.objects.filter(id=entity_id).update(is_favorite=is_favorite)
+        The favorite is added or removed atomically and the entity's favorite_count is moved with an
+        atomic $inc, so concurrent taps never store a favorite twice or skew the counter. Clients can
+        send 'is_favorite' (true or false) to set the state instead of toggling it.
 
-    def is_valid_entity_id(self, entity_type, entity_id):
-        """
-        Checks if the provided entity type and ID correspond to a valid entity.
-        
-        Args:
-            self: The FavoriteViewSet instance.
-            entity_type (int): The type of the entity (1 for Doctor, 2 for Hospital).
-            entity_id (int): The ID of the entity.
-        
-        Returns:
-            bool: True if the entity is valid, False otherwise.
-        """
-        if entity_type == 1:
-            doctor = Doctor.objects.filter(id=entity_id).first()
-            return doctor is not None
-        elif entity_type == 2:
-            hospital = Hospital.objects.filter(id=entity_id).first()
-            return hospital is not None
-        return False
-
-    def create(self, request, *args, **kwargs):
-        """
-        A function to create a new favorite item based on the provided entity_id and entity_type.
+        The response is a compact acknowledgement. Clients that need the full doctor or hospital
+        ask for it with `?expand=entity`.
         
         Args:
             self: The FavoriteViewSet instance.
@@ -65,61 +37,44 @@ class FavoriteViewSet(viewsets.ModelViewSet):
             **kwargs: Arbitrary keyword arguments.
             
         Returns:
-            Response: A response indicating the success or failure of the favorite creation process.
+            Response: The 'entity_id', 'entity_type', 'is_favorite' and 'favorite_count' of the entity,
+                      with status 201 when the favorite is added and 200 otherwise, or status 401 without a token.
         """
         entity_id = request.data.get('entity_id')
         entity_type = request.data.get('entity_type')
+        is_favorite = request.data.get('is_favorite')
         user = JWTAuthentication.get_current_user(self, request)
+        if user is None:
+            return Response({"error": "Authentication credentials were not provided"}, status=status.HTTP_401_UNAUTHORIZED)
         user_id = str(user.id)
 
         if not entity_id or not entity_type:
             return Response({"error": "Invalid data provided"}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if not self.is_valid_entity_id(entity_type, entity_id):
-            return Response({"error": "Invalid entity_id provided"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            entity_type = int(entity_type)
+        except (TypeError, ValueError):
+            return Response({"error": "Invalid data provided"}, status=status.HTTP_400_BAD_REQUEST)
+        if is_favorite is not None:
+            is_favorite = str(is_favorite).lower() in ('true', '1')
 
-        # Check if the favorite already exists
-        favorite = Favorite.objects.filter(user_id=user_id, entity_id=entity_id, entity_type=entity_type).first()
-        if favorite:
-            # Toggle is_favorite field for the corresponding entity
-            if entity_type == 1:
-                doctor = Doctor.objects.filter(id=entity_id).first()
-                if doctor:
-                    doctor.is_favorite = not doctor.is_favorite
-                    doctor.save()
-                    if not doctor.is_favorite:
-                        favorite.delete()
-                        return Response({"message": "Favorite item removed successfully"}, status=status.HTTP_200_OK)
-            elif entity_type == 2:
-                hospital = Hospital.objects.filter(id=entity_id).first()
-                if hospital:
-                    hospital.is_favorite = not hospital.is_favorite
-                    hospital.save()
-                    if not hospital.is_favorite:
-                        favorite.delete()
-                        return Response({"message": "Favorite item removed successfully"}, status=status.HTTP_200_OK)
-        
-        else:
-            # Create new favorite and set is_favorite field
-            favorite = Favorite(user_id=user_id, entity_id=entity_id, entity_type=entity_type)
-            favorite.save()
-
-            if entity_type == 1:
-                doctor = Doctor.objects.filter(id=entity_id).first()
-                if doctor:
-                    doctor.is_favorite = True
-                    doctor.save()
-                    serializer = DoctorSerializer(doctor)
-                    return Response({"message": "Favorite item added successfully", "doctor_data": serializer.data, "user_id": user_id, "entity_id": entity_id, "entity_type": entity_type}, status=status.HTTP_201_CREATED)
-            elif entity_type == 2:
-                hospital = Hospital.objects.filter(id=entity_id).first()
-                if hospital:
-                    hospital.is_favorite = True
-                    hospital.save()
-                    serializer = HospitalSerializer(hospital)
-                    return Response({"message": "Favorite item added successfully", "hospital_data": serializer.data, "user_id": user_id, "entity_id": entity_id, "entity_type": entity_type}, status=status.HTTP_201_CREATED)
-
-        return Response({"message": "Something went wrong"}, status=status.HTTP_400_BAD_REQUEST)
+        result = set_favorite(user_id, entity_id, entity_type, is_favorite)
+        if result is None:
+            return Response({"error": "Invalid entity_id provided"}, status=status.HTTP_400_BAD_REQUEST)
+        is_favorite, favorite_count = result
+
+        response_data = {
+            "message": "Favorite item added successfully" if is_favorite else "Favorite item removed successfully",
+            "user_id": user_id,
+            "entity_id": entity_id,
+            "entity_type": entity_type,
+            "is_favorite": is_favorite,
+            "favorite_count": favorite_count,
+        }
+        if 'entity' in request.query_params.get('expand', '').split(','):
+            data_key = "doctor_data" if entity_type == 1 else "hospital_data"
+            response_data[data_key] = resolve_entity(entity_type, entity_id, self.get_serializer_context())
+
+        return Response(response_data, status=status.HTTP_201_CREATED if is_favorite else status.HTTP_200_OK)
     
     def get_entity_details(self, favorite):
         """
@@ -130,38 +85,25 @@ class FavoriteViewSet(viewsets.ModelViewSet):
             favorite (Favorite): The favorite object containing the entity type and ID.
 
         Returns:
-            dict: A dictionary containing the details of the entity. The dictionary has the following keys:
-                - 'review_count' (int): The number of reviews for the entity.
-                - 'average_rating' (float): The average rating of the reviews for the entity.
+            dict: The serialized entity, including its stored 'review_count' and 'average_rating'.
 
         Raises:
             NotFound: If the entity type is not supported or if the entity is not found.
         """
-        entity_type = favorite.entity_type
-        entity_id = favorite.entity_id
-
-        try:
-            if entity_type == 1:
-                entity = Doctor.objects.get(id=entity_id)
-                review_data = get_reviews_data([entity_id], entity_type)
-                entity_data = DoctorSerializer(entity).data
-            elif entity_type == 2:
-                entity = Hospital.objects.get(id=entity_id)
-                review_data = get_reviews_data([entity_id], entity_type)
-                entity_data = HospitalSerializer(entity).data
-            else:
-                raise NotFound("Entity type not supported")
-            
-            entity_data['review_count'] = review_data[entity_id]['review_count']
-            entity_data['average_rating'] = review_data[entity_id]['average_rating']
+        if favorite.entity_type not in ENTITY_TYPES:
+            raise NotFound("Entity type not supported")
 
-            return entity_data
-        except (Doctor.DoesNotExist, Hospital.DoesNotExist):
+        entity_data = resolve_entity(favorite.entity_type, favorite.entity_id, self.get_serializer_context())
+        if entity_data is None:
             raise NotFound("Entity not found")
+        return entity_data
 
     def list(self, request, *args, **kwargs):
         """
-        Retrieves a queryset of favorite instances, serializes each instance, adds entity details to the serialized data, and returns a response with the serialized data.
+        Retrieves a queryset of favorite instances, serializes them, adds entity details to the serialized data, and returns a response with the serialized data.
+
+        The doctors and hospitals of all favorites are resolved together, with one query per entity type.
+        Favorites whose entity no longer exists get None as their entity details.
         
         Parameters:
             self: reference to the current instance of the class
@@ -172,14 +114,12 @@ class FavoriteViewSet(viewsets.ModelViewSet):
         Returns:
             Response object with serialized data and HTTP 200 status
         """
-        queryset = self.get_queryset()
+        favorites = list(self.get_queryset())
+        entities = resolve_entities([(favorite.entity_type, favorite.entity_id) for favorite in favorites], self.get_serializer_context())
 
-        serialized_data = []
-        for favorite_instance in queryset:
-            serializer = self.get_serializer(favorite_instance)
-            favorite_data = serializer.data
-            favorite_data['entity_details'] = self.get_entity_details(favorite_instance)
-            serialized_data.append(favorite_data)
+        serialized_data = self.get_serializer(favorites, many=True).data
+        for favorite_data, favorite in zip(serialized_data, favorites):
+            favorite_data['entity_details'] = entities.get((favorite.entity_type, str(favorite.entity_id)))
 
         return Response(serialized_data, status=status.HTTP_200_OK)
 
@@ -228,11 +168,12 @@ class LocationViewSet(viewsets.ModelViewSet):
             return Response({"error":"Location not found"}, status=status.HTTP_404_NOT_FOUND)
         
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(ImageVariantMixin, PrefetchMixin, viewsets.ModelViewSet):
     serializer_class = ReviewSerializer
     authentication_classes = [JWTAuthentication]
     permission_classes = [AllowAny]
     queryset = Review.objects.all()
+    prefetch = ['user_id', 'user_id.location_id']
 
     def get_queryset(self):
         """
@@ -241,28 +182,12 @@ class ReviewViewSet(viewsets.ModelViewSet):
         Returns:
             QuerySet: The filtered queryset based on the 'entity_id' query parameter.
         """
-        queryset = self.queryset
+        queryset = self.queryset.all()
         entity_id = self.request.query_params.get('entity_id')
         if entity_id:
             queryset = queryset.filter(entity_type=entity_id)
         return queryset
     
-    def save_file(self, file):
-        """
-        Saves a file to the 'review_files' directory in the media root.
-
-        Args:
-            file (File): The file to be saved.
-
-        Returns:
-            str: The path to the saved file in the format 'media/review_files/filename'.
-        """
-        file_path = os.path.join(settings.MEDIA_ROOT, 'review_files', file.name)
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, 'wb+') as destination:
-            for chunk in file.chunks():
-                destination.write(chunk)
-        return 'media/review_files/' + file.name
     
     def create(self, request, *args, **kwargs):
         """
@@ -289,8 +214,9 @@ class ReviewViewSet(viewsets.ModelViewSet):
             3. Adds the user ID to the data dictionary.
             4. Validates the data using the serializer class.
             5. If the data is valid, retrieves the file from the request object and saves it to the
-               'review_files' directory in the media root using the 'save_file' method.
-            6. Saves the instance using the serializer and the file URL.
+               content-addressed object storage using 'store_upload'.
+            6. Saves the instance using the serializer and the file URL, and adds its rating to the
+               stored review aggregates of the reviewed doctor or hospital.
             7. Creates a response data dictionary with the serialized data of the created instance.
             8. Sets the 'files' field in the response data to None.
             9. If the file URL is not None, sets the 'file_path' field in the response data to the
@@ -311,9 +237,15 @@ class ReviewViewSet(viewsets.ModelViewSet):
         try:    
             if serializer.is_valid():
                 file = request.FILES.get('files', None)
-                file_url = self.save_file(file) if file else None
+                file_url = store_upload(file) if file else None
 
-                serializer.save(files=file_url)
+                try:
+                    review = serializer.save(files=file_url)
+                except Exception:
+                    release(file_url)
+                    raise
+                schedule_variants(review)
+                apply_review_aggregate_changes([(review.entity_id, review.entity_type, review.rating, 1)])
 
                 response_data = serializer.data
                 response_data['files'] =  None
@@ -327,10 +259,31 @@ class ReviewViewSet(viewsets.ModelViewSet):
             
         except ValueError:
             return Response({"message": "All fields are required"})
+
+    def perform_update(self, serializer):
+        """
+        Saves an updated review and moves its rating between the stored review aggregates.
+
+        The aggregates are adjusted after the review is saved, through `apply_review_aggregate_changes`,
+        which retries a failed update and logs it if it still fails.
+
+        Args:
+            self: The ReviewViewSet instance.
+            serializer (ReviewSerializer): The validated serializer bound to the review being updated.
+        """
+        review = serializer.instance
+        previous = (review.entity_id, review.entity_type, review.rating)
+
+        review = serializer.save()
+
+        if previous != (review.entity_id, review.entity_type, review.rating):
+            apply_review_aggregate_changes([(*previous, -1), (review.entity_id, review.entity_type, review.rating, 1)])
             
     def destroy(self, request, *args, **kwargs):
         """
-        Deletes a review object from the database.
+        Deletes a review object from the database and removes its rating from the stored review aggregates.
+
+        As in `perform_update`, the review is deleted first and the aggregates adjusted after it, with retries.
 
         Args:
             self: The ReviewViewSet instance.
@@ -344,10 +297,12 @@ class ReviewViewSet(viewsets.ModelViewSet):
         """
         try:
             review = self.get_object()
-            review.delete()
-            return Response({"message": "Review deleted successfully"}, status=status.HTTP_200_OK)
         except Exception:
             return Response({"error": "Review not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        review.delete()
+        apply_review_aggregate_changes([(review.entity_id, review.entity_type, review.rating, -1)])
+        return Response({"message": "Review deleted successfully"}, status=status.HTTP_200_OK)
         
 
     def get_entity_details(self, review):
@@ -364,27 +319,21 @@ class ReviewViewSet(viewsets.ModelViewSet):
         Raises:
             NotFound: If the entity type is not supported or if the entity is not found.
         """
-        entity_type = review.entity_type
-        entity_id = review.entity_id
-
-        try:
-            if entity_type == 1:
-                entity = Doctor.objects.get(id=entity_id)
-                serializer = DoctorSerializer(entity)
-            elif entity_type == 2:
-                entity = Hospital.objects.get(id=entity_id)
-                serializer = HospitalSerializer(entity)
-            else:
-                raise NotFound("Entity type not supported")
+        if review.entity_type not in ENTITY_TYPES:
+            raise NotFound("Entity type not supported")
 
-            return serializer.data
-        except (Doctor.DoesNotExist, Hospital.DoesNotExist):
+        entity_data = resolve_entity(review.entity_type, review.entity_id)
+        if entity_data is None:
             raise NotFound("Entity not found")
+        return entity_data
         
 
     def list(self, request, *args, **kwargs):
         """
-        Retrieves a queryset of items, serializes each item, adds entity details to the serialized data, and returns a response with the serialized data.
+        Retrieves a queryset of items, serializes them, adds entity details to the serialized data, and returns a response with the serialized data.
+
+        The reviewed doctors and hospitals are resolved from the loaded reviews, together, with one query per
+        entity type. Reviews whose entity no longer exists get None as their entity details.
         
         Parameters:
             self: reference to the current instance of the class
@@ -395,11 +344,14 @@ class ReviewViewSet(viewsets.ModelViewSet):
         Returns:
             Response object with serialized data and HTTP 200 status
         """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        for review in serializer.data:
-            review['entity_details'] = self.get_entity_details(Review.objects.get(id=review['id']))
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        reviews = list(self.get_queryset())
+        entities = resolve_entities((review.entity_type, review.entity_id) for review in reviews)
+
+        serialized_data = self.get_serializer(reviews, many=True).data
+        for review_data, review in zip(serialized_data, reviews):
+            review_data['entity_details'] = entities.get((review.entity_type, str(review.entity_id)))
+
+        return Response(serialized_data, status=status.HTTP_200_OK)
 
     def retrieve(self, request, *args, **kwargs):
         """
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class HealthcareConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'healthcare'
+
+    def ready(self):
+        # Keeps the search index up to date when doctors, hospitals and categories are saved or deleted.
+        from . import search  # noqa: F401
+        # Serves categories from the in-process cache and invalidates it when a category changes.
+        from . import cache  # noqa: F401
+        # Releases the stored files of deleted categories, hospitals, doctors and reviews.
+        from core import storage  # noqa: F401
@@ -0,0 +1,29 @@
+from bson import ObjectId
+from django.conf import settings
+from mongoengine import signals
+from core.cache import VersionedDocumentCache
+from core.prefetch import register_reference_cache
+from .models import Category
+
+# Categories are nested in every doctor and hospital payload but almost never change.
+category_cache = VersionedDocumentCache(Category, 'category', check_interval=getattr(settings, 'CATEGORY_CACHE_CHECK_INTERVAL', 5))
+
+
+def get_category(category_id):
+
+    """
+    Returns a category from the in-process cache, or None if it does not exist.
+    """
+
+    if not ObjectId.is_valid(str(category_id)):
+        return None
+    return category_cache.get(ObjectId(str(category_id)))
+
+
+def invalidate_categories(sender, document, **kwargs):
+    category_cache.invalidate()
+
+
+register_reference_cache(Category, category_cache.get_many)
+signals.post_save.connect(invalidate_categories, sender=Category)
+signals.post_delete.connect(invalidate_categories, sender=Category)
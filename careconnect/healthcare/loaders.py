@@ -0,0 +1,147 @@
+from rest_framework import serializers
+from .utils import get_entities_reviews, get_hospitals_specialists, get_user_favorites
+
+
+class Loader:
+
+    """
+    Batches lookups of one kind of nested data and memoizes the results.
+
+    Keys registered with `prime` are not fetched until the first `load`, which resolves
+    every pending key in a single call to `batch_load`. Later loads are served from the memo.
+    """
+
+    def __init__(self, batch_load):
+        self.batch_load = batch_load
+        self.pending = set()
+        self.memo = {}
+
+    def prime(self, keys):
+        self.pending.update(key for key in keys if key not in self.memo)
+
+    def load(self, key):
+        if key not in self.memo:
+            self.pending.add(key)
+            keys, self.pending = self.pending, set()
+            self.memo.update(self.batch_load(keys))
+        return self.memo[key]
+
+
+class BatchLoader:
+
+    """
+    Request-scoped set of loaders used by the healthcare serializers' method fields.
+    """
+
+    def __init__(self):
+        self.reviews = Loader(get_entities_reviews)
+        self.specialists = Loader(self.load_specialists)
+        self.favorites = Loader(get_user_favorites)
+        # The user whose favorites are being loaded, set once a page registers its favorite status.
+        self.favorites_user_id = None
+
+    def load_specialists(self, hospital_ids):
+
+        """
+        Loads the specialists of the given hospitals and registers their reviews and favorite status,
+        so all specialists on the page fetch them in one query each as well.
+        """
+
+        specialists = get_hospitals_specialists(hospital_ids)
+        self.reviews.prime((1, str(doctor.id)) for doctors in specialists.values() for doctor in doctors)
+        if self.favorites_user_id is not None:
+            self.favorites.prime((self.favorites_user_id, 1, str(doctor.id)) for doctors in specialists.values() for doctor in doctors)
+        return specialists
+
+
+def get_batch_loader(context):
+
+    """
+    Returns the batch loader shared by every serializer of the current request.
+
+    Args:
+        context (dict): The serializer context.
+
+    Returns:
+        BatchLoader: The loader stored on the request, or on the context when there is no request.
+    """
+
+    loader = context.get('batch_loader')
+    if loader is None:
+        request = context.get('request')
+        loader = getattr(request, 'batch_loader', None)
+        if loader is None:
+            loader = BatchLoader()
+            if request is not None:
+                request.batch_loader = loader
+        context['batch_loader'] = loader
+    return loader
+
+
+def get_context_user(context):
+
+    """
+    Returns the requesting user of a serializer context, which nested serializers receive as 'user' instead of the request.
+    """
+
+    if 'user' in context:
+        return context['user']
+    return getattr(context.get('request'), 'user', None)
+
+
+def get_favorite_key(context, entity_type, entity_id):
+
+    """
+    Returns the favorites loader key of an entity for the requesting user.
+
+    Args:
+        context (dict): The serializer context, with the request or the requesting 'user'.
+        entity_type (int): The type of the entity (1 for Doctor, 2 for Hospital).
+        entity_id: The ID of the entity.
+
+    Returns:
+        tuple: The (user_id, entity_type, entity_id) key, or None when the request is anonymous.
+    """
+
+    user = get_context_user(context)
+    if user is None or not user.is_authenticated or getattr(user, 'id', None) is None:
+        return None
+    return (str(user.id), entity_type, str(entity_id))
+
+
+def is_favorite(context, entity_type, entity_id):
+
+    """
+    Returns True if the requesting user marked the entity as a favorite. Anonymous requests have no favorites.
+    """
+
+    key = get_favorite_key(context, entity_type, entity_id)
+    return key is not None and get_batch_loader(context).favorites.load(key)
+
+
+def prime_favorites(context, entity_type, entities):
+
+    """
+    Registers the favorite status of a page of entities, so it is checked with one query for the whole page.
+    """
+
+    keys = [get_favorite_key(context, entity_type, entity.id) for entity in entities]
+    keys = [key for key in keys if key is not None]
+    if keys:
+        loader = get_batch_loader(context)
+        loader.favorites_user_id = keys[0][0]
+        loader.favorites.prime(keys)
+
+
+class BatchedListSerializer(serializers.ListSerializer):
+
+    """
+    List serializer that lets the child register the nested data of the whole page before any row is serialized.
+    """
+
+    def to_representation(self, data):
+        items = list(data)
+        prime = getattr(self.child, 'prime', None)
+        if prime is not None:
+            prime([item for item in items if item is not None])
+        return super().to_representation(items)
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+from core.models import Location, get_location_point
+
+
+class Command(BaseCommand):
+    help = 'Fills Location.point from the stored latitude and longitude, for the 2dsphere nearest-provider queries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of locations updated per bulk request.')
+
+    def handle(self, *args, **options):
+
+        """
+        Sets the GeoJSON point of every location with a valid latitude and longitude, and clears it on the others.
+
+        New and updated locations get their point on save, so this is only needed once for the
+        locations stored before the point field existed.
+        """
+
+        Location.ensure_indexes()
+        collection = Location._get_collection()
+
+        updated = 0
+        operations = []
+        for location in collection.find({}, {'latitude': 1, 'longitude': 1, 'point': 1}):
+            coordinates = get_location_point(location.get('latitude'), location.get('longitude'))
+            if coordinates is None:
+                if 'point' in location:
+                    operations.append(UpdateOne({'_id': location['_id']}, {'$unset': {'point': ''}}))
+            else:
+                operations.append(UpdateOne({'_id': location['_id']}, {'$set': {'point': {'type': 'Point', 'coordinates': coordinates}}}))
+
+            if len(operations) >= options['batch_size']:
+                updated += collection.bulk_write(operations, ordered=False).modified_count
+                operations = []
+
+        if operations:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} locations.'))
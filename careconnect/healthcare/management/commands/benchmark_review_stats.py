@@ -0,0 +1,122 @@
+import random
+import time
+from collections import defaultdict
+from datetime import datetime
+from bson import ObjectId
+from django.core.management.base import BaseCommand
+from mongoengine.context_managers import switch_collection
+from core.models import Review
+from healthcare.utils import get_review_stats
+
+
+def python_loop_stats(entity_ids, entity_type):
+
+    """
+    The previous per-request implementation: loads every matching review and averages the ratings in Python.
+
+    Args:
+        entity_ids (list): A list of entity IDs.
+        entity_type (int): The type of the entity.
+
+    Returns:
+        dict: The review count and average rating for each entity ID.
+    """
+
+    reviews = Review.objects.filter(entity_id__in=entity_ids, entity_type=entity_type)
+
+    review_data = defaultdict(lambda: {'review_count': 0, 'average_rating': 0.0})
+
+    for review in reviews:
+        entity_id = str(review.entity_id)
+        review_data[entity_id]['review_count'] += 1
+        review_data[entity_id]['average_rating'] += review.rating
+
+    for entity_id, data in review_data.items():
+        if data['review_count'] > 0:
+            data['average_rating'] /= data['review_count']
+
+    return review_data
+
+
+class Command(BaseCommand):
+    help = 'Compares the server-side review statistics aggregation with the Python review loop on synthetic data.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000], help='Number of reviews for each run.')
+        parser.add_argument('--entities', type=int, default=1000, help='Number of doctors and of hospitals the reviews are spread over.')
+        parser.add_argument('--repeat', type=int, default=3, help='Number of timed repetitions per run; the best time is reported.')
+        parser.add_argument('--collection', default='review_benchmark', help='Scratch collection the synthetic reviews are written to.')
+
+    def handle(self, *args, **options):
+
+        """
+        Fills a scratch review collection for each requested size and times both implementations against it.
+
+        The scratch collection is dropped after every run, so the real reviews collection is never touched.
+        """
+
+        doctor_ids = [str(ObjectId()) for _ in range(options['entities'])]
+        hospital_ids = [str(ObjectId()) for _ in range(options['entities'])]
+        user_id = ObjectId()
+
+        self.stdout.write(f"{'reviews':>10} {'python loop (s)':>16} {'aggregation (s)':>16} {'speedup':>8}")
+
+        for size in options['sizes']:
+            with switch_collection(Review, options['collection']) as BenchmarkReview:
+                collection = BenchmarkReview._get_collection()
+                collection.drop()
+                BenchmarkReview.ensure_indexes()
+
+                try:
+                    self.populate(collection, size, doctor_ids, hospital_ids, user_id)
+
+                    loop_time = self.best_of(options['repeat'], lambda: (
+                        python_loop_stats(doctor_ids, 1),
+                        python_loop_stats(hospital_ids, 2),
+                    ))
+                    aggregation_time = self.best_of(options['repeat'], lambda: get_review_stats({1: doctor_ids, 2: hospital_ids}))
+                finally:
+                    collection.drop()
+
+            self.stdout.write(f'{size:>10} {loop_time:>16.3f} {aggregation_time:>16.3f} {loop_time / aggregation_time:>7.1f}x')
+
+    def populate(self, collection, size, doctor_ids, hospital_ids, user_id, batch_size=10000):
+
+        """
+        Inserts synthetic reviews with realistic description lengths, split evenly between doctors and hospitals.
+        """
+
+        description = 'The staff were friendly and the consultation was thorough. ' * 5
+        batch = []
+
+        for index in range(size):
+            entity_type = 1 if index % 2 else 2
+            entity_ids = doctor_ids if entity_type == 1 else hospital_ids
+            batch.append({
+                'entity_id': random.choice(entity_ids),
+                'entity_type': entity_type,
+                'user_id': user_id,
+                'rating': float(random.randint(1, 5)),
+                'description': description,
+                'created_at': datetime.utcnow(),
+            })
+
+            if len(batch) >= batch_size:
+                collection.insert_many(batch, ordered=False)
+                batch = []
+
+        if batch:
+            collection.insert_many(batch, ordered=False)
+
+    def best_of(self, repeat, func):
+
+        """
+        Runs the function the given number of times and returns the fastest wall-clock time in seconds.
+        """
+
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
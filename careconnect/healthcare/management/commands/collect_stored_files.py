@@ -0,0 +1,31 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from core.models import StoredFile
+from core.storage import collect_garbage, recount_references
+
+
+class Command(BaseCommand):
+    help = 'Deletes the uploaded files that no category, hospital, doctor or review references any more.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24, help='How long a file must have been unreferenced before it is deleted.')
+        parser.add_argument('--recount', action='store_true', help='Recomputes every reference count from the documents first.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of files checked per query.')
+
+    def handle(self, *args, **options):
+
+        """
+        Collects the unreferenced stored files, and optionally repairs the reference counts first.
+
+        Meant to run periodically, e.g. daily from cron. Reference counts drift when documents are
+        removed with bulk deletes that bypass the document signals; `--recount` corrects them.
+        """
+
+        StoredFile.ensure_indexes()
+
+        if options['recount']:
+            corrected = recount_references(options['batch_size'])
+            self.stdout.write(f'Corrected the reference count of {corrected} stored files.')
+
+        removed = collect_garbage(timedelta(hours=options['grace_hours']), options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {removed} unreferenced files.'))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from core.images import schedule_variants
+from core.models import Review
+from healthcare.models import Category, Doctor, Hospital
+
+
+class Command(BaseCommand):
+    help = 'Generates the thumbnail and card variants of the uploaded category, hospital, doctor and review images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenerates the variants of images that already have them.')
+
+    def handle(self, *args, **options):
+
+        """
+        Generates the image variants on the image worker pool and waits for them.
+
+        New uploads get their variants in the background when they are saved, so this is only needed
+        once for the images uploaded before the variants existed, or after the variant sizes change.
+        An image that fails is reported and skipped, so one unreadable file does not stop the backfill.
+        """
+
+        generated = 0
+        failed = 0
+        for model in (Category, Hospital, Doctor, Review):
+            queryset = model.objects(files__nin=[None, ''])
+            if not options['all']:
+                queryset = queryset.filter(file_variants__in=[None, {}])
+
+            futures = [(document, schedule_variants(document, overwrite=options['all'])) for document in queryset.only('id', 'files')]
+            for document, future in futures:
+                try:
+                    if future.result():
+                        generated += 1
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'Could not generate the variants of {model.__name__} {document.pk} ({document.files}): {error}')
+
+        self.stdout.write(self.style.SUCCESS(f'Generated the variants of {generated} images.'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'Could not generate the variants of {failed} images.'))
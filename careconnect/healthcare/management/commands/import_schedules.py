@@ -0,0 +1,31 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from constant import WorkingTimeManager
+
+
+class Command(BaseCommand):
+    help = 'Imports doctor and hospital working hours from a CSV or JSON Lines file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='The CSV or JSON Lines file to import.')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='The file format. Defaults to the file extension.')
+        parser.add_argument('--append', action='store_true', help='Add to the existing working hours instead of replacing them.')
+
+    def handle(self, *args, **options):
+
+        """
+        Streams the file through WorkingTimeManager.import_schedules and reports the invalid rows.
+        """
+
+        file_format = options['format'] or os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if file_format not in ('csv', 'jsonl'):
+            raise CommandError("The format must be 'csv' or 'jsonl'; pass --format.")
+
+        with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+            summary = WorkingTimeManager.import_schedules(stream, file_format=file_format, replace=not options['append'])
+
+        for error in summary['errors']:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Inserted {summary['inserted']} working hours for {summary['entities']} entities, skipped {len(summary['errors'])} invalid rows."
+        ))
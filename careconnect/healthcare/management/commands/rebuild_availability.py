@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand
+from appointments.availability import ensure_slots, reset_schedule
+from appointments.models import DoctorSchedule, DoctorSlot
+from healthcare.models import Doctor
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the doctor availability slot index from working hours, packages and booked appointments.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=14, help='Number of days ahead to generate for every doctor. 0 only clears the index.')
+        parser.add_argument('--doctor', help='Rebuild a single doctor instead of all of them.')
+
+    def handle(self, *args, **options):
+
+        """
+        Drops the slot index and regenerates it for the coming days.
+
+        The index is otherwise maintained as appointments, packages and working hours change, and
+        extended on demand, so this is only needed for backfills and after bulk writes.
+        """
+
+        DoctorSlot.ensure_indexes()
+        DoctorSchedule.ensure_indexes()
+
+        if options['doctor']:
+            doctor_ids = [Doctor.objects.get(id=options['doctor']).id]
+        else:
+            doctor_ids = list(Doctor.objects.scalar('id'))
+
+        start = datetime.utcnow()
+        for doctor_id in doctor_ids:
+            reset_schedule(doctor_id)
+            if options['days'] > 0:
+                ensure_slots(doctor_id, start, start + timedelta(days=options['days']))
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the availability of {len(doctor_ids)} doctors.'))
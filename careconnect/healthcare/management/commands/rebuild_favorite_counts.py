@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from pymongo import DeleteMany, UpdateOne
+from core.models import Favorite
+from healthcare.models import Doctor, Hospital
+
+
+class Command(BaseCommand):
+    help = 'Removes duplicate favorites, creates the unique favorites index and rebuilds the favorite_count of every doctor and hospital.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of updates sent per bulk write.')
+
+    def handle(self, *args, **options):
+
+        """
+        Keeps one favorite per (user_id, entity_type, entity_id) and recomputes favorite_count from the favorites.
+
+        The duplicates left by the former read-modify-write toggle must be removed before the unique
+        index can be built, so the collection is read without triggering the index creation.
+        Providers without favorites are reset to zero.
+        """
+
+        batch_size = options['batch_size']
+        collection = Favorite._get_db()[Favorite._get_collection_name()]
+
+        pipeline = [
+            {'$group': {
+                '_id': {'user_id': '$user_id', 'entity_type': '$entity_type', 'entity_id': '$entity_id'},
+                'ids': {'$push': '$_id'},
+                'count': {'$sum': 1},
+            }},
+            {'$match': {'count': {'$gt': 1}}},
+        ]
+        duplicates = [favorite_id for row in collection.aggregate(pipeline, allowDiskUse=True) for favorite_id in row['ids'][1:]]
+        for start in range(0, len(duplicates), batch_size):
+            collection.bulk_write([DeleteMany({'_id': {'$in': duplicates[start:start + batch_size]}})])
+        self.stdout.write(f'Removed {len(duplicates)} duplicate favorites')
+
+        Favorite.ensure_indexes()
+
+        counts = {}
+        for row in collection.aggregate([{'$group': {'_id': {'entity_type': '$entity_type', 'entity_id': '$entity_id'}, 'count': {'$sum': 1}}}]):
+            counts[(row['_id'].get('entity_type'), row['_id'].get('entity_id'))] = row['count']
+
+        for entity_type, model in ((1, Doctor), (2, Hospital)):
+            entities = model._get_collection()
+            requests = []
+            updated = 0
+
+            for document in entities.find({}, {'_id': 1}):
+                favorite_count = counts.get((entity_type, str(document['_id'])), 0)
+                requests.append(UpdateOne({'_id': document['_id']}, {'$set': {'favorite_count': favorite_count}}))
+
+                if len(requests) >= batch_size:
+                    entities.bulk_write(requests, ordered=False)
+                    updated += len(requests)
+                    requests = []
+
+            if requests:
+                entities.bulk_write(requests, ordered=False)
+                updated += len(requests)
+
+            self.stdout.write(f'Rebuilt favorite counts for {updated} {model.__name__.lower()} documents')
+
+        self.stdout.write(self.style.SUCCESS('Favorite counts rebuilt successfully'))
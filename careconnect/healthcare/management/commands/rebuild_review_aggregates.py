@@ -0,0 +1,71 @@
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+from core.models import Review
+from healthcare.models import Doctor, Hospital
+from healthcare.utils import get_rating_bucket
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the stored review aggregates of every doctor and hospital from the reviews collection.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of updates sent per bulk write.')
+
+    def handle(self, *args, **options):
+
+        """
+        Recomputes review_count, rating_sum, average_rating and rating_histogram for all providers.
+
+        Reviews are grouped server-side by entity and rating, so only one row per distinct
+        rating of each entity is transferred. Providers without reviews are reset to zero.
+        """
+
+        batch_size = options['batch_size']
+        aggregates = defaultdict(lambda: {'review_count': 0, 'rating_sum': 0.0, 'rating_histogram': {}})
+
+        pipeline = [
+            {'$group': {
+                '_id': {'entity_type': '$entity_type', 'entity_id': '$entity_id', 'rating': '$rating'},
+                'count': {'$sum': 1},
+            }},
+        ]
+
+        for row in Review.objects.aggregate(pipeline):
+            key = row['_id']
+            rating = key.get('rating') or 0.0
+            data = aggregates[(key.get('entity_type'), key.get('entity_id'))]
+            data['review_count'] += row['count']
+            data['rating_sum'] += rating * row['count']
+            bucket = get_rating_bucket(rating)
+            data['rating_histogram'][bucket] = data['rating_histogram'].get(bucket, 0) + row['count']
+
+        for entity_type, model in ((1, Doctor), (2, Hospital)):
+            collection = model._get_collection()
+            requests = []
+            updated = 0
+
+            for document in collection.find({}, {'_id': 1}):
+                data = aggregates.get((entity_type, str(document['_id'])))
+                review_count = data['review_count'] if data else 0
+                rating_sum = data['rating_sum'] if data else 0.0
+
+                requests.append(UpdateOne({'_id': document['_id']}, {'$set': {
+                    'review_count': review_count,
+                    'rating_sum': rating_sum,
+                    'average_rating': rating_sum / review_count if review_count else 0.0,
+                    'rating_histogram': data['rating_histogram'] if data else {},
+                }}))
+
+                if len(requests) >= batch_size:
+                    collection.bulk_write(requests, ordered=False)
+                    updated += len(requests)
+                    requests = []
+
+            if requests:
+                collection.bulk_write(requests, ordered=False)
+                updated += len(requests)
+
+            self.stdout.write(f'Rebuilt review aggregates for {updated} {model.__name__.lower()} documents')
+
+        self.stdout.write(self.style.SUCCESS('Review aggregates rebuilt successfully'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from healthcare.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the provider search index from every doctor, hospital and category.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of index entries written per bulk request.')
+
+    def handle(self, *args, **options):
+
+        """
+        Re-indexes every searchable document and removes the entries of documents that no longer exist.
+
+        The index is kept up to date on save and delete, so this is only needed for backfills and
+        after bulk writes that bypass the document signals.
+        """
+
+        indexed = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} documents.'))
@@ -1,4 +1,4 @@
-from mongoengine import Document, StringField, URLField, EmailField, ReferenceField, CASCADE, IntField, BooleanField, FloatField
+from mongoengine import Document, StringField, URLField, EmailField, ReferenceField, CASCADE, IntField, BooleanField, FloatField, DictField, ListField
 from django.db import models
 from django.utils import timezone
 from accounts.models import User
@@ -10,6 +10,7 @@ class Category(Document):
     name = StringField(max_length=100, unique=True)
     description = StringField(max_length=500, blank=True, null=True)
     files = StringField()
+    file_variants = DictField()
 
     def __str__(self):
         return self.name
@@ -50,7 +51,19 @@ class Hospital(Document):
     address = StringField(max_length=255, required=True)
     is_favorite = BooleanField(default=False)
     files = StringField()
+    file_variants = DictField()
+    review_count = IntField(default=0)
+    rating_sum = FloatField(default=0.0)
+    average_rating = FloatField(default=0.0)
+    rating_histogram = DictField()
+    favorite_count = IntField(default=0)
 
+    meta = {
+        'indexes': [
+            'category_id',
+            'location_id',
+        ]
+    }
 
     def __str__(self):
         return self.name
@@ -69,7 +82,44 @@ class Doctor(Document):
     total_patients = IntField()
     hospital_id = ReferenceField(Hospital, reverse_delete_rule=CASCADE, max_length=255)
     files = StringField()
+    file_variants = DictField()
     review_id = StringField()
+    review_count = IntField(default=0)
+    rating_sum = FloatField(default=0.0)
+    average_rating = FloatField(default=0.0)
+    rating_histogram = DictField()
+    favorite_count = IntField(default=0)
+
+    meta = {
+        'indexes': [
+            'hospital_id',
+            'speciality_id',
+            'location_id',
+        ]
+    }
+
+    def __str__(self):
+        return self.name
+
+
+class SearchEntry(Document):
+    entity_type = IntField(required=True, choices=
+        [(1, "Doctor"),
+        (2, "Hospital"),
+        (3, "Category")])
+    entity_id = StringField(max_length=255, required=True)
+    title = StringField()
+    subtitle = StringField()
+    terms = DictField()
+    words = DictField()
+    keys = ListField(StringField())
+
+    meta = {
+        'indexes': [
+            {'fields': ('entity_type', 'entity_id'), 'unique': True},
+            'keys',
+        ]
+    }
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return f"SearchEntry: {self.title} ({self.entity_type})"
@@ -0,0 +1,42 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from rest_framework.exceptions import ValidationError
+
+
+class SectionCursorPagination:
+    """
+    Cursor pagination over `_id` for one section of a combined response.
+
+    The cursor is the id of the last document of the previous page, so every page is a single
+    indexed range query no matter how far the client has scrolled.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def __init__(self, cursor_query_param):
+        self.cursor_query_param = cursor_query_param
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request):
+        """
+        Returns the page of documents after the request's cursor, and the cursor of the next page (None on the last page).
+        """
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            try:
+                queryset = queryset.filter(id__gt=ObjectId(cursor))
+            except (InvalidId, TypeError):
+                raise ValidationError({self.cursor_query_param: 'Invalid cursor.'})
+
+        page_size = self.get_page_size(request)
+        documents = list(queryset.order_by('id').limit(page_size + 1))
+
+        next_cursor = str(documents[page_size - 1].id) if len(documents) > page_size else None
+        return documents[:page_size], next_cursor
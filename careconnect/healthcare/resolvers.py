@@ -0,0 +1,62 @@
+from collections import defaultdict
+from bson import ObjectId
+from constant import EntityChoices
+from core.prefetch import prefetch_references
+from .loaders import BatchLoader
+from .models import Doctor, Hospital
+from .serializers import DoctorSerializer, HospitalSerializer
+
+# The model, serializer and references to prefetch for each polymorphic entity type.
+ENTITY_TYPES = {
+    EntityChoices.DOCTOR[0]: (Doctor, DoctorSerializer, ['user_id', 'speciality_id', 'location_id', 'working_time_id', 'hospital_id']),
+    EntityChoices.HOSPITAL[0]: (Hospital, HospitalSerializer, ['category_id', 'location_id', 'working_time_id']),
+}
+
+
+def resolve_entities(pairs, context=None):
+
+    """
+    Loads and serializes the doctors and hospitals referenced by (entity_type, entity_id) pairs.
+
+    The pairs are grouped by type and each type is loaded with a single $in query. The entities of
+    a type are then serialized together, sharing one batch loader, so their references and nested
+    reviews and specialists are also loaded once per page instead of once per row.
+
+    Args:
+        pairs (iterable): (entity_type, entity_id) pairs, e.g. from favorites, reviews or working times.
+        context (dict): The serializer context. A fresh batch loader is added when it has none.
+
+    Returns:
+        dict: The serialized entity for each (entity_type, entity_id) pair that could be resolved.
+    """
+
+    context = dict(context or {})
+    context.setdefault('batch_loader', BatchLoader())
+
+    ids_by_type = defaultdict(set)
+    for entity_type, entity_id in pairs:
+        if entity_type in ENTITY_TYPES and entity_id and ObjectId.is_valid(str(entity_id)):
+            ids_by_type[entity_type].add(ObjectId(str(entity_id)))
+
+    resolved = {}
+    for entity_type, ids in ids_by_type.items():
+        model, serializer_class, prefetch = ENTITY_TYPES[entity_type]
+        entities = list(model.objects(id__in=list(ids)))
+        prefetch_references(entities, prefetch)
+        data = serializer_class(entities, many=True, context=context).data
+        for entity, entity_data in zip(entities, data):
+            resolved[(entity_type, str(entity.id))] = entity_data
+
+    return resolved
+
+
+def resolve_entity(entity_type, entity_id, context=None):
+
+    """
+    Loads and serializes a single doctor or hospital.
+
+    Returns:
+        dict: The serialized entity, or None if the type is not supported or the entity does not exist.
+    """
+
+    return resolve_entities([(entity_type, entity_id)], context).get((entity_type, str(entity_id)))
@@ -0,0 +1,320 @@
+import re
+import unicodedata
+from mongoengine import signals
+from pymongo import ReplaceOne
+from .models import Category, Doctor, Hospital, SearchEntry
+
+DOCTOR = 1
+HOSPITAL = 2
+CATEGORY = 3
+
+ENTITY_TYPES = {'doctor': DOCTOR, 'hospital': HOSPITAL, 'category': CATEGORY}
+
+# Field weights per entity type: a match in a name ranks above a match in a description or address.
+# Short fields are matched by prefix and with typos; long text only by whole words, which keeps its
+# index entries to one key per word.
+SEARCH_FIELDS = {
+    Doctor: (DOCTOR, (('name', 3, True), ('about', 1, False))),
+    Hospital: (HOSPITAL, (('name', 3, True), ('address', 1, False))),
+    Category: (CATEGORY, (('name', 3, True),)),
+}
+
+MIN_TOKEN_LENGTH = 2
+MAX_PREFIX_LENGTH = 15
+# Tokens shorter than this only match exactly or by prefix; longer ones also tolerate one typo.
+MIN_FUZZY_LENGTH = 4
+# Matching entries read per search. Broader queries are ranked among the first ones found.
+MAX_CANDIDATES = 500
+
+STOP_WORDS = {'and', 'the', 'of', 'in', 'at', 'for', 'with', 'to', 'on', 'a', 'an', 'is', 'dr'}
+
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.8
+TYPO_SCORE = 0.6
+TYPO_PREFIX_SCORE = 0.5
+
+
+def tokenize(text):
+
+    """
+    Splits text into lowercase, accent-free search tokens, dropping stop words and single characters.
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        list: The tokens, in order of appearance.
+    """
+
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode().lower()
+    return [token for token in re.findall(r'[a-z0-9]+', text) if len(token) >= MIN_TOKEN_LENGTH and token not in STOP_WORDS]
+
+
+def deletes(token):
+
+    """
+    Returns every variant of the token with one character removed.
+    """
+
+    return {token[:index] + token[index + 1:] for index in range(len(token))}
+
+
+def index_keys(token):
+
+    """
+    Returns the lookup keys stored for an indexed token: its prefixes, and the one-deletion variants
+    of its prefixes of MIN_FUZZY_LENGTH characters or more.
+
+    A query token finds the document when the query itself, or one of its own deletion variants,
+    is among these keys. Against the token or any of its prefixes, that covers a missing, extra or
+    wrong character and two swapped characters, which are exactly the typos `match_score` accepts.
+    For example 'carido' and the prefix 'cardio' of 'cardiology' share the deletion 'cardo'.
+    """
+
+    token = token[:MAX_PREFIX_LENGTH]
+    keys = set()
+    for length in range(MIN_TOKEN_LENGTH, len(token) + 1):
+        prefix = token[:length]
+        keys.add(prefix)
+        if length >= MIN_FUZZY_LENGTH:
+            keys |= deletes(prefix)
+    return keys
+
+
+def query_keys(token):
+
+    """
+    Returns the lookup keys of a query token.
+    """
+
+    token = token[:MAX_PREFIX_LENGTH]
+    keys = {token}
+    if len(token) >= MIN_FUZZY_LENGTH:
+        keys |= {variant for variant in deletes(token) if len(variant) >= MIN_TOKEN_LENGTH}
+    return keys
+
+
+def within_one_edit(first, second):
+
+    """
+    Returns True when the two strings differ by at most one insertion, deletion, substitution or adjacent transposition.
+    """
+
+    if abs(len(first) - len(second)) > 1:
+        return False
+    if len(first) > len(second):
+        first, second = second, first
+
+    index = 0
+    while index < len(first) and first[index] == second[index]:
+        index += 1
+    if index == len(first):
+        return True
+    if len(first) == len(second):
+        return (
+            first[index + 1:] == second[index + 1:]
+            or (first[index] == second[index + 1] and first[index + 1] == second[index] and first[index + 2:] == second[index + 2:])
+        )
+    return first[index:] == second[index + 1:]
+
+
+def match_score(query, token):
+
+    """
+    Scores how well a query token matches an indexed token, from 0 (no match) to 1 (exact match).
+    """
+
+    if token == query:
+        return EXACT_SCORE
+    if token.startswith(query):
+        return PREFIX_SCORE
+    if len(query) < MIN_FUZZY_LENGTH:
+        return 0
+    if within_one_edit(query, token):
+        return TYPO_SCORE
+    if any(within_one_edit(query, token[:length]) for length in (len(query) - 1, len(query), len(query) + 1)):
+        return TYPO_PREFIX_SCORE
+    return 0
+
+
+def build_entry(document):
+
+    """
+    Builds the search index entry of a doctor, hospital or category.
+
+    Args:
+        document (Document): The document to index.
+
+    Returns:
+        dict: The raw entry, ready to be written to the search entry collection.
+    """
+
+    entity_type, fields = SEARCH_FIELDS[type(document)]
+
+    terms = {}
+    words = {}
+    for field, weight, fuzzy in fields:
+        tokens = terms if fuzzy else words
+        for token in tokenize(getattr(document, field, None)):
+            tokens[token] = max(tokens.get(token, 0), weight)
+
+    keys = {token[:MAX_PREFIX_LENGTH] for token in words}
+    for token in terms:
+        keys |= index_keys(token)
+
+    subtitle = document.about if entity_type == DOCTOR else document.address if entity_type == HOSPITAL else document.description
+
+    return {
+        'entity_type': entity_type,
+        'entity_id': str(document.id),
+        'title': document.name,
+        'subtitle': subtitle,
+        'terms': terms,
+        'words': words,
+        'keys': sorted(keys),
+    }
+
+
+def index_document(document):
+
+    """
+    Adds or refreshes the search index entry of a single document.
+    """
+
+    entry = build_entry(document)
+    SearchEntry._get_collection().replace_one(
+        {'entity_type': entry['entity_type'], 'entity_id': entry['entity_id']}, entry, upsert=True
+    )
+
+
+def unindex_document(document):
+
+    """
+    Removes the search index entry of a single document.
+    """
+
+    entity_type, _ = SEARCH_FIELDS[type(document)]
+    SearchEntry._get_collection().delete_one({'entity_type': entity_type, 'entity_id': str(document.id)})
+
+
+def rebuild_index(batch_size=1000):
+
+    """
+    Rebuilds the search index from every doctor, hospital and category.
+
+    Args:
+        batch_size (int): The number of entries written per bulk request.
+
+    Returns:
+        int: The number of indexed documents.
+    """
+
+    collection = SearchEntry._get_collection()
+    SearchEntry.ensure_indexes()
+
+    indexed = 0
+    for model, (entity_type, _) in SEARCH_FIELDS.items():
+        seen = []
+        operations = []
+        for document in model.objects.no_dereference():
+            entry = build_entry(document)
+            seen.append(entry['entity_id'])
+            operations.append(ReplaceOne({'entity_type': entity_type, 'entity_id': entry['entity_id']}, entry, upsert=True))
+            if len(operations) >= batch_size:
+                collection.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+
+        collection.delete_many({'entity_type': entity_type, 'entity_id': {'$nin': seen}})
+        indexed += len(seen)
+
+    return indexed
+
+
+def search(query, entity_types=None):
+
+    """
+    Searches the index and returns the matching entries, best match first.
+
+    Every query token must match at least one indexed token: a name token exactly, by prefix or with
+    one typo, and a word of a long text field exactly. An entry's score is the sum over the query
+    tokens of the best match score times the field weight. At most MAX_CANDIDATES matching entries
+    are read and ranked, so the cost of a search does not grow with the number of matches. Only the
+    terms and titles are read; the subtitles of the page being returned are loaded with `load_subtitles`.
+
+    Args:
+        query (str): The text typed by the user.
+        entity_types (list): Restricts the results to these entity types. All types when omitted.
+
+    Returns:
+        list: Dicts with the 'entity_type', 'entity_id', 'title' and 'score' of each match.
+    """
+
+    tokens = list(dict.fromkeys(tokenize(query)))
+    if not tokens:
+        return []
+
+    match = {'$and': [{'keys': {'$in': sorted(query_keys(token))}} for token in tokens]}
+    if entity_types:
+        match['entity_type'] = {'$in': list(entity_types)}
+
+    results = []
+    projection = {'_id': 0, 'entity_type': 1, 'entity_id': 1, 'title': 1, 'terms': 1, 'words': 1}
+    for entry in SearchEntry._get_collection().find(match, projection).limit(MAX_CANDIDATES):
+        terms = entry.get('terms', {})
+        words = entry.get('words', {})
+        score = 0
+        for query_token in tokens:
+            best = max((match_score(query_token, token) * weight for token, weight in terms.items()), default=0)
+            best = max(best, EXACT_SCORE * words.get(query_token, 0))
+            if not best:
+                break
+            score += best
+        else:
+            results.append({
+                'entity_type': entry['entity_type'],
+                'entity_id': entry['entity_id'],
+                'title': entry.get('title'),
+                'score': round(score, 3),
+            })
+
+    results.sort(key=lambda result: (-result['score'], result['title'] or ''))
+    return results
+
+
+def load_subtitles(results):
+
+    """
+    Adds the 'subtitle' of each search result, with one query.
+
+    Args:
+        results (list): Search results, usually one page of them.
+
+    Returns:
+        list: The same results.
+    """
+
+    clauses = [{'entity_type': result['entity_type'], 'entity_id': result['entity_id']} for result in results]
+    subtitles = {}
+    if clauses:
+        for entry in SearchEntry._get_collection().find({'$or': clauses}, {'_id': 0, 'entity_type': 1, 'entity_id': 1, 'subtitle': 1}):
+            subtitles[(entry['entity_type'], entry['entity_id'])] = entry.get('subtitle')
+    for result in results:
+        result['subtitle'] = subtitles.get((result['entity_type'], result['entity_id']))
+    return results
+
+
+def update_search_index(sender, document, **kwargs):
+    index_document(document)
+
+
+def remove_from_search_index(sender, document, **kwargs):
+    unindex_document(document)
+
+
+for model in SEARCH_FIELDS:
+    signals.post_save.connect(update_search_index, sender=model)
+    signals.post_delete.connect(remove_from_search_index, sender=model)
@@ -1,21 +1,25 @@
 from rest_framework_mongoengine.serializers import DocumentSerializer
 from .models import Category, WorkingTime, Hospital, Doctor
 from rest_framework import serializers
-from django.conf import settings
-from .utils import get_entity_reviews, get_hospital_specialists
-from core.serializers import LocationSerializer
+from .loaders import BatchedListSerializer, get_batch_loader, get_context_user, is_favorite, prime_favorites
+from core.serializers import LocationSerializer, ReviewSerializer, ReferenceIdField
+from core.sparse import SparseFieldsSerializerMixin
+from core.images import ImageVariantsField, get_image_path, get_media_url
 
 
-class CategorySerializer(DocumentSerializer):
+class CategorySerializer(SparseFieldsSerializerMixin, DocumentSerializer):
     files = serializers.SerializerMethodField(required=False)
+    file_variants = ImageVariantsField()
 
     class Meta:
         model = Category
         fields = '__all__'
+        field_sources = {'files': ('files', 'file_variants')}
 
     def get_files(self, obj):
         """
         A function that retrieves the files URL for a given object.
+        List responses get the small variant selected in the context, once it has been generated.
         
         Parameters:
             self: The serializer instance.
@@ -24,18 +28,7 @@ class CategorySerializer(DocumentSerializer):
         Returns:
             The absolute URI of the files URL if it exists, otherwise None.
         """
-        files_url = obj.get('files') if isinstance(obj, dict) else obj.files
-        
-        if files_url:
-            if files_url.startswith('media/'):
-                files_url = files_url[len('media/'):]
-            
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(settings.MEDIA_URL + files_url)
-            else:
-                return settings.MEDIA_URL + files_url
-        return None
+        return get_media_url(get_image_path(obj, self.context), self.context.get('request'))
 
 class WorkingTimeSerializer(DocumentSerializer):
     class Meta:
@@ -43,8 +36,10 @@ class WorkingTimeSerializer(DocumentSerializer):
         fields = '__all__'
 
 
-class HospitalSerializer(DocumentSerializer):
+class HospitalSerializer(SparseFieldsSerializerMixin, DocumentSerializer):
     files = serializers.SerializerMethodField()
+    file_variants = ImageVariantsField()
+    is_favorite = serializers.SerializerMethodField()
     category = CategorySerializer(source='category_id', read_only=True)
     working_time = WorkingTimeSerializer(source='working_time_id', read_only=True)
     location = LocationSerializer(source='location_id', read_only=True)
@@ -58,6 +53,28 @@ class HospitalSerializer(DocumentSerializer):
     class Meta:
         model = Hospital
         fields = '__all__'
+        read_only_fields = ('rating_sum', 'rating_histogram', 'favorite_count')
+        list_serializer_class = BatchedListSerializer
+        expandable = ('category', 'working_time', 'location', 'reviews', 'speciaists')
+        field_aliases = {'specialists': 'speciaists'}
+        field_sources = {'files': ('files', 'file_variants'), 'is_favorite': ()}
+
+    def prime(self, hospitals):
+        """
+        Registers the favorite status, reviews and specialists of a page of hospitals with the request's batch loader.
+        Nested data whose field was not selected is not registered.
+
+        Parameters:
+            self: The object itself.
+            hospitals (list): The hospitals about to be serialized.
+        """
+        loader = get_batch_loader(self.context)
+        if 'is_favorite' in self.fields:
+            prime_favorites(self.context, 2, hospitals)
+        if 'reviews' in self.fields:
+            loader.reviews.prime((2, str(hospital.id)) for hospital in hospitals)
+        if 'speciaists' in self.fields:
+            loader.specialists.prime(str(hospital.id) for hospital in hospitals)
 
     def get_review_count(self, obj):
         """
@@ -95,8 +112,8 @@ class HospitalSerializer(DocumentSerializer):
         Returns:
             list: A list of serialized reviews for the hospital.
         """
-        hospital_id = str(obj.id)
-        return get_entity_reviews(hospital_id, 2)
+        reviews = get_batch_loader(self.context).reviews.load((2, str(obj.id)))
+        return ReviewSerializer(reviews, many=True).data
     
     def get_speciaists(self, obj):
         """
@@ -109,8 +126,9 @@ class HospitalSerializer(DocumentSerializer):
         Returns:
             list: A list of serialized specialists for the hospital.
         """
-        hospital_id = str(obj.id)
-        return get_hospital_specialists(hospital_id)
+        loader = get_batch_loader(self.context)
+        doctors = loader.specialists.load(str(obj.id))
+        return DoctorSerializer(doctors, many=True, context={'batch_loader': loader, 'user': get_context_user(self.context)}).data
     
     def get_entity_type(self, obj):
         """
@@ -125,9 +143,23 @@ class HospitalSerializer(DocumentSerializer):
         """
         return getattr(obj, 'entity_type', 2)
 
+    def get_is_favorite(self, obj):
+        """
+        Checks whether the requesting user marked the hospital as a favorite.
+        The favorites of the whole page are loaded with one query, see `prime`.
+
+        Parameters:
+            obj: The hospital object.
+
+        Returns:
+            bool: True if the hospital is one of the user's favorites, otherwise False.
+        """
+        return is_favorite(self.context, 2, obj.id)
+
     def get_files(self, obj):
         """
         Retrieves the files URL for a given object.
+        List responses get the small variant selected in the context, once it has been generated.
 
         Parameters:
             obj (dict or object): The object from which to retrieve the files URL.
@@ -135,22 +167,13 @@ class HospitalSerializer(DocumentSerializer):
         Returns:
             str or None: The absolute URI of the files URL if it exists, otherwise None.
         """
-        files_url = obj.get('files') if isinstance(obj, dict) else obj.files
-        
-        if files_url:
-            if files_url.startswith('media/'):
-                files_url = files_url[len('media/'):]
-            
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(settings.MEDIA_URL + files_url)
-            else:
-                return settings.MEDIA_URL + files_url
-        return None
+        return get_media_url(get_image_path(obj, self.context), self.context.get('request'))
     
 
-class DoctorSerializer(DocumentSerializer):
+class DoctorSerializer(SparseFieldsSerializerMixin, DocumentSerializer):
     files = serializers.SerializerMethodField()
+    file_variants = ImageVariantsField()
+    is_favorite = serializers.SerializerMethodField()
     speciality = CategorySerializer(source='speciality_id', read_only=True)
     location = LocationSerializer(source='location_id', read_only=True)
     review_count = serializers.SerializerMethodField()
@@ -162,10 +185,28 @@ class DoctorSerializer(DocumentSerializer):
     class Meta:
         model = Doctor
         fields = '__all__'
+        read_only_fields = ('rating_sum', 'rating_histogram', 'favorite_count')
+        list_serializer_class = BatchedListSerializer
+        expandable = ('speciality', 'working_time', 'location', 'reviews')
+        field_sources = {'files': ('files', 'file_variants'), 'is_favorite': ()}
+
+    def prime(self, doctors):
+        """
+        Registers the favorite status and reviews of a page of doctors with the request's batch loader.
+
+        Parameters:
+            self: The object itself.
+            doctors (list): The doctors (or references to them) about to be serialized.
+        """
+        if 'is_favorite' in self.fields:
+            prime_favorites(self.context, 1, doctors)
+        if 'reviews' in self.fields:
+            get_batch_loader(self.context).reviews.prime((1, str(doctor.id)) for doctor in doctors)
 
     def get_files(self, obj):
         """
         Retrieves the absolute URL of the files associated with the given object.
+        List responses get the small variant selected in the context, once it has been generated.
 
         Parameters:
             obj (dict or object): The object from which to retrieve the files.
@@ -173,18 +214,7 @@ class DoctorSerializer(DocumentSerializer):
         Returns:
             str or None: The absolute URL of the files if they exist, otherwise None.
         """
-        files_url = obj.get('files') if isinstance(obj, dict) else obj.files
-        
-        if files_url:
-            if files_url.startswith('media/'):
-                files_url = files_url[len('media/'):]
-            
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(settings.MEDIA_URL + files_url)
-            else:
-                return settings.MEDIA_URL + files_url
-        return None
+        return get_media_url(get_image_path(obj, self.context), self.context.get('request'))
 
     def get_review_count(self, obj):
         """
@@ -223,8 +253,8 @@ class DoctorSerializer(DocumentSerializer):
         Returns:
             list: A list of serialized reviews for the doctor.
         """
-        doctor_id = str(obj.id)
-        return get_entity_reviews(doctor_id, 1)
+        reviews = get_batch_loader(self.context).reviews.load((1, str(obj.id)))
+        return ReviewSerializer(reviews, many=True).data
     
     def get_entity_type(self, obj):
         """
@@ -239,6 +269,19 @@ class DoctorSerializer(DocumentSerializer):
         """
         return getattr(obj, 'entity_type', 1)
 
+    def get_is_favorite(self, obj):
+        """
+        Checks whether the requesting user marked the doctor as a favorite.
+        The favorites of the whole page are loaded with one query, see `prime`.
+
+        Parameters:
+            obj: The doctor object.
+
+        Returns:
+            bool: True if the doctor is one of the user's favorites, otherwise False.
+        """
+        return is_favorite(self.context, 1, obj.id)
+
 
 
 class HospitalCardSerializer(DocumentSerializer):
@@ -247,11 +290,29 @@ class HospitalCardSerializer(DocumentSerializer):
     review_count = serializers.SerializerMethodField()
     entity_type = serializers.SerializerMethodField()
     speciality = CategorySerializer(source='category_id', read_only=True)
+    location_id = ReferenceIdField()
     hospital = serializers.SerializerMethodField()
+    files = serializers.SerializerMethodField()
+    is_favorite = serializers.SerializerMethodField()
 
     class Meta:
         model = Hospital
         fields = ['hospital_id', 'name', 'files', 'is_favorite', 'average_rating', 'review_count', 'entity_type', 'location_id', 'speciality', 'hospital']
+        projection = ['id', 'name', 'files', 'file_variants', 'average_rating', 'review_count', 'location_id', 'category_id']
+        list_serializer_class = BatchedListSerializer
+
+    def prime(self, hospitals):
+        """
+        Registers the favorite status of the hospitals, and the nested data of the embedded hospitals when they
+        are expanded, with the request's batch loader.
+
+        Parameters:
+            self: The object itself.
+            hospitals (list): The hospitals about to be serialized.
+        """
+        prime_favorites(self.context, 2, hospitals)
+        if 'hospital' in self.context.get('expand', ()):
+            HospitalSerializer(context=self.context).prime(hospitals)
 
     def get_average_rating(self, obj):
         """
@@ -304,38 +365,80 @@ class HospitalCardSerializer(DocumentSerializer):
             int: The entity type if available, otherwise 2.
         """
         return getattr(obj, 'entity_type', 2)
+
+    def get_is_favorite(self, obj):
+        """
+        Checks whether the requesting user marked the hospital as a favorite.
+        The favorites of the whole page are loaded with one query, see `prime`.
+
+        Parameters:
+            obj: The hospital object.
+
+        Returns:
+            bool: True if the hospital is one of the user's favorites, otherwise False.
+        """
+        return is_favorite(self.context, 2, obj.id)
     
     def get_speciality(self, obj):
         return getattr(obj, 'category_id', None)
     
     def get_hospital(self, obj):
         """
-        Retrieves the hospital object using hospital_id and serializes it.
+        Serializes the full hospital object when the client asked for it with `expand=hospital`.
 
         Args:
             obj (Hospital): The hospital object.
 
         Returns:
-            dict: Serialized hospital data.
+            dict: Serialized hospital data, or None when the hospital is not expanded.
         """
-        hospital_id = getattr(obj, 'hospital_id', None)
-        if hospital_id:
-            hospital = Hospital.objects.get(id=hospital_id)
-            return HospitalSerializer(hospital).data
-        return None
+        if 'hospital' not in self.context.get('expand', ()):
+            return None
+        return HospitalSerializer(obj, context={'batch_loader': get_batch_loader(self.context), 'image_variant': self.context.get('image_variant'), 'user': get_context_user(self.context)}).data
+
+    def get_files(self, obj):
+        """
+        Retrieves the stored path of the card image: the small variant selected in the context once
+        it has been generated, otherwise the original upload.
+
+        Args:
+            obj (Hospital): The hospital object.
+
+        Returns:
+            str or None: The stored path of the image, or None if there is none.
+        """
+        return get_image_path(obj, self.context)
 
 class DoctorCardSerializer(DocumentSerializer):
     doctor_id = serializers.SerializerMethodField()
     review_count = serializers.SerializerMethodField()
     average_rating = serializers.SerializerMethodField()
     speciality = CategorySerializer(source='speciality_id')
+    speciality_id = ReferenceIdField()
+    location_id = ReferenceIdField()
     entity_type = serializers.SerializerMethodField()
     doctor = serializers.SerializerMethodField()
+    files = serializers.SerializerMethodField()
+    is_favorite = serializers.SerializerMethodField()
 
     class Meta:
         model = Doctor
         fields = ['doctor_id', 'name', 'speciality_id', 'files', 'is_favorite', 
                   'location_id', 'review_count', 'average_rating', 'speciality', 'entity_type', 'doctor']
+        projection = ['id', 'name', 'speciality_id', 'files', 'file_variants', 'location_id', 'review_count', 'average_rating']
+        list_serializer_class = BatchedListSerializer
+
+    def prime(self, doctors):
+        """
+        Registers the favorite status of the doctors, and the nested data of the embedded doctors when they
+        are expanded, with the request's batch loader.
+
+        Args:
+            doctors (list): The doctors about to be serialized.
+        """
+        prime_favorites(self.context, 1, doctors)
+        if 'doctor' in self.context.get('expand', ()):
+            DoctorSerializer(context=self.context).prime(doctors)
 
     def get_review_count(self, obj):
         """
@@ -386,19 +489,43 @@ class DoctorCardSerializer(DocumentSerializer):
             int: The entity type if available, otherwise 1.
         """
         return getattr(obj, 'entity_type', 1)
+
+    def get_is_favorite(self, obj):
+        """
+        Checks whether the requesting user marked the doctor as a favorite.
+        The favorites of the whole page are loaded with one query, see `prime`.
+
+        Parameters:
+            obj: The doctor object.
+
+        Returns:
+            bool: True if the doctor is one of the user's favorites, otherwise False.
+        """
+        return is_favorite(self.context, 1, obj.id)
     
     def get_doctor(self, obj):
         """
-        Retrieves the doctor object using doctor_id and serializes it.
+        Serializes the full doctor object when the client asked for it with `expand=doctor`.
+
+        Args:
+            obj (Doctor): The doctor object.
+
+        Returns:
+            dict: Serialized doctor data, or None when the doctor is not expanded.
+        """
+        if 'doctor' not in self.context.get('expand', ()):
+            return None
+        return DoctorSerializer(obj, context={'batch_loader': get_batch_loader(self.context), 'image_variant': self.context.get('image_variant'), 'user': get_context_user(self.context)}).data
+
+    def get_files(self, obj):
+        """
+        Retrieves the stored path of the card image: the small variant selected in the context once
+        it has been generated, otherwise the original upload.
 
         Args:
             obj (Doctor): The doctor object.
 
         Returns:
-            dict: Serialized doctor data.
+            str or None: The stored path of the image, or None if there is none.
         """
-        doctor_id = getattr(obj, 'doctor_id', None)
-        if doctor_id:
-            doctor = Doctor.objects.get(id=doctor_id)
-            return DoctorSerializer(doctor).data
-        return None
\ No newline at end of file
+        return get_image_path(obj, self.context)
@@ -1,3 +1,189 @@
-from django.test import TestCase
+from unittest import skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.test import SimpleTestCase
+from mongoengine import connect, disconnect
+from pymongo import MongoClient, monitoring
+from pymongo.errors import PyMongoError
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from core.models import Location, Review
+from .models import Category, Doctor, Hospital
+from .search import (
+    EXACT_SCORE, PREFIX_SCORE, TYPO_PREFIX_SCORE, TYPO_SCORE, build_entry, index_keys, match_score, query_keys, within_one_edit,
+)
+
+TEST_DB_NAME = 'careconnect_test'
+
+
+def get_mongodb_host():
+    database = settings.MONGODB_DATABASES['default']
+    return f"mongodb://{database['host']}:{database['port']}"
+
+
+def is_mongodb_available():
+
+    """
+    Returns True if the MongoDB server of the settings answers a ping within a second.
+    """
+
+    client = MongoClient(get_mongodb_host(), serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command('ping')
+        return True
+    except PyMongoError:
+        return False
+    finally:
+        client.close()
+
+
+class CommandCounter(monitoring.CommandListener):
+
+    """
+    Counts the database commands sent by the application, ignoring the driver's own handshakes and heartbeats.
+    """
+
+    IGNORED_COMMANDS = {'hello', 'ismaster', 'isMaster', 'ping', 'buildInfo', 'buildinfo', 'endSessions', 'saslStart', 'saslContinue'}
+
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        if event.command_name not in self.IGNORED_COMMANDS:
+            self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def count(self, func):
+        self.commands = []
+        func()
+        return len(self.commands)
+
+
+@skipUnless(is_mongodb_available(), 'the MongoDB server of MONGODB_DATABASES is not reachable')
+class ProviderListQueryCountTests(SimpleTestCase):
+
+    """
+    The doctor and hospital lists must send a constant number of commands per request: filtering and
+    pagination run in MongoDB, and only the page being returned is annotated.
+    """
+
+    # count, the page itself, one query per referenced collection, the page's reviews and, for
+    # hospitals, the specialists of the page with their own references and reviews.
+    MAX_DOCTOR_LIST_COMMANDS = 10
+    MAX_HOSPITAL_LIST_COMMANDS = 15
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.listener = CommandCounter()
+        disconnect()
+        connect(
+            db=TEST_DB_NAME,
+            host=get_mongodb_host(),
+            event_listeners=[cls.listener],
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        Doctor._get_db().client.drop_database(TEST_DB_NAME)
+        disconnect()
+        super().tearDownClass()
+
+    def setUp(self):
+        for model in (User, Location, Category, Hospital, Doctor, Review):
+            model.drop_collection()
+
+        user = User(username='patient', email='patient@example.com', password='secret').save()
+        category = Category(name='Cardiology').save()
+        location = Location(address='1 Main Street', city='Pune', state='MH', country='India').save()
+
+        hospitals = [
+            Hospital(name=f'Hospital {index}', phone_number='1234567890', email='hospital@example.com',
+                     address='1 Main Street', category_id=category, location_id=location).save()
+            for index in range(30)
+        ]
+        doctors = [
+            Doctor(user_id=user, name=f'Doctor {index}', speciality_id=category, location_id=location,
+                   hospital_id=hospitals[index % len(hospitals)]).save()
+            for index in range(30)
+        ]
+        for index in range(60):
+            entity_type, entity = (1, doctors[index % 30]) if index % 2 else (2, hospitals[index % 30])
+            Review(entity_id=str(entity.id), entity_type=entity_type, user_id=user, rating=4.0, description='Good').save()
+
+        self.client = APIClient()
+
+    def count_commands(self, url):
+        def request():
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+        return self.listener.count(request)
+
+    def test_doctor_list_command_count_is_constant(self):
+        small_page = self.count_commands('/healthcare/doctors/?page_size=5')
+        large_page = self.count_commands('/healthcare/doctors/?page_size=25')
+
+        self.assertEqual(small_page, large_page)
+        self.assertLessEqual(large_page, self.MAX_DOCTOR_LIST_COMMANDS)
+
+    def test_hospital_list_command_count_is_constant(self):
+        small_page = self.count_commands('/healthcare/hospitals/?page_size=5')
+        large_page = self.count_commands('/healthcare/hospitals/?page_size=25')
+
+        self.assertEqual(small_page, large_page)
+        self.assertLessEqual(large_page, self.MAX_HOSPITAL_LIST_COMMANDS)
+
+    def test_doctor_list_is_paginated(self):
+        response = self.client.get('/healthcare/doctors/?page_size=5')
+
+        self.assertEqual(response.data['count'], 30)
+        self.assertEqual(len(response.data['results']), 5)
+
+
+class SearchHelperTests(SimpleTestCase):
+
+    def test_within_one_edit(self):
+        self.assertTrue(within_one_edit('cardio', 'cardio'))
+        self.assertTrue(within_one_edit('cardo', 'cardio'))
+        self.assertTrue(within_one_edit('cardiio', 'cardio'))
+        self.assertTrue(within_one_edit('cordio', 'cardio'))
+        self.assertTrue(within_one_edit('carido', 'cardio'))
+        self.assertFalse(within_one_edit('cadrio', 'cardiology'))
+        self.assertFalse(within_one_edit('crdoi', 'cardio'))
+
+    def test_index_keys(self):
+        keys = index_keys('cardiology')
+
+        self.assertIn('ca', keys)
+        self.assertIn('cardiology', keys)
+        self.assertIn('cardo', keys)
+        self.assertNotIn('c', keys)
+        self.assertEqual(index_keys('ent'), {'en', 'ent'})
+
+    def test_match_score(self):
+        self.assertEqual(match_score('cardiology', 'cardiology'), EXACT_SCORE)
+        self.assertEqual(match_score('card', 'cardiology'), PREFIX_SCORE)
+        self.assertEqual(match_score('cardiolgy', 'cardiology'), TYPO_SCORE)
+        self.assertEqual(match_score('carido', 'cardiology'), TYPO_PREFIX_SCORE)
+        self.assertEqual(match_score('ent', 'dent'), 0)
+        self.assertEqual(match_score('neuro', 'cardiology'), 0)
+
+    def test_index_keys_find_every_match_the_score_accepts(self):
+        for query, token in (('card', 'cardiology'), ('cardiolgy', 'cardiology'), ('carido', 'cardiology'),
+                             ('cadriology', 'cardiology'), ('kardio', 'cardiology'), ('cardiollogy', 'cardiology')):
+            self.assertGreater(match_score(query, token), 0)
+            self.assertTrue(query_keys(query) & index_keys(token), f'{query!r} does not find {token!r}')
+
+    def test_long_text_is_indexed_by_whole_words(self):
+        entry = build_entry(Doctor(name='Anna Cardiologist', about='Experienced in interventional cardiology'))
+
+        self.assertIn('cardi', entry['keys'])
+        self.assertIn('interventional', entry['keys'])
+        self.assertNotIn('interv', entry['keys'])
+        self.assertEqual(entry['words'], {'experienced': 1, 'interventional': 1, 'cardiology': 1})
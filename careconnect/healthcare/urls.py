@@ -1,5 +1,5 @@
 from django.urls import path, include
-from .views import CategoryViewSet, WorkingTimeViewSet, HospitalViewSet, DoctorViewSet, CombinedDoctorsHospitalsListView
+from .views import CategoryViewSet, WorkingTimeViewSet, HospitalViewSet, DoctorViewSet, CombinedDoctorsHospitalsListView, SearchView
 from rest_framework.routers import DefaultRouter
 from django.conf import settings
 from django.conf.urls.static import static
@@ -15,6 +15,7 @@ router.register(r'doctors', DoctorViewSet, basename='doctor')
 urlpatterns = [
     path('', include(router.urls)),    
     path('doctor-hospital-combined-list/', CombinedDoctorsHospitalsListView.as_view(), name='combined-list'),
+    path('search/', SearchView.as_view(), name='search'),
 ]
 
 websocket_urlpatterns = [
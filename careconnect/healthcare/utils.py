@@ -1,72 +1,302 @@
-from collections import defaultdict
-from core.models import Review
-from .models import Doctor
-from core.serializers import ReviewSerializer
-import healthcare.serializers
+import logging
+import time
+from collections import defaultdict, namedtuple
+from bson import ObjectId
+from django.conf import settings
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+from core.models import Favorite, Review
+from .models import Doctor, Hospital
+from core.prefetch import prefetch_references
 
-def get_reviews_data(entity_ids, entity_type):
+logger = logging.getLogger(__name__)
+
+ReviewStats = namedtuple('ReviewStats', ['count', 'average', 'min', 'max'])
+
+# A failed review aggregate update is retried this many times, waiting REVIEW_AGGREGATE_RETRY_BACKOFF
+# seconds, doubled on each retry.
+REVIEW_AGGREGATE_RETRIES = getattr(settings, 'REVIEW_AGGREGATE_RETRIES', 2)
+REVIEW_AGGREGATE_RETRY_BACKOFF = getattr(settings, 'REVIEW_AGGREGATE_RETRY_BACKOFF', 0.1)
+
+
+def get_counts_by(model, group_field, match=None):
 
     """
-    Retrieves review data for a given list of entity IDs and entity type.
+    Counts the documents of a collection per value of one field, with a single $group aggregation.
 
     Parameters:
-        entity_ids (list): A list of entity IDs.
-        entity_type (int): The type of the entity.
+        model (Document): The document class to aggregate, e.g. Review or Appointment.
+        group_field (str): The field to group by, e.g. 'entity_id' or 'doctor_id'.
+        match (dict): An optional raw filter applied before grouping.
 
     Returns:
-        dict: A dictionary containing review data for each entity ID. The keys of the dictionary are the entity IDs, and the values are dictionaries with the following keys:
-            - 'review_count' (int): The number of reviews.
-            - 'average_rating' (float): The average rating of the reviews.
+        dict: The number of documents for each value of the field, keyed by the value as a string.
     """
 
-    reviews = Review.objects.filter(entity_id__in=entity_ids, entity_type=entity_type)
+    pipeline = [{'$match': match}] if match else []
+    pipeline.append({'$group': {'_id': f'${group_field}', 'count': {'$sum': 1}}})
+    return {str(row['_id']): row['count'] for row in model.objects.aggregate(pipeline)}
+
 
-    review_data = defaultdict(lambda: {'review_count': 0, 'average_rating': 0.0})
+def get_review_stats(entities):
 
-    for review in reviews:
-        entity_id = str(review.entity_id)
-        review_data[entity_id]['review_count'] += 1
-        review_data[entity_id]['average_rating'] += review.rating
+    """
+    Computes review statistics for several entities of one or more entity types in a single aggregation.
 
-    for entity_id, data in review_data.items():
-        if data['review_count'] > 0:
-            data['average_rating'] /= data['review_count']
+    The reviews are grouped server-side with one $group stage, so only one compact row per
+    entity is transferred instead of every review document.
+
+    Parameters:
+        entities (dict): A dictionary mapping an entity type (1 for Doctor, 2 for Hospital) to a list of entity IDs.
+
+    Returns:
+        dict: A dictionary keyed by (entity_type, entity_id) tuples. Each value is a ReviewStats tuple of
+            (count, average, min, max). Entities without reviews are not included.
+    """
 
-    return review_data
+    clauses = [
+        {'entity_type': entity_type, 'entity_id': {'$in': [str(entity_id) for entity_id in entity_ids]}}
+        for entity_type, entity_ids in entities.items() if entity_ids
+    ]
+    if not clauses:
+        return {}
 
+    pipeline = [
+        {'$match': {'$or': clauses}},
+        {'$group': {
+            '_id': {'entity_type': '$entity_type', 'entity_id': '$entity_id'},
+            'count': {'$sum': 1},
+            'average': {'$avg': '$rating'},
+            'min': {'$min': '$rating'},
+            'max': {'$max': '$rating'},
+        }},
+    ]
 
-def get_entity_reviews(entity_id, entity_type):
+    return {
+        (row['_id']['entity_type'], row['_id']['entity_id']): ReviewStats(row['count'], row['average'] or 0.0, row['min'], row['max'])
+        for row in Review.objects.aggregate(pipeline)
+    }
+
+
+def get_entities_reviews(keys):
 
     """
-    Retrieves the reviews associated with a given entity.
+    Retrieves the reviews associated with several entities in a single query.
 
     Args:
-        entity_id (int): The ID of the entity.
-        entity_type (int): The type of the entity.
+        keys (iterable): (entity_type, entity_id) tuples of the entities.
 
     Returns:
-        list: A list of serialized reviews.
+        dict: A dictionary mapping each (entity_type, entity_id) key to its list of reviews.
+
+    """
+
+    reviews = {(entity_type, str(entity_id)): [] for entity_type, entity_id in keys}
+
+    entity_ids = defaultdict(list)
+    for entity_type, entity_id in reviews:
+        entity_ids[entity_type].append(entity_id)
+    if not entity_ids:
+        return reviews
+
+    clauses = [{'entity_type': entity_type, 'entity_id': {'$in': ids}} for entity_type, ids in entity_ids.items()]
+    documents = list(Review.objects(__raw__={'$or': clauses}))
+    prefetch_references(documents, ['user_id', 'user_id.location_id'])
+
+    for review in documents:
+        key = (review.entity_type, review.entity_id)
+        if key in reviews:
+            reviews[key].append(review)
+    return reviews
+
+
+def get_user_favorites(keys):
 
     """
+    Checks which entities are favorites of their user, with a single query on the favorites index.
+
+    Args:
+        keys (iterable): (user_id, entity_type, entity_id) tuples.
+
+    Returns:
+        dict: A dictionary mapping each (user_id, entity_type, entity_id) key to True if it is a favorite, otherwise False.
+
+    """
+
+    favorites = {(str(user_id), entity_type, str(entity_id)): False for user_id, entity_type, entity_id in keys}
+    if not favorites:
+        return favorites
+
+    query = {
+        'user_id': {'$in': list({ObjectId(user_id) for user_id, _, _ in favorites})},
+        'entity_type': {'$in': list({entity_type for _, entity_type, _ in favorites})},
+        'entity_id': {'$in': list({entity_id for _, _, entity_id in favorites})},
+    }
+    for favorite in Favorite._get_collection().find(query, {'_id': 0, 'user_id': 1, 'entity_type': 1, 'entity_id': 1}):
+        key = (str(favorite['user_id']), favorite['entity_type'], favorite['entity_id'])
+        if key in favorites:
+            favorites[key] = True
+    return favorites
+
+
+def get_hospitals_specialists(hospital_ids):
+
+    """
+    Retrieves the specialists associated with several hospitals in a single query.
+
+    Args:
+        hospital_ids (iterable): The IDs of the hospitals.
+
+    Returns:
+        dict: A dictionary mapping each hospital ID to its list of doctors.
+
+    """
+
+    specialists = {str(hospital_id): [] for hospital_id in hospital_ids}
+    if not specialists:
+        return specialists
+
+    doctors = list(Doctor.objects.filter(hospital_id__in=list(specialists)))
+    prefetch_references(doctors, ['user_id', 'speciality_id', 'location_id', 'working_time_id', 'hospital_id'])
 
-    reviews = Review.objects.filter(entity_id=entity_id, entity_type=entity_type)
-    serializer = ReviewSerializer(reviews, many=True)
-    return serializer.data
+    for doctor in doctors:
+        specialists[str(doctor.hospital_id.id)].append(doctor)
+    return specialists
 
 
-def get_hospital_specialists(hospital_id):
+def get_rating_bucket(rating):
 
     """
-    Retrieves the specialists associated with a given hospital.
+    Maps a review rating onto its star bucket in the rating histogram.
 
     Args:
-        hospital_id (int): The ID of the hospital.
+        rating (float): The rating of the review.
 
     Returns:
-        list: A list of serialized specialists.
+        str: The star bucket ('1' to '5') the rating is counted under.
 
     """
 
-    doctors = Doctor.objects.filter(hospital_id=hospital_id)
-    serializer = healthcare.serializers.DoctorSerializer(doctors, many=True)
-    return serializer.data
\ No newline at end of file
+    return str(min(max(int(round(rating or 0.0)), 1), 5))
+
+
+def update_review_aggregates(entity_id, entity_type, rating, delta=1):
+
+    """
+    Atomically adds (or removes) a single rating to the stored review aggregates of a doctor or hospital.
+
+    The review_count, rating_sum, average_rating and rating_histogram fields are updated
+    in one pipeline update, so concurrent reviews never leave the average out of sync.
+
+    Args:
+        entity_id (str): The ID of the doctor or hospital.
+        entity_type (int): The type of the entity (1 for Doctor, 2 for Hospital).
+        rating (float): The rating of the review.
+        delta (int): 1 when a review is added, -1 when it is removed.
+
+    """
+
+    model = {1: Doctor, 2: Hospital}.get(entity_type)
+    if model is None or not ObjectId.is_valid(entity_id):
+        return
+
+    bucket = 'rating_histogram.' + get_rating_bucket(rating)
+    review_count = {'$add': [{'$ifNull': ['$review_count', 0]}, delta]}
+    rating_sum = {'$add': [{'$ifNull': ['$rating_sum', 0.0]}, delta * (rating or 0.0)]}
+
+    model._get_collection().update_one({'_id': ObjectId(entity_id)}, [{'$set': {
+        'review_count': review_count,
+        'rating_sum': rating_sum,
+        'average_rating': {'$cond': [{'$gt': [review_count, 0]}, {'$divide': [rating_sum, review_count]}, 0.0]},
+        bucket: {'$add': [{'$ifNull': ['$' + bucket, 0]}, delta]},
+    }}])
+
+
+def apply_review_aggregate_changes(changes):
+
+    """
+    Applies the rating changes of a saved or deleted review to the stored review aggregates.
+
+    The review itself is already written, so a failed update is retried and, if it still fails,
+    logged rather than raised: the request succeeded, and `rebuild_review_aggregates` recomputes the
+    aggregates from the reviews.
+
+    Args:
+        changes (list): (entity_id, entity_type, rating, delta) tuples, as taken by `update_review_aggregates`.
+
+    Returns:
+        bool: True if every change was applied.
+    """
+
+    applied = True
+    for entity_id, entity_type, rating, delta in changes:
+        for attempt in range(REVIEW_AGGREGATE_RETRIES + 1):
+            try:
+                update_review_aggregates(entity_id, entity_type, rating, delta=delta)
+                break
+            except PyMongoError:
+                if attempt < REVIEW_AGGREGATE_RETRIES:
+                    time.sleep(REVIEW_AGGREGATE_RETRY_BACKOFF * 2 ** attempt)
+                    continue
+                applied = False
+                logger.exception(
+                    'Could not move a rating of %s by %d in the review aggregates of entity %s (type %s); '
+                    'run rebuild_review_aggregates to repair them', rating, delta, entity_id, entity_type,
+                )
+    return applied
+
+
+def set_favorite(user_id, entity_id, entity_type, is_favorite=None):
+
+    """
+    Adds, removes or toggles a favorite and keeps the entity's favorite_count in step.
+
+    The favorite is written with a single atomic insert or delete, relying on the unique
+    (user_id, entity_type, entity_id) index, so concurrent requests can never store it twice.
+    The entity's counter is then moved with an atomic $inc, only when the favorite actually changed.
+
+    Args:
+        user_id (str): The ID of the user.
+        entity_id (str): The ID of the doctor or hospital.
+        entity_type (int): The type of the entity (1 for Doctor, 2 for Hospital).
+        is_favorite (bool): True to add the favorite, False to remove it, None to toggle it.
+
+    Returns:
+        tuple: Whether the entity is now a favorite, and its favorite_count, or None if the entity does not exist.
+
+    """
+
+    model = {1: Doctor, 2: Hospital}.get(entity_type)
+    if model is None or not ObjectId.is_valid(str(entity_id)):
+        return None
+
+    favorites = Favorite._get_collection()
+    key = {'user_id': ObjectId(str(user_id)), 'entity_type': entity_type, 'entity_id': str(entity_id)}
+
+    if is_favorite is None:
+        # Toggling: a favorite that is not deleted did not exist, so it is added.
+        delta = -1 if favorites.delete_one(key).deleted_count else 0
+        is_favorite = not delta
+    elif not is_favorite:
+        delta = -favorites.delete_one(key).deleted_count
+
+    if is_favorite:
+        upserted = favorites.update_one(key, {'$setOnInsert': key}, upsert=True).upserted_id
+        delta = 1 if upserted is not None else 0
+
+    entities = model._get_collection()
+    entity_key = {'_id': ObjectId(str(entity_id))}
+    if delta < 0:
+        entity_key['favorite_count'] = {'$gt': 0}
+    entity = entities.find_one_and_update(
+        entity_key, {'$inc': {'favorite_count': delta}}, projection={'favorite_count': 1}, return_document=ReturnDocument.AFTER
+    )
+
+    if entity is None and delta < 0:
+        entity = entities.find_one({'_id': entity_key['_id']}, {'favorite_count': 1})
+    if entity is None:
+        if delta > 0:
+            # The entity does not exist: drop the favorite that was just added.
+            favorites.delete_one(key)
+        return None
+    return is_favorite, entity.get('favorite_count', 0)
@@ -3,42 +3,59 @@ from rest_framework.response import Response
 from rest_framework import viewsets, permissions, status
 from .serializers import CategorySerializer, WorkingTimeSerializer, HospitalSerializer, DoctorSerializer, DoctorCardSerializer, HospitalCardSerializer
 from rest_framework.permissions import AllowAny
-from django.conf import settings
+import io
 import os
 from core.models import Review
 from rest_framework.decorators import action
 from appointments.models import Appointment
-from constant import DOCTOR, HOSPITAL
+from constant import DOCTOR, HOSPITAL, WorkingTimeManager
 from rest_framework.views import APIView
-from .utils import get_reviews_data
+from rest_framework.generics import GenericAPIView
+from rest_framework.exceptions import ValidationError
 from rest_framework.exceptions import NotFound
-
-class CategoryViewSet(viewsets.ModelViewSet):
+from core.prefetch import PrefetchMixin, prefetch_references
+from core.sparse import SparseFieldsMixin
+from core.geo import NearbyMixin
+from core.images import ImageVariantMixin, get_requested_image_variant, schedule_variants
+from core.storage import release, store_upload
+from concurrent.futures import ThreadPoolExecutor
+from .loaders import BatchLoader
+from .pagination import SectionCursorPagination
+from .utils import get_counts_by
+from .cache import category_cache, get_category
+from django.core.cache import cache
+from urllib.parse import urlencode
+from appointments.pagination import CustomPagination
+from .search import ENTITY_TYPES as SEARCH_ENTITY_TYPES, load_subtitles, search
+from .resolvers import ENTITY_TYPES, resolve_entities, resolve_entity
+
+# Runs the independent sections of the combined list concurrently.
+section_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='combined-list')
+
+class CategoryViewSet(ImageVariantMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     permission_classes = [AllowAny]
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     def get_queryset(self):
         return Category.objects.all()
 
-    def save_file(self, file):
-
+    def list(self, request, *args, **kwargs):
         """
-        Saves the uploaded file to the 'category_files' directory in the media root.
-        
-        Parameters:
-            file: The uploaded file object.
-        
-        Returns:
-            The path to the saved file in the format 'media/category_files/filename'.
+        Lists the categories from the in-process category cache, without querying MongoDB.
         """
+        categories = sorted(category_cache.all(), key=lambda category: category.pk)
+        serializer = self.get_serializer(categories, many=True)
+        return Response(serializer.data)
 
-        file_path = os.path.join(settings.MEDIA_ROOT, 'category_files', file.name)
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, 'wb+') as destination:
-            for chunk in file.chunks():
-                destination.write(chunk)
-        return 'media/category_files/' + file.name
-        
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Retrieves a category from the in-process category cache, without querying MongoDB.
+        """
+        category = get_category(kwargs.get(self.lookup_url_kwarg or self.lookup_field))
+        if category is None:
+            raise NotFound("Category not found")
+        serializer = self.get_serializer(category)
+        return Response(serializer.data)
 
     def create(self, request, *args, **kwargs) -> Response:
 
@@ -60,7 +77,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
             1. Validates the provided data using the serializer.
             2. If the data is valid, extracts the 'name' and 'description' fields from the validated data.
             3. Retrieves the 'files' field from the request data.
-            4. If 'files' is provided, saves the file using the 'save_file' method and retrieves the file URL.
+            4. If 'files' is provided, stores the file with 'store_upload' and retrieves its content-addressed path.
             5. If 'files' is not provided, sets the file URL to None.
             6. Creates a new Category object with the extracted 'name', 'description', and 'file_url' fields.
             7. Serializes the created Category object and sets the 'files' field to None in the response data.
@@ -73,9 +90,14 @@ class CategoryViewSet(viewsets.ModelViewSet):
 
         if serializer.is_valid():
             files = request.FILES.get('files', None)
-            file_url = self.save_file(files) if files else None
+            file_url = store_upload(files) if files else None
 
-            category = serializer.save(files=file_url)
+            try:
+                category = serializer.save(files=file_url)
+            except Exception:
+                release(file_url)
+                raise
+            schedule_variants(category)
 
             response_data = serializer.data
             response_data['files'] = None
@@ -135,6 +157,59 @@ class WorkingTimeViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         return WorkingTime.objects.all()
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Creates or replaces the weekly schedules of many doctors and hospitals in bulk.
+
+        The body holds 'schedules', a list of {'entity_type', 'entity_id', 'days': [{'day', 'start_time', 'end_time'}]},
+        and an optional 'replace' flag (default true) that deletes the existing working hours of each entity first.
+        Invalid rows are reported in 'errors' and skipped; the valid rows are still written.
+
+        Args:
+            request (Request): The HTTP request object.
+
+        Returns:
+            Response: The number of inserted rows and updated entities, and the per-row errors.
+        """
+        schedules = request.data.get('schedules')
+        if not isinstance(schedules, list):
+            return Response({"error": "'schedules' must be a list"}, status=status.HTTP_400_BAD_REQUEST)
+
+        replace = str(request.data.get('replace', 'true')).lower() != 'false'
+        summary = WorkingTimeManager.bulk_set_schedules(schedules, replace=replace)
+        return Response(summary, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_schedules(self, request):
+        """
+        Imports working hours from an uploaded CSV or JSON Lines file, streamed in batches.
+
+        Each row needs 'entity_type', 'entity_id', 'day', 'start_time' and 'end_time'. The format is
+        taken from the 'format' parameter or the file extension. Pass replace=false to add to the
+        existing working hours instead of replacing them.
+
+        Args:
+            request (Request): The HTTP request object, with the file in 'file'.
+
+        Returns:
+            Response: The number of inserted rows and updated entities, and the per-row errors.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "A 'file' upload is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        file_format = request.data.get('format') or os.path.splitext(upload.name)[1].lstrip('.').lower()
+        if file_format == 'ndjson':
+            file_format = 'jsonl'
+        if file_format not in ('csv', 'jsonl'):
+            return Response({"error": "The format must be 'csv' or 'jsonl'"}, status=status.HTTP_400_BAD_REQUEST)
+
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        replace = str(request.data.get('replace', 'true')).lower() != 'false'
+        summary = WorkingTimeManager.import_schedules(stream, file_format=file_format, replace=replace)
+        return Response(summary, status=status.HTTP_200_OK)
     
     def get_entity_details(self, working_time):
 
@@ -144,27 +219,21 @@ class WorkingTimeViewSet(viewsets.ModelViewSet):
         Returns the serialized data of the entity based on the entity type and ID from the working time object.
         """
 
-        entity_type = working_time.entity_type
-        entity_id = working_time.entity_id
+        if working_time.entity_type not in ENTITY_TYPES:
+            raise NotFound("Entity type not supported")
 
-        try:
-            if entity_type == 1:
-                entity = Doctor.objects.get(id=entity_id)
-                serializer = DoctorSerializer(entity)
-            elif entity_type == 2:
-                entity = Hospital.objects.get(id=entity_id)
-                serializer = HospitalSerializer(entity)
-            else:
-                raise NotFound("Entity type not supported")
-
-            return serializer.data
-        except (Doctor.DoesNotExist, Hospital.DoesNotExist):
+        entity_data = resolve_entity(working_time.entity_type, working_time.entity_id)
+        if entity_data is None:
             raise NotFound("Entity not found")
+        return entity_data
 
     def list(self, request, *args, **kwargs):
 
         """
-    	List view for working time instances. Retrieves a queryset of working time instances, serializes each instance, adds entity details to the serialized data, and returns a response with the serialized data.
+    	List view for working time instances. Retrieves a queryset of working time instances, serializes them, adds entity details to the serialized data, and returns a response with the serialized data.
+
+    	The doctors and hospitals of all working times are resolved together, with one query per entity type.
+    	Working times whose entity no longer exists get None as their entity details.
     	
     	Parameters:
     	    self: reference to the current instance of the class
@@ -176,14 +245,12 @@ class WorkingTimeViewSet(viewsets.ModelViewSet):
     	    Response object with serialized data and HTTP 200 status
     	"""
 
-        queryset = self.get_queryset()
+        working_times = list(self.get_queryset())
+        entities = resolve_entities((working_time.entity_type, working_time.entity_id) for working_time in working_times)
 
-        serialized_data = []
-        for working_time_instance in queryset:
-            serializer = self.get_serializer(working_time_instance)
-            working_time_data = serializer.data
-            working_time_data['entity_details'] = self.get_entity_details(working_time_instance)
-            serialized_data.append(working_time_data)
+        serialized_data = self.get_serializer(working_times, many=True).data
+        for working_time_data, working_time in zip(serialized_data, working_times):
+            working_time_data['entity_details'] = entities.get((working_time.entity_type, str(working_time.entity_id)))
 
         return Response(serialized_data, status=status.HTTP_200_OK)
 
@@ -234,9 +301,66 @@ class WorkingTimeViewSet(viewsets.ModelViewSet):
             return Response({"error": "Working-Time not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
-class HospitalViewSet(viewsets.ModelViewSet):
+class ProviderCountsMixin:
+
+    """
+    Viewset mixin for the per-provider count endpoints (reviews, patients) used by dashboards.
+
+    The counts come from one $group aggregation and the provider names from one projected query.
+    The resulting rows are cached for `counts_cache_timeout` seconds per endpoint and filter, so
+    repeated polls are served from the cache. Sorting (`?ordering=-count`, `name`, `id`, ...) and
+    pagination (`page`, `page_size`) are applied to the cached rows; top-N is `?ordering=-count&page_size=N`.
+    """
+
+    counts_cache_timeout = 30
+    counts_ordering_fields = ('count', 'name', 'id')
+    counts_query_params = ('ordering', 'page', 'page_size')
+
+    def get_counts_response(self, request, id_key, name_key, count_key, load_counts):
+
+        """
+        Returns the paginated count rows of the providers in `get_queryset()`.
+
+        Args:
+            request (Request): The HTTP request object.
+            id_key (str): The key of the provider ID in each row.
+            name_key (str): The key of the provider name in each row.
+            count_key (str): The key of the count in each row.
+            load_counts (callable): Returns the count of each provider, keyed by provider ID.
+
+        Returns:
+            Response: The paginated rows.
+        """
+
+        ordering = request.query_params.get('ordering', '-count')
+        if ordering.lstrip('-') not in self.counts_ordering_fields:
+            raise ValidationError({'ordering': f"Must be one of: {', '.join(self.counts_ordering_fields)}, optionally prefixed with '-'."})
+
+        filters = sorted((key, value) for key, value in request.query_params.items() if key not in self.counts_query_params)
+        cache_key = f'provider-counts:{self.basename}:{count_key}:{urlencode(filters)}'
+
+        rows = cache.get(cache_key)
+        if rows is None:
+            counts = load_counts()
+            rows = [
+                {'id': str(provider['_id']), 'name': provider.get('name') or '', 'count': counts.get(str(provider['_id']), 0)}
+                for provider in self.get_queryset().only('id', 'name').as_pymongo()
+            ]
+            cache.set(cache_key, rows, self.counts_cache_timeout)
+
+        field = ordering.lstrip('-')
+        rows = sorted(rows, key=lambda row: (row[field], row['id']), reverse=ordering.startswith('-'))
+
+        page = self.paginate_queryset(rows)
+        data = [{id_key: row['id'], name_key: row['name'], count_key: row['count']} for row in page]
+        return self.get_paginated_response(data)
+
+
+class HospitalViewSet(ProviderCountsMixin, NearbyMixin, ImageVariantMixin, SparseFieldsMixin, PrefetchMixin, viewsets.ModelViewSet):
     serializer_class = HospitalSerializer
     permission_classes = [AllowAny]
+    pagination_class = CustomPagination
+    prefetch = ['category_id', 'location_id', 'working_time_id']
 
     def get_queryset(self):
 
@@ -248,17 +372,16 @@ class HospitalViewSet(viewsets.ModelViewSet):
         the specified category ID. If the 'working_time_id' parameter is provided, the queryset is filtered 
         to include only hospitals with the specified working time ID.
 
-        The method then retrieves the reviews data for the hospitals in the queryset by calling the 
-        'get_reviews_data' function with the hospital IDs and a flag indicating that the data is for hospitals.
-
-        Finally, the method updates each hospital in the queryset by adding the 'hospital_id', 'review_count', 
-        and 'average_rating' attributes using the reviews data.
+        The 'review_count' and 'average_rating' of each hospital are maintained on the document itself
+        whenever a review is created, updated or deleted, so no reviews are scanned here. The queryset
+        stays lazy: filtering and pagination run in MongoDB, and the nested reviews and references are
+        only loaded for the page being serialized.
 
         Returns:
             QuerySet: The filtered queryset of hospitals.
         """
 
-        queryset = Hospital.objects.all()
+        queryset = Hospital.objects.order_by('id')
              
         category_id = self.request.query_params.get('category_id')
         working_time_id = self.request.query_params.get('working_time_id')
@@ -268,34 +391,7 @@ class HospitalViewSet(viewsets.ModelViewSet):
         if working_time_id:
             queryset = queryset.filter(working_time_id=working_time_id)
 
-        hospital_ids = [str(hospital.id) for hospital in queryset]
-        reviews_data = get_reviews_data(hospital_ids, 2)
-
-        for hospital in queryset:
-            hospital_id = str(hospital.id)
-            hospital.hospital_id = hospital_id
-            hospital.review_count = reviews_data.get(hospital_id, {}).get('review_count', 0)
-            hospital.average_rating = reviews_data.get(hospital_id, {}).get('average_rating', 0.0)
-        
         return queryset
-    
-    def save_file(self, file):
-        """
-        Save a file to the 'uploaded_files' directory in the media root.
-
-        Args:
-            file (File): The file to be saved.
-
-        Returns:
-            str: The path to the saved file in the format 'media/uploaded_files/filename'.
-        """
-        file_path = os.path.join(settings.MEDIA_ROOT, 'uploaded_files', file.name)
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, 'wb+') as destination:
-            for chunk in file.chunks():
-                destination.write(chunk)
-        return 'media/uploaded_files/' + file.name
-
 
     def create(self, request, *args, **kwargs):
         """
@@ -312,7 +408,7 @@ class HospitalViewSet(viewsets.ModelViewSet):
         Steps:
             1. Validates the provided data using the serializer.
             2. If the data is valid, extracts the 'files' field from the request data.
-            3. If 'files' is provided, saves the file using the 'save_file' method and retrieves the file URL.
+            3. If 'files' is provided, stores the file with 'store_upload' and retrieves its content-addressed path.
             4. If 'files' is not provided, sets the file URL to None.
             5. Creates a new hospital object with the provided data and the file URL.
             6. Serializes the created hospital object and sets the 'files' field to None in the response data.
@@ -323,9 +419,14 @@ class HospitalViewSet(viewsets.ModelViewSet):
         serializer = self.serializer_class(data=request.data)
         if serializer.is_valid():
             files = request.FILES.get('files', None)
-            image_url = self.save_file(files) if files else None
+            image_url = store_upload(files) if files else None
 
-            hospital = serializer.save(files=image_url)
+            try:
+                hospital = serializer.save(files=image_url)
+            except Exception:
+                release(image_url)
+                raise
+            schedule_variants(hospital)
 
             response_data = serializer.data
             response_data['files'] = None
@@ -364,6 +465,9 @@ class HospitalViewSet(viewsets.ModelViewSet):
         """
         Retrieves the total review count for hospitals.
 
+        The counts are computed with one aggregation over the reviews and cached briefly, and the
+        results are sorted and paginated, see `ProviderCountsMixin`.
+
         Args:
             self: The HospitalViewSet instance.
             request: The HTTP request object.
@@ -371,21 +475,17 @@ class HospitalViewSet(viewsets.ModelViewSet):
         Returns:
             Response: The response containing the total review count data for hospitals.
         """
-        hospitals = self.get_queryset()
-        data = []
-        for hospital in hospitals:
-            review_count = Review.objects.filter(entity_id=str(hospital.id), entity_type=HOSPITAL[0]).count()
-            data.append({
-                'hospital_id': str(hospital.id),
-                'hospital_name': hospital.name,
-                'review_count': review_count
-            })
-        return Response(data)
+        return self.get_counts_response(
+            request, 'hospital_id', 'hospital_name', 'review_count',
+            lambda: get_counts_by(Review, 'entity_id', {'entity_type': HOSPITAL[0]}),
+        )
 
     
-class DoctorViewSet(viewsets.ModelViewSet):
+class DoctorViewSet(ProviderCountsMixin, NearbyMixin, ImageVariantMixin, SparseFieldsMixin, PrefetchMixin, viewsets.ModelViewSet):
     serializer_class = DoctorSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = CustomPagination
+    prefetch = ['user_id', 'speciality_id', 'location_id', 'working_time_id', 'hospital_id']
 
     def get_queryset(self):
         """
@@ -396,16 +496,15 @@ class DoctorViewSet(viewsets.ModelViewSet):
         with the specified hospital ID. If the 'speciality_id' parameter is provided, the queryset is 
         filtered to include only doctors with the specified speciality ID.
 
-        The method then retrieves the reviews data for the doctors in the queryset by calling the 
-        'get_reviews_data' function with the doctor IDs and a flag indicating that the data is for doctors.
-
-        Finally, the method updates each doctor in the queryset by adding the 'doctor_id', 'review_count', 
-        and 'average_rating' attributes using the reviews data.
+        The 'review_count' and 'average_rating' of each doctor are maintained on the document itself
+        whenever a review is created, updated or deleted, so no reviews are scanned here. The queryset
+        stays lazy: filtering and pagination run in MongoDB, and the nested reviews and references are
+        only loaded for the page being serialized.
 
         Returns:
             QuerySet: The filtered queryset of doctors.
         """
-        queryset = Doctor.objects.all()
+        queryset = Doctor.objects.order_by('id')
 
         hospital_id = self.request.query_params.get('hospital_id')
         speciality_id = self.request.query_params.get('speciality_id')
@@ -415,36 +514,8 @@ class DoctorViewSet(viewsets.ModelViewSet):
         if speciality_id:
             queryset = queryset.filter(speciality_id=speciality_id)
 
-        doctor_ids = [str(doctor.id) for doctor in queryset]
-        reviews_data = get_reviews_data(doctor_ids, 1)
-
-        for doctor in queryset:
-            doctor_id = str(doctor.id)
-            doctor.doctor_id = doctor_id
-            doctor.review_count = reviews_data.get(doctor_id, {}).get('review_count', 0)
-            doctor.average_rating = reviews_data.get(doctor_id, {}).get('average_rating', 0.0)
-            
         return queryset
-    
-        
-    def save_file(self, file):
-        """
-        Save the uploaded file to the 'doctors_files' directory in the media root.
-        
-        Parameters:
-            file: The uploaded file object.
-            
-        Returns:
-            The path to the saved file in the format 'media/doctors_files/filename'.
-        """
-        file_path = os.path.join(settings.MEDIA_ROOT, 'doctors_files', file.name)
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, 'wb+') as destination:
-            for chunk in file.chunks():
-                destination.write(chunk)
-        return 'media/doctors_files/' + file.name
-    
-    
+
     def create(self, request, *args, **kwargs):
         """
         Creates a new doctor object with the provided data and saves any associated files.
@@ -460,9 +531,14 @@ class DoctorViewSet(viewsets.ModelViewSet):
         serializer = self.serializer_class(data=request.data)
         if serializer.is_valid():
             files = request.FILES.get('files', None)
-            file_url = self.save_file(files) if files else None
+            file_url = store_upload(files) if files else None
 
-            doctor = serializer.save(files=file_url, is_active=True)
+            try:
+                doctor = serializer.save(files=file_url, is_active=True)
+            except Exception:
+                release(file_url)
+                raise
+            schedule_variants(doctor)
 
             response_data = serializer.data
             response_data['files'] = None
@@ -511,16 +587,15 @@ class DoctorViewSet(viewsets.ModelViewSet):
         """
         instance = self.get_object()
         
-        speciality_data = {
-            'id': str(instance.speciality_id.id), 
-            'name': instance.speciality_id.name,
-            'description': instance.speciality_id.description
-        }
-        
-        serializer = self.serializer_class(instance)
+        serializer = self.get_serializer(instance)
         serializer_data = serializer.data
         
-        serializer_data['speciality'] = speciality_data
+        if 'speciality' in serializer_data:
+            serializer_data['speciality'] = {
+                'id': str(instance.speciality_id.id), 
+                'name': instance.speciality_id.name,
+                'description': instance.speciality_id.description
+            }
         
         return Response(serializer_data, status=status.HTTP_200_OK)
         
@@ -530,40 +605,29 @@ class DoctorViewSet(viewsets.ModelViewSet):
         """
         Retrieves the total review count for doctors.
 
+        The counts are computed with one aggregation over the reviews and cached briefly, and the
+        results are sorted and paginated, see `ProviderCountsMixin`.
+
         Args:
             self (DoctorViewSet): The DoctorViewSet instance.
             request (HttpRequest): The HTTP request object.
 
         Returns:
             Response: The HTTP response object with the total review count data for doctors.
-
-        Raises:
-            Exception: If an error occurs during the retrieval of the review count.
-
         """
-        doctors = self.get_queryset()
-        data = []
-
-        for doctor in doctors:
-            doctor_id = str(doctor.id)
-            
-            try:
-                review_count = Review.objects.filter(entity_id=doctor_id, entity_type=DOCTOR[0]).count()
-                data.append({
-                    'doctor_id': doctor_id,
-                    'doctor_name': doctor.name,
-                    'review_count': review_count
-                })
-            except Exception as e:
-                return Response({'error': str(e)}, status=500)
-
-        return Response(data)
+        return self.get_counts_response(
+            request, 'doctor_id', 'doctor_name', 'review_count',
+            lambda: get_counts_by(Review, 'entity_id', {'entity_type': DOCTOR[0]}),
+        )
     
 
     @action(detail=False, methods=['get'])
     def total_patients_count(self, request):
         """
-        Retrieves the total number of patients for each doctor and returns the data in a list format.
+        Retrieves the total number of patients (appointments) for each doctor.
+
+        The counts are computed with one aggregation over the appointments and cached briefly, and the
+        results are sorted and paginated, see `ProviderCountsMixin`.
 
         Args:
             self (DoctorViewSet): The DoctorViewSet instance.
@@ -572,24 +636,27 @@ class DoctorViewSet(viewsets.ModelViewSet):
         Returns:
             Response: The HTTP response object with the total patient count data for each doctor.
         """
-        doctors = self.get_queryset()
-        data = []
-        for doctor in doctors:
-            patient_count = Appointment.objects.filter(doctor_id=str(doctor.id)).count()
-            data.append({
-                'doctor_id': str(doctor.id),
-                'doctor_name': doctor.name,
-                'patient_count': patient_count
-            })
-        return Response(data)
+        return self.get_counts_response(
+            request, 'doctor_id', 'doctor_name', 'patient_count',
+            lambda: get_counts_by(Appointment, 'doctor_id'),
+        )
 
 
 class CombinedDoctorsHospitalsListView(APIView):
     permission_classes = [permissions.AllowAny]
+    hospital_pagination = SectionCursorPagination('hospitals_cursor')
+    doctor_pagination = SectionCursorPagination('doctors_cursor')
 
     def get(self, request, *args, **kwargs):
         """
-        Retrieves all hospitals and doctors from the database and adds additional information to each doctor and hospital.
+        Retrieves a page of hospitals and a page of doctors as lightweight cards.
+        Review counts and average ratings are read from the aggregates stored on each document.
+
+        Each section is paginated independently with the 'hospitals_cursor' and 'doctors_cursor'
+        query parameters, and both sections are fetched concurrently. Only the card fields are read
+        from MongoDB, and the categories of all cards are loaded with a single query per collection.
+        Clients that need the full embedded objects opt in with `?expand=hospital,doctor`.
+        Cards carry the thumbnail variant of each image; `?image=card` or `?image=original` picks another.
         
         Args:
             request (HttpRequest): The HTTP request object.
@@ -597,37 +664,114 @@ class CombinedDoctorsHospitalsListView(APIView):
             **kwargs: Arbitrary keyword arguments.
         
         Returns:
-            Response: An HTTP response object containing a dictionary with 'hospitals' and 'doctors' keys.
-                      The values are lists of serialized hospital and doctor objects respectively.
+            Response: An HTTP response object containing a dictionary with 'hospitals' and 'doctors' keys,
+                      holding the serialized cards of each section, and 'next_hospitals_cursor' and
+                      'next_doctors_cursor' keys, holding the cursor of each section's next page.
         """
-        hospitals = list(Hospital.objects.all())
-        doctors = list(Doctor.objects.all())
+        expand = {value.strip() for value in request.query_params.get('expand', '').split(',') if value.strip()}
 
-        
-        doctor_ids = [str(doctor.id) for doctor in doctors]
-        hospital_ids = [str(hospital.id) for hospital in hospitals]
+        image_variant = get_requested_image_variant(request)
 
-        doctor_reviews_data = get_reviews_data(doctor_ids, 1)
-        hospital_reviews_data = get_reviews_data(hospital_ids, 2)
+        hospitals_future = section_executor.submit(self.get_hospitals, request, expand, image_variant)
+        doctors_future = section_executor.submit(self.get_doctors, request, expand, image_variant)
 
-        for doctor in doctors:
-            doctor_id = str(doctor.id)
-            doctor.doctor_id = doctor_id
-            doctor.review_count = doctor_reviews_data.get(doctor_id, {}).get('review_count', 0)
-            doctor.average_rating = doctor_reviews_data.get(doctor_id, {}).get('average_rating', 0.0)
+        hospitals, next_hospitals_cursor = hospitals_future.result()
+        doctors, next_doctors_cursor = doctors_future.result()
+
+        combined_data = {
+            'hospitals': hospitals,
+            'doctors': doctors,
+            'next_hospitals_cursor': next_hospitals_cursor,
+            'next_doctors_cursor': next_doctors_cursor,
+        }
+
+        return Response(combined_data, status=status.HTTP_200_OK)
+
+    def get_hospitals(self, request, expand, image_variant):
+        """
+        Loads and serializes the requested page of hospital cards.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+            expand (set): The embedded objects requested by the client.
+            image_variant (str): The image variant of the cards, or None for the original uploads.
+
+        Returns:
+            tuple: The serialized hospital cards and the cursor of the next page.
+        """
+        queryset = Hospital.objects.all()
+        if 'hospital' not in expand:
+            queryset = queryset.only(*HospitalCardSerializer.Meta.projection)
+
+        hospitals, next_cursor = self.hospital_pagination.paginate_queryset(queryset, request)
+        prefetch_references(hospitals, HospitalViewSet.prefetch if 'hospital' in expand else ['category_id'])
 
         for hospital in hospitals:
-            hospital_id = str(hospital.id)
-            hospital.hospital_id = hospital_id
-            hospital.review_count = hospital_reviews_data.get(hospital_id, {}).get('review_count', 0)
-            hospital.average_rating = hospital_reviews_data.get(hospital_id, {}).get('average_rating', 0.0)
+            hospital.hospital_id = str(hospital.id)
 
-        hospital_serializer = HospitalCardSerializer(hospitals, many=True)
-        doctor_serializer = DoctorCardSerializer(doctors, many=True)
+        context = {'request': request, 'expand': expand, 'batch_loader': BatchLoader(), 'image_variant': image_variant}
+        return HospitalCardSerializer(hospitals, many=True, context=context).data, next_cursor
 
-        combined_data = {
-            'hospitals': hospital_serializer.data,
-            'doctors': doctor_serializer.data
-        }
+    def get_doctors(self, request, expand, image_variant):
+        """
+        Loads and serializes the requested page of doctor cards.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+            expand (set): The embedded objects requested by the client.
+            image_variant (str): The image variant of the cards, or None for the original uploads.
+
+        Returns:
+            tuple: The serialized doctor cards and the cursor of the next page.
+        """
+        queryset = Doctor.objects.all()
+        if 'doctor' not in expand:
+            queryset = queryset.only(*DoctorCardSerializer.Meta.projection)
+
+        doctors, next_cursor = self.doctor_pagination.paginate_queryset(queryset, request)
+        prefetch_references(doctors, DoctorViewSet.prefetch if 'doctor' in expand else ['speciality_id'])
+
+        for doctor in doctors:
+            doctor.doctor_id = str(doctor.id)
+
+        context = {'request': request, 'expand': expand, 'batch_loader': BatchLoader(), 'image_variant': image_variant}
+        return DoctorCardSerializer(doctors, many=True, context=context).data, next_cursor
 
-        return Response(combined_data, status=status.HTTP_200_OK)
\ No newline at end of file
+
+class SearchView(GenericAPIView):
+    permission_classes = [permissions.AllowAny]
+    pagination_class = CustomPagination
+
+    def get(self, request, *args, **kwargs):
+        """
+        Searches doctors, hospitals and categories by name, doctors' about text and hospitals' address.
+
+        Results come from the maintained search index, ranked by relevance and paginated. Every word of
+        the query must match the start of a word of a name, with one typo tolerated for words of four or
+        more characters, or a whole word of the about text or address. The results can be restricted
+        with `?type=doctor,hospital,category`.
+
+        Args:
+            request (HttpRequest): The HTTP request object, with the query in the 'q' parameter.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+
+        Returns:
+            Response: A paginated list of matches, each with its 'entity_type', 'entity_id', 'title', 'subtitle' and 'score'.
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': 'This query parameter is required.'})
+
+        entity_types = None
+        types = request.query_params.get('type')
+        if types:
+            names = [name.strip() for name in types.split(',') if name.strip()]
+            unknown = [name for name in names if name not in SEARCH_ENTITY_TYPES]
+            if unknown:
+                raise ValidationError({'type': f"Unknown type(s): {', '.join(unknown)}."})
+            entity_types = [SEARCH_ENTITY_TYPES[name] for name in names]
+
+        results = search(query, entity_types)
+        page = self.paginate_queryset(results)
+        return self.get_paginated_response(load_subtitles(page))